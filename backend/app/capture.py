@@ -0,0 +1,197 @@
+"""Anonymized traffic capture.
+
+With ``CAPTURE_FILE`` set, a share (``CAPTURE_SAMPLE_PERCENT``) of API
+requests is appended to that file as JSON lines: arrival time, method, route
+template, path and query parameters, the shape of the JSON body, the headers
+that change how a response is produced, and the status, size and duration of
+the response, plus the id and seed of what a POST created. Free text is
+replaced by placeholders of the same length and kind, so captures carry no
+names or notes but can still be replayed with ``replay_tool.py``. Numbers,
+ids, seeds and enumerated fields are kept since replaying depends on them.
+
+Requests only queue their record; a writer thread (``start``/``stop``, run
+from the app lifespan) appends them to the file, so the event loop never
+waits on disk.
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from urllib.parse import parse_qsl
+
+from fastapi.routing import APIRoute
+
+CAPTURE_FILE = os.getenv("CAPTURE_FILE", "")
+CAPTURE_SAMPLE_PERCENT = float(os.getenv("CAPTURE_SAMPLE_PERCENT", "100"))
+
+# String fields whose values are not personal and that requests need to stay
+# valid (enumerations, room seeds, representation switches)
+KEPT_FIELDS = {
+    "category",
+    "meal_type",
+    "language",
+    "selectedTypes",
+    "mealTypes",
+    "seed",
+    "seeds",
+    "kind",
+    "shape",
+    "include",
+}
+
+# Request headers that select a different response path
+KEPT_HEADERS = {b"accept", b"accept-encoding", b"content-type", b"if-none-match"}
+
+# Fields of a created object that later requests refer to; the replay maps
+# them to the values its own run hands out
+CREATED_FIELDS = ("id", "seed")
+
+_records = queue.Queue()
+_writer = None
+
+
+def anonymize(value, field: str | None = None):
+    """Same structure and sizes, with free text replaced"""
+    if isinstance(value, dict):
+        return {key: anonymize(item, key) for key, item in value.items()}
+    if isinstance(value, list):
+        return [anonymize(item, field) for item in value]
+    if isinstance(value, str) and field not in KEPT_FIELDS:
+        return "x" * len(value)
+    return value
+
+
+def _anonymize_query(query_string: bytes) -> list:
+    pairs = []
+    for key, value in parse_qsl(query_string.decode("latin-1"), True):
+        if not value.lstrip("-").replace(".", "", 1).isdigit():
+            value = anonymize(value, key)
+        pairs.append([key, value])
+    return pairs
+
+
+def _created(method: str, status, chunks: list):
+    if method != "POST" or status is None or not 200 <= status < 300:
+        return None
+    try:
+        payload = json.loads(b"".join(chunks))
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+    created = {field: payload[field] for field in CREATED_FIELDS if field in payload}
+    return created or None
+
+
+def _drain():
+    with open(CAPTURE_FILE, "a") as f:
+        while True:
+            record = _records.get()
+            if record is None:
+                return
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            if _records.empty():
+                f.flush()
+
+
+def start():
+    """Start the writer thread; a no-op when CAPTURE_FILE is not set"""
+    global _writer
+    if CAPTURE_FILE and _writer is None:
+        _writer = threading.Thread(target=_drain, name="capture-writer", daemon=True)
+        _writer.start()
+
+
+def stop():
+    """Write out the queued records, then stop the writer thread"""
+    global _writer
+    if _writer is not None:
+        _records.put(None)
+        _writer.join()
+        _writer = None
+
+
+class CaptureMiddleware:
+    """ASGI middleware recording sampled /api requests"""
+
+    def __init__(self, app, route_paths: dict):
+        self.app = app
+        self.route_paths = route_paths
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not scope["path"].startswith("/api/")
+            or scope["path"].startswith("/api/admin/")
+            or random.random() * 100 >= CAPTURE_SAMPLE_PERCENT
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        body = []
+        response = {"status": None, "bytes": 0, "chunks": []}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                body.append(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                response["bytes"] += len(chunk)
+                if scope["method"] == "POST":
+                    response["chunks"].append(chunk)
+            await send(message)
+
+        arrived = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            try:
+                payload = json.loads(b"".join(body)) if any(body) else None
+                payload = anonymize(payload)
+            except ValueError:
+                payload = None
+            _records.put_nowait(
+                {
+                    "ts": arrived,
+                    "method": scope["method"],
+                    "route": self.route_paths.get(scope.get("endpoint")),
+                    "path": scope["path"],
+                    "path_params": scope.get("path_params") or {},
+                    "query": _anonymize_query(scope.get("query_string", b"")),
+                    "headers": {
+                        name.decode(): value.decode("latin-1")
+                        for name, value in scope.get("headers") or []
+                        if name in KEPT_HEADERS
+                    },
+                    "body": payload,
+                    "status": response["status"],
+                    "response_bytes": response["bytes"],
+                    "duration_ms": round(duration_ms, 3),
+                    "created": _created(
+                        scope["method"], response["status"], response["chunks"]
+                    ),
+                }
+            )
+
+
+def install(app):
+    """Record traffic to CAPTURE_FILE; a no-op when it is not set"""
+    if not CAPTURE_FILE:
+        return
+    route_paths = {
+        route.endpoint: route.path
+        for route in app.routes
+        if isinstance(route, APIRoute)
+    }
+    app.add_middleware(CaptureMiddleware, route_paths=route_paths)
@@ -0,0 +1,115 @@
+"""Set-based room copies.
+
+``clone_room`` copies a room's settings and the selected collections into a
+new room with one ``INSERT ... SELECT`` per table, inside the caller's
+transaction, so cloning costs the same handful of statements whatever the
+size of the room. Room templates are rooms with the ``template`` status,
+named by a ``RoomTemplate`` row, that are only ever cloned from.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from .database import database
+from .models import models
+
+# Collections that can be copied, in the order they are copied
+COLLECTIONS = ("families", "wishlist", "drink_wishlist", "dishes", "drinks")
+
+# What a clone takes unless told otherwise: the setup, not the contributions
+DEFAULT_COLLECTIONS = ("families", "wishlist", "drink_wishlist")
+
+_ROOM_TABLES = {
+    "wishlist": models.WishlistItem.__table__,
+    "drink_wishlist": models.DrinkWishlistItem.__table__,
+    "dishes": models.Dish.__table__,
+    "drinks": models.Drink.__table__,
+}
+
+
+# Columns a copy starts over from rather than taking the source's values:
+# claims belong to the source room's guests, and a copy is a new row at
+# version 1 (both server defaults) created now
+_NOT_COPIED = {"id", "room_id", "claimed_quantity", "version", "created_at"}
+
+
+def _copy_rows(session: Session, table, source_id: int, target_id: int, binds):
+    columns = [column for column in table.columns if column.name not in _NOT_COPIED]
+    values = {"room_id": target_id}
+    if "created_at" in table.c:
+        # Python-side defaults do not apply to INSERT ... SELECT
+        values["created_at"] = datetime.utcnow()
+    rows = select(*columns, *(literal(value) for value in values.values())).where(
+        table.c.room_id == source_id
+    )
+    session.execute(
+        insert(table).from_select(
+            [column.name for column in columns] + list(values), rows
+        ),
+        bind_arguments=binds,
+    )
+
+
+def _copy_families(session: Session, source_id: int, target_id: int, binds):
+    families = models.Family.__table__
+    members = models.Member.__table__
+    _copy_rows(session, families, source_id, target_id, binds)
+
+    # Members follow their family by name, since the copies have new ids
+    old_family = families.alias("old_family")
+    new_family = families.alias("new_family")
+    new_family_id = (
+        select(func.min(new_family.c.id))
+        .where(
+            new_family.c.room_id == target_id, new_family.c.name == old_family.c.name
+        )
+        .scalar_subquery()
+    )
+    rows = (
+        select(members.c.name, new_family_id)
+        .join(old_family, members.c.family_id == old_family.c.id)
+        .where(old_family.c.room_id == source_id)
+    )
+    session.execute(
+        insert(members).from_select(["name", "family_id"], rows),
+        bind_arguments=binds,
+    )
+
+
+def clone_room(
+    session: Session,
+    source_id: int,
+    seed: str,
+    collections=DEFAULT_COLLECTIONS,
+    status: str | None = None,
+) -> models.Room:
+    """Copy room source_id into a new room with the given seed; not committed"""
+    unknown = set(collections) - set(COLLECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown collections: {', '.join(sorted(unknown))}")
+
+    source = session.query(models.Room).filter(models.Room.id == source_id).one()
+    room = models.Room(
+        seed=seed, status=status or source.status, settings=source.settings
+    )
+    binds = {}
+    if database.room_directory is not None:
+        # INSERT ... SELECT cannot span databases, so the copy is placed in
+        # the shard of its source
+        shard = database.room_directory.shard_for_room(source_id)
+        room.id, _ = database.room_directory.register_for(session, seed)
+        database.room_directory.assign(room.id, shard)
+        binds = {"shard_id": shard}
+    session.add(room)
+    session.flush()
+
+    for collection in COLLECTIONS:
+        if collection not in collections:
+            continue
+        if collection == "families":
+            _copy_families(session, source_id, room.id, binds)
+        else:
+            _copy_rows(session, _ROOM_TABLES[collection], source_id, room.id, binds)
+    return room
@@ -1,3 +1,5 @@
+import os
+
 # Family affiliations that will be available in the dropdown
 FAMILY_AFFILIATIONS = [
     {"name": "Razvan", "id": 1},
@@ -14,3 +16,7 @@ MEAL_TYPES = [
 
 # You can easily add more affiliations by adding to this list, for example:
 # {"name": "NewMember", "id": 4}
+
+# Directory where published (frozen) room snapshots are written; served
+# read-only by simple_server.py without touching the database
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./snapshots")
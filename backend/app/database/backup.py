@@ -0,0 +1,314 @@
+"""Online database backups.
+
+SQLite databases (the main file and, with sharding, every shard) are copied
+with SQLite's online backup API, ``BACKUP_PAGES_PER_STEP`` pages at a time
+with a ``BACKUP_STEP_SLEEP_MS`` pause in between, so writers are only held up
+for the duration of one small step. Each backup is a directory
+``BACKUP_DIR/<timestamp>/`` holding the copied files and a ``manifest.json``;
+every copy passes ``PRAGMA integrity_check`` before the backup is kept.
+
+Scheduled backups (``BACKUP_INTERVAL_MINUTES``) are skipped while the
+databases are unchanged since the last one, and only the newest
+``BACKUP_KEEP`` backups are kept. Every worker runs the scheduler, but only
+the one holding the lock on ``BACKUP_DIR/scheduler.lock`` takes backups; the
+lock goes with its process, and another worker takes over at its next tick. With a PostgreSQL ``DATABASE_URL`` the same
+functions run ``pg_dump``/``pg_restore`` (``BACKUP_PG_DUMP``,
+``BACKUP_PG_RESTORE``) instead. ``backup_tool.py`` is the command line.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+from datetime import datetime
+
+from sqlalchemy.engine import make_url
+
+from . import database
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "./backups")
+BACKUP_INTERVAL_MINUTES = float(os.getenv("BACKUP_INTERVAL_MINUTES", "0"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "24"))
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP_MS = float(os.getenv("BACKUP_STEP_SLEEP_MS", "5"))
+BACKUP_PG_DUMP = os.getenv("BACKUP_PG_DUMP", "pg_dump")
+BACKUP_PG_RESTORE = os.getenv("BACKUP_PG_RESTORE", "pg_restore")
+
+MANIFEST = "manifest.json"
+SCHEDULER_LOCK = "scheduler.lock"
+
+logger = logging.getLogger(__name__)
+
+scheduler = None
+
+
+class BackupError(Exception):
+    pass
+
+
+def database_urls() -> dict:
+    """Backup file name -> URL of every database the app uses"""
+    urls = {"main": database.SQLALCHEMY_DATABASE_URL}
+    if database.SHARD_COUNT > 1:
+        for shard in range(database.SHARD_COUNT):
+            urls[f"shard{shard}"] = database.SHARD_URL_TEMPLATE.format(shard=shard)
+    return urls
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _fingerprint(url: str):
+    """Cheap change marker: size and mtime of the database and its WAL"""
+    if not _is_sqlite(url):
+        return None
+    path = make_url(url).database
+    marker = []
+    for name in (path, path + "-wal"):
+        if os.path.exists(name):
+            stat = os.stat(name)
+            marker.append([stat.st_size, stat.st_mtime_ns])
+    return marker
+
+
+def _copy_sqlite(source_path: str, target_path: str) -> None:
+    # Read-only, so a wrong path fails instead of creating an empty database
+    # that would pass the integrity check
+    if not os.path.exists(source_path):
+        raise BackupError(f"{source_path} does not exist")
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(
+            target,
+            pages=BACKUP_PAGES_PER_STEP,
+            sleep=BACKUP_STEP_SLEEP_MS / 1000,
+        )
+    finally:
+        target.close()
+        source.close()
+
+
+def verify_sqlite(path: str) -> None:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"{path} is not a usable database: {e}")
+    finally:
+        conn.close()
+    if result != ["ok"]:
+        raise BackupError(f"{path} failed the integrity check: {'; '.join(result)}")
+
+
+def _libpq_url(url: str) -> str:
+    # pg_dump/pg_restore do not understand SQLAlchemy's "+driver" suffix
+    return make_url(url).set(drivername="postgresql").render_as_string(False)
+
+
+def _dump_postgres(url: str, target_path: str) -> None:
+    subprocess.run(
+        [BACKUP_PG_DUMP, "--format=custom", f"--file={target_path}", _libpq_url(url)],
+        check=True,
+    )
+
+
+def verify_postgres_dump(path: str) -> None:
+    result = subprocess.run(
+        [BACKUP_PG_RESTORE, "--list", path], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise BackupError(f"{path} is not a readable dump: {result.stderr.strip()}")
+
+
+def _file_name(name: str, url: str) -> str:
+    return f"{name}.db" if _is_sqlite(url) else f"{name}.dump"
+
+
+def list_backups():
+    """Backup ids, newest first"""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    return sorted(
+        (
+            entry
+            for entry in os.listdir(BACKUP_DIR)
+            if os.path.exists(os.path.join(BACKUP_DIR, entry, MANIFEST))
+        ),
+        reverse=True,
+    )
+
+
+def read_manifest(backup_id: str) -> dict:
+    path = os.path.join(BACKUP_DIR, backup_id, MANIFEST)
+    if not os.path.exists(path):
+        raise BackupError(f"Unknown backup {backup_id}")
+    with open(path) as f:
+        return json.load(f)
+
+
+def create_backup(skip_unchanged: bool = False, prune_old: bool = True):
+    """Back up every database; returns the backup id, or None when skipped"""
+    urls = database_urls()
+    fingerprints = {name: _fingerprint(url) for name, url in urls.items()}
+    backups = list_backups()
+    if skip_unchanged and backups and None not in fingerprints.values():
+        if read_manifest(backups[0]).get("fingerprints") == fingerprints:
+            return None
+
+    backup_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    directory = os.path.join(BACKUP_DIR, backup_id)
+    # Written under a temporary name so a half-made backup is never listed
+    partial = directory + ".partial"
+    os.makedirs(partial)
+    try:
+        files = {}
+        for name, url in urls.items():
+            file_name = _file_name(name, url)
+            path = os.path.join(partial, file_name)
+            if _is_sqlite(url):
+                _copy_sqlite(make_url(url).database, path)
+                verify_sqlite(path)
+            else:
+                _dump_postgres(url, path)
+                verify_postgres_dump(path)
+            files[name] = {"file": file_name, "size": os.path.getsize(path)}
+        manifest = {
+            "id": backup_id,
+            "created_at": datetime.utcnow().isoformat(),
+            "files": files,
+            "fingerprints": fingerprints,
+        }
+        with open(os.path.join(partial, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(partial, directory)
+    except Exception:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    if prune_old:
+        prune()
+    return backup_id
+
+
+def verify_backup(backup_id: str) -> None:
+    """Raise BackupError unless every file of the backup is intact"""
+    manifest = read_manifest(backup_id)
+    for entry in manifest["files"].values():
+        path = os.path.join(BACKUP_DIR, backup_id, entry["file"])
+        if not os.path.exists(path):
+            raise BackupError(f"{path} is missing")
+        if path.endswith(".db"):
+            verify_sqlite(path)
+        else:
+            verify_postgres_dump(path)
+
+
+def restore_backup(backup_id: str) -> None:
+    """Copy a backup over the current databases.
+
+    Run with the app stopped. The backup is verified first, and SQLite files
+    are restored through the backup API so the target is never half written.
+    """
+    verify_backup(backup_id)
+    manifest = read_manifest(backup_id)
+    urls = database_urls()
+    unknown = set(manifest["files"]) - set(urls)
+    if unknown:
+        raise BackupError(
+            f"Backup has databases this setup does not use: {', '.join(unknown)}"
+        )
+    for name, entry in manifest["files"].items():
+        path = os.path.join(BACKUP_DIR, backup_id, entry["file"])
+        url = urls[name]
+        if _is_sqlite(url):
+            _copy_sqlite(path, make_url(url).database)
+        else:
+            subprocess.run(
+                [
+                    BACKUP_PG_RESTORE,
+                    "--clean",
+                    "--if-exists",
+                    f"--dbname={_libpq_url(url)}",
+                    path,
+                ],
+                check=True,
+            )
+
+
+def prune(keep: int = BACKUP_KEEP) -> list:
+    """Delete all but the newest keep backups; returns the deleted ids"""
+    removed = list_backups()[keep:]
+    for backup_id in removed:
+        shutil.rmtree(os.path.join(BACKUP_DIR, backup_id), ignore_errors=True)
+    return removed
+
+
+def try_scheduler_lock():
+    """The open, exclusively locked scheduler lock file; None if another
+    process holds it. Closing the file (or exiting) releases the lock."""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    lock_file = open(os.path.join(BACKUP_DIR, SCHEDULER_LOCK), "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class BackupScheduler:
+    def __init__(self, interval_minutes: float = BACKUP_INTERVAL_MINUTES):
+        self.interval = interval_minutes * 60
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="backup-scheduler", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._lock_file is None:
+                self._lock_file = try_scheduler_lock()
+                if self._lock_file is None:
+                    continue  # Another worker takes the backups
+            try:
+                backup_id = create_backup(skip_unchanged=True)
+                if backup_id:
+                    logger.info("Created backup %s", backup_id)
+            except Exception:
+                logger.exception("Scheduled backup failed")
+
+
+def start_scheduler():
+    global scheduler
+    if BACKUP_INTERVAL_MINUTES > 0 and scheduler is None:
+        scheduler = BackupScheduler()
+        scheduler.start()
+
+
+def stop_scheduler():
+    global scheduler
+    if scheduler is not None:
+        scheduler.stop()
+        scheduler = None
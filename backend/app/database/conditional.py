@@ -0,0 +1,38 @@
+"""Single-statement conditional updates.
+
+Dishes, drinks and families carry a ``version`` that every update bumps.
+``update_row`` writes only the given columns in one
+``UPDATE ... WHERE ... [AND version = ?] RETURNING ...``: no SELECT before
+and no refresh after. When the caller passes the version it last read and
+someone else has updated the row since, nothing is written and ``None`` is
+returned, as for a row that does not exist; routers then look up which of
+the two happened (the rare path) and answer ``409`` or ``404``.
+"""
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import versioning
+
+
+def update_row(
+    session: Session, model, where: list, changes: dict, version: int | None = None
+) -> dict | None:
+    """Apply changes to the row matching where; returns the updated row"""
+    conditions = list(where)
+    if version is not None:
+        conditions.append(model.version == version)
+    statement = (
+        update(model)
+        .where(*conditions)
+        .values(**changes, version=model.version + 1)
+        .returning(*model.__table__.columns)
+        .execution_options(synchronize_session=False)
+    )
+    row = session.execute(statement).mappings().first()
+    if row is None:
+        return None
+    # The WHERE clause may not name the room (families are updated by id)
+    if row["room_id"] is not None:
+        versioning.mark_changed(session, row["room_id"])
+    return dict(row)
@@ -1,17 +1,229 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import MetaData, create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from . import versioning
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./easter_meals.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./easter_meals.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+# "create" issues DDL on startup (handy for local development), "verify" only
+# checks that the schema created by migrations is in place and never writes.
+SCHEMA_MODE = os.getenv("SCHEMA_MODE", "create")
+
+# With SHARD_COUNT > 1 rooms are spread over several database files, see
+# sharding.py. The main database then only holds the room -> shard directory.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_URL_TEMPLATE = os.getenv(
+    "SHARD_URL_TEMPLATE", "sqlite:///./easter_meals_shard{shard}.db"
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# The engine is created lazily by init_engine() (called from the app lifespan)
+# so importing the app stays cheap and does not open any connection.
+engine = None
+shard_engines = {}
+room_directory = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
 
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys (and so ON DELETE CASCADE) unless asked,
+    # per connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _create_engine(url: str):
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+    sqlite_engine = create_engine(url, connect_args={"check_same_thread": False})
+    event.listen(sqlite_engine, "connect", _enable_foreign_keys)
+    return sqlite_engine
+
+
+def init_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """Create the engine once and bind the session factory to it"""
+    global engine, room_directory
+    if engine is None:
+        engine = _create_engine(url)
+        if SHARD_COUNT > 1:
+            from .sharding import (
+                RoomDirectory,
+                ShardedSession,
+                ShardRouter,
+                sharded_session_options,
+            )
+
+            for shard in range(SHARD_COUNT):
+                shard_engines[str(shard)] = _create_engine(
+                    SHARD_URL_TEMPLATE.format(shard=shard)
+                )
+            room_directory = RoomDirectory(engine, shard_engines)
+            router = ShardRouter(room_directory)
+            # A subclass per factory, as sessionmaker makes for its class_:
+            # the listeners below then stay with this factory's sessions
+            SessionLocal.class_ = type(ShardedSession.__name__, (ShardedSession,), {})
+            SessionLocal.configure(**sharded_session_options(router, shard_engines))
+            event.listen(SessionLocal, "before_flush", router.before_flush)
+            event.listen(SessionLocal, "after_commit", router.after_commit)
+            event.listen(
+                SessionLocal, "after_transaction_end", router.after_transaction_end
+            )
+        else:
+            SessionLocal.configure(bind=engine)
+        versioning.install(SessionLocal)
+    return engine
+
+
+def dispose_engine():
+    """Release pooled connections, e.g. on application shutdown"""
+    global engine
+    if engine is not None:
+        engine.dispose()
+        engine = None
+    for shard_engine in shard_engines.values():
+        shard_engine.dispose()
+    shard_engines.clear()
+
+
+def verify_schema(bind) -> None:
+    """Raise RuntimeError if tables or columns from the models are missing"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    problems = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            problems.append(f"missing table {table.name}")
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                problems.append(f"missing column {table.name}.{column.name}")
+    for table_name, column in stale_foreign_keys(bind):
+        problems.append(f"stale foreign key on {table_name}.{column}")
+    if problems:
+        raise RuntimeError(
+            "Database schema is out of date, run the migrations first: "
+            + ", ".join(problems)
+        )
+
+
+def stale_foreign_keys(bind) -> list:
+    """(table, column) pairs with a foreign key the models no longer declare"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    stale = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        declared = {key.parent.name for key in table.foreign_keys}
+        for foreign_key in inspector.get_foreign_keys(table.name):
+            for column in foreign_key["constrained_columns"]:
+                if column not in declared:
+                    stale.append((table.name, column))
+    return stale
+
+
+def _rebuild_sqlite_table(conn, table) -> None:
+    # SQLite cannot drop a constraint: copy the rows into a table created from
+    # the model, then swap it in (indexes are recreated afterwards)
+    scratch = MetaData()
+    for model_table in Base.metadata.sorted_tables:
+        model_table.to_metadata(scratch)
+    rebuilt = table.to_metadata(scratch, name=f"_rebuild_{table.name}")
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    columns = ", ".join(
+        f'"{column.name}"' for column in table.columns if column.name in existing
+    )
+    conn.execute(CreateTable(rebuilt))
+    conn.exec_driver_sql(
+        f'INSERT INTO "{rebuilt.name}" ({columns}) '
+        f'SELECT {columns} FROM "{table.name}"'
+    )
+    conn.exec_driver_sql(f'DROP TABLE "{table.name}"')
+    conn.exec_driver_sql(f'ALTER TABLE "{rebuilt.name}" RENAME TO "{table.name}"')
+
+
+def drop_stale_foreign_keys(bind) -> None:
+    """Remove foreign keys that were dropped from the models since the tables
+    were created (dishes/drinks.member_id used to reference members.id)"""
+    stale_tables = {name for name, _ in stale_foreign_keys(bind)}
+    if not stale_tables:
+        return
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            for table_name in stale_tables:
+                _rebuild_sqlite_table(conn, Base.metadata.tables[table_name])
+            conn.commit()
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+        else:
+            inspector = inspect(conn)
+            for table_name in stale_tables:
+                table = Base.metadata.tables[table_name]
+                declared = {key.parent.name for key in table.foreign_keys}
+                for foreign_key in inspector.get_foreign_keys(table_name):
+                    if not set(foreign_key["constrained_columns"]) <= declared:
+                        conn.exec_driver_sql(
+                            f'ALTER TABLE "{table_name}" '
+                            f'DROP CONSTRAINT "{foreign_key["name"]}"'
+                        )
+            conn.commit()
+
+
+def add_missing_columns(bind) -> None:
+    """Add columns declared on the models to tables created before them.
+
+    Only works for nullable columns or columns with a server default, which is
+    how new columns on existing tables are declared.
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    preparer = bind.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns:
+                continue
+            definition = CreateColumn(column).compile(dialect=bind.dialect)
+            with bind.begin() as conn:
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {definition}"
+                )
+
+
+def create_missing_indexes(bind) -> None:
+    """Add indexes declared on the models to tables created before them"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+def prepare_schema(bind) -> None:
+    """Create or verify the schema depending on SCHEMA_MODE"""
+    binds = list(shard_engines.values()) if SHARD_COUNT > 1 else [bind]
+    for shard_bind in binds:
+        if SCHEMA_MODE == "verify":
+            verify_schema(shard_bind)
+        else:
+            Base.metadata.create_all(bind=shard_bind)
+            add_missing_columns(shard_bind)
+            drop_stale_foreign_keys(shard_bind)
+            create_missing_indexes(shard_bind)
+    if SHARD_COUNT > 1 and SCHEMA_MODE != "verify":
+        from .sharding import directory_metadata
+
+        directory_metadata.create_all(bind=bind)
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,293 @@
+"""Room sharding across several SQLite database files.
+
+Enabled with ``SHARD_COUNT`` > 1. Every room lives entirely in one shard
+(``SHARD_URL_TEMPLATE`` formatted with the shard number). A directory table in
+the main database maps each room id and seed to its shard and hands out
+globally unique room ids, so ``room_id`` alone is enough to route a query.
+
+Sessions are SQLAlchemy ``ShardedSession`` objects: queries filtering on
+``room_id``, ``Room.id`` or ``Room.seed`` go to the room's shard, and the
+session remembers that shard for the rest of the request so follow-up
+queries (e.g. members by family) stay there. Queries that cannot be routed
+(the global ``/families/`` and ``/members/`` listings) fan out to all shards.
+"""
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import object_session
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+
+directory_metadata = MetaData()
+
+room_shards = Table(
+    "room_shards",
+    directory_metadata,
+    Column("room_id", Integer, primary_key=True, autoincrement=True),
+    Column("seed", String, unique=True, index=True, nullable=False),
+    Column("shard", String, nullable=False),
+)
+
+SESSION_SHARD_KEY = "room_shard"
+# Directory entries a session created, dropped again if it rolls back
+SESSION_REGISTERED_KEY = "registered_rooms"
+
+
+class RoomDirectory:
+    """Room id/seed -> shard mapping, cached in memory"""
+
+    def __init__(self, engine, shard_ids):
+        self.engine = engine
+        self.shard_ids = list(shard_ids)
+        self._by_id = {}
+        self._by_seed = {}
+
+    def _remember(self, room_id, seed, shard):
+        self._by_id[room_id] = shard
+        self._by_seed[seed] = shard
+
+    def _load(self, criteria):
+        with self.engine.connect() as conn:
+            row = conn.execute(select(room_shards).where(criteria)).first()
+        if row is None:
+            return None
+        self._remember(row.room_id, row.seed, row.shard)
+        return row.shard
+
+    def shard_for_room(self, room_id):
+        if room_id in self._by_id:
+            return self._by_id[room_id]
+        return self._load(room_shards.c.room_id == room_id)
+
+    def shard_for_seed(self, seed):
+        if seed in self._by_seed:
+            return self._by_seed[seed]
+        return self._load(room_shards.c.seed == seed)
+
+    def default_shard_for(self, room_id):
+        return self.shard_ids[room_id % len(self.shard_ids)]
+
+    def register(self, seed):
+        """Allocate a global room id for a new room and pick its shard"""
+        with self.engine.begin() as conn:
+            room_id = conn.execute(
+                insert(room_shards).values(seed=seed, shard="")
+            ).inserted_primary_key[0]
+            shard = self.default_shard_for(room_id)
+            conn.execute(
+                update(room_shards)
+                .where(room_shards.c.room_id == room_id)
+                .values(shard=shard)
+            )
+        self._remember(room_id, seed, shard)
+        return room_id, shard
+
+    def assign(self, room_id, shard):
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(room_shards)
+                .where(room_shards.c.room_id == room_id)
+                .values(shard=shard)
+            )
+        self._by_id.pop(room_id, None)
+        self._load(room_shards.c.room_id == room_id)
+
+    def forget(self, room_id, seed):
+        """Drop a deleted room from the directory"""
+        with self.engine.begin() as conn:
+            conn.execute(delete(room_shards).where(room_shards.c.room_id == room_id))
+        self._by_id.pop(room_id, None)
+        self._by_seed.pop(seed, None)
+
+    def register_for(self, session, seed):
+        """register() for a room the session is about to add.
+
+        The directory lives in another database than the room, so the two
+        cannot share a transaction; the entry is forgotten instead when the
+        session's transaction ends without a commit (rollback or close, see
+        ShardRouter.after_transaction_end).
+        """
+        room_id, shard = self.register(seed)
+        session.info.setdefault(SESSION_REGISTERED_KEY, []).append((room_id, seed))
+        return room_id, shard
+
+    def all_rooms(self):
+        with self.engine.connect() as conn:
+            return conn.execute(select(room_shards).order_by("room_id")).all()
+
+
+def equality_filters(statement):
+    """Yield (column, value) pairs compared with == in the WHERE clause"""
+    whereclause = getattr(statement, "whereclause", None)
+    if whereclause is None:
+        return
+    for element in visitors.iterate(whereclause):
+        if (
+            isinstance(element, BinaryExpression)
+            and element.operator is operators.eq
+            and isinstance(element.right, BindParameter)
+            and hasattr(element.left, "table")
+        ):
+            yield element.left, element.right.effective_value
+
+
+class ShardRouter:
+    """The chooser callables handed to ShardedSession"""
+
+    def __init__(self, directory: RoomDirectory):
+        self.directory = directory
+
+    def _remember(self, session, shard):
+        if session is not None and shard is not None:
+            session.info[SESSION_SHARD_KEY] = shard
+        return shard
+
+    def shard_for_statement(self, statement):
+        for column, value in equality_filters(statement):
+            if column.name == "room_id" or (
+                column.table.name == "rooms" and column.name == "id"
+            ):
+                return (
+                    self.directory.shard_for_room(value) or self.directory.shard_ids[0]
+                )
+            if column.table.name == "rooms" and column.name == "seed":
+                return (
+                    self.directory.shard_for_seed(value) or self.directory.shard_ids[0]
+                )
+        return None
+
+    def shard_chooser(self, mapper, instance, clause=None):
+        session = object_session(instance) if instance is not None else None
+        shard = None
+        if instance is not None:
+            if mapper.class_.__tablename__ == "rooms":
+                shard = self.directory.shard_for_room(instance.id)
+            elif getattr(instance, "room_id", None) is not None:
+                shard = self.directory.shard_for_room(instance.room_id)
+            elif session is not None:
+                shard = session.info.get(SESSION_SHARD_KEY)
+        if shard is None and clause is not None:
+            shard = self.shard_for_statement(clause)
+        return self._remember(session, shard or self.directory.shard_ids[0])
+
+    def identity_chooser(self, mapper, primary_key, *, lazy_loaded_from, **kw):
+        if lazy_loaded_from is not None:
+            return [lazy_loaded_from.identity_token]
+        if mapper.class_.__tablename__ == "rooms":
+            shard = self.directory.shard_for_room(primary_key[0])
+            return [shard] if shard else [self.directory.shard_ids[0]]
+        return self.directory.shard_ids
+
+    def execute_chooser(self, context):
+        # Only SELECTs carry load options; bulk UPDATE/DELETE are routed by
+        # their WHERE clause
+        if context.is_select and context.lazy_loaded_from is not None:
+            return [context.lazy_loaded_from.identity_token]
+        shard = self.shard_for_statement(context.statement)
+        if shard is not None:
+            return [self._remember(context.session, shard)]
+        remembered = context.session.info.get(SESSION_SHARD_KEY)
+        return [remembered] if remembered else self.directory.shard_ids
+
+    def before_flush(self, session, flush_context, instances):
+        # Rooms get their id from the directory so ids are unique across shards
+        for obj in session.new:
+            if getattr(obj, "__tablename__", None) == "rooms" and obj.id is None:
+                obj.id, shard = self.directory.register_for(session, obj.seed)
+                self._remember(session, shard)
+
+    def after_commit(self, session):
+        session.info.pop(SESSION_REGISTERED_KEY, None)
+
+    def after_transaction_end(self, session, transaction):
+        # Runs after after_commit, so anything left was never committed
+        if transaction.parent is not None:
+            return
+        for room_id, seed in session.info.pop(SESSION_REGISTERED_KEY, ()):
+            self.directory.forget(room_id, seed)
+
+
+def sharded_session_options(router: ShardRouter, engines: dict) -> dict:
+    """Keyword arguments for a sessionmaker producing ShardedSession objects"""
+    return {
+        "shards": engines,
+        "shard_chooser": router.shard_chooser,
+        "identity_chooser": router.identity_chooser,
+        "execute_chooser": router.execute_chooser,
+    }
+
+
+def move_room(directory: RoomDirectory, engines: dict, room_id: int, target: str):
+    """Copy a room to another shard, switch the directory, then drop the old copy.
+
+    Family, member and item ids are reassigned by the target shard since they
+    are only unique within a shard; the room id is global and kept.
+    """
+    from ..models import models
+
+    source = directory.shard_for_room(room_id)
+    if source is None:
+        raise ValueError(f"Unknown room {room_id}")
+    if source == target:
+        return
+
+    room_tables = [
+        models.Dish.__table__,
+        models.Drink.__table__,
+        models.WishlistItem.__table__,
+        models.DrinkWishlistItem.__table__,
+    ]
+    families = models.Family.__table__
+    members = models.Member.__table__
+    rooms = models.Room.__table__
+
+    def without_id(row):
+        values = dict(row._mapping)
+        values.pop("id")
+        return values
+
+    with engines[source].connect() as src, engines[target].begin() as dst:
+        room = src.execute(select(rooms).where(rooms.c.id == room_id)).first()
+        if room is None:
+            raise ValueError(f"Room {room_id} is not in shard {source}")
+        dst.execute(insert(rooms).values(**room._mapping))
+        for family in src.execute(
+            select(families).where(families.c.room_id == room_id)
+        ):
+            new_family_id = dst.execute(
+                insert(families).values(**without_id(family))
+            ).inserted_primary_key[0]
+            for member in src.execute(
+                select(members).where(members.c.family_id == family.id)
+            ):
+                dst.execute(
+                    insert(members).values(
+                        **dict(without_id(member), family_id=new_family_id)
+                    )
+                )
+        for table in room_tables:
+            rows = [
+                without_id(row)
+                for row in src.execute(select(table).where(table.c.room_id == room_id))
+            ]
+            if rows:
+                dst.execute(insert(table), rows)
+
+    directory.assign(room_id, target)
+
+    with engines[source].begin() as src:
+        family_ids = select(families.c.id).where(families.c.room_id == room_id)
+        src.execute(delete(members).where(members.c.family_id.in_(family_ids)))
+        for table in room_tables + [families]:
+            src.execute(delete(table).where(table.c.room_id == room_id))
+        src.execute(delete(rooms).where(rooms.c.id == room_id))
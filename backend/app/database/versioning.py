@@ -0,0 +1,111 @@
+"""Room versions.
+
+``rooms.version`` is bumped by every committed transaction that changes a
+room's content, so it can key caches and ETags for everything served about a
+room. Listeners on the session factory collect the rooms a transaction
+touches (flushed objects carrying a ``room_id``, and bulk UPDATE/DELETE
+statements filtering on one) and increment their versions just before the
+commit, in the same transaction. Routers therefore need no extra calls, as
+long as bulk statements filter on ``room_id`` (or ``Room.id``).
+"""
+
+from itertools import chain
+
+from sqlalchemy import column, event, table, update
+
+# Tables whose rows make up what is served about a room
+CONTENT_TABLES = {
+    "rooms",
+    "families",
+    "dishes",
+    "drinks",
+    "wishlist_items",
+    "drink_wishlist_items",
+}
+
+SESSION_CHANGED_KEY = "changed_rooms"
+
+rooms = table("rooms", column("id"), column("version"))
+
+
+def _changed(session) -> set:
+    return session.info.setdefault(SESSION_CHANGED_KEY, set())
+
+
+def before_flush(session, flush_context, instances):
+    changed = _changed(session)
+    modified = (obj for obj in session.dirty if session.is_modified(obj))
+    for obj in chain(session.new, modified, session.deleted):
+        table_name = getattr(obj, "__tablename__", None)
+        if table_name not in CONTENT_TABLES:
+            continue
+        if table_name == "rooms" and obj in session.new:
+            continue  # New rooms start at version 1
+        room_id = obj.id if table_name == "rooms" else obj.room_id
+        if room_id is not None:
+            changed.add(room_id)
+
+
+def do_orm_execute(orm_context):
+    # Core statements (like the version bump itself) are left alone
+    if not orm_context.is_orm_statement:
+        return
+    if not (orm_context.is_update or orm_context.is_delete):
+        return
+    # Imported here like the rest of sharding, which is only loaded on demand
+    from .sharding import equality_filters
+
+    room_ids = {
+        value
+        for filter_column, value in equality_filters(orm_context.statement)
+        if filter_column.table.name in CONTENT_TABLES
+        and (
+            filter_column.name == "room_id"
+            or (filter_column.table.name == "rooms" and filter_column.name == "id")
+        )
+    }
+    if not room_ids:
+        return
+
+    # Conditional updates that match nothing (a lost compare-and-set) must
+    # not bump the version, so the statement is run here to see what it did
+    result = orm_context.invoke_statement()
+    if not orm_context.statement.exported_columns:
+        # Unknown (-1) counts as a change
+        matched = getattr(result, "rowcount", -1) != 0
+    else:
+        # UPDATE ... RETURNING through the ORM: buffer the rows to count them
+        frozen = result.freeze()
+        matched = bool(frozen.data)
+        result = frozen()
+    if matched:
+        _changed(orm_context.session).update(room_ids)
+    return result
+
+
+def mark_changed(session, room_id: int) -> None:
+    """Count a room as changed by a write the listeners cannot attribute,
+    such as an UPDATE filtered on the row id only"""
+    _changed(session).add(room_id)
+
+
+def before_commit(session):
+    session.flush()
+    changed = session.info.pop(SESSION_CHANGED_KEY, None)
+    for room_id in sorted(changed or ()):
+        session.execute(
+            update(rooms)
+            .where(rooms.c.id == room_id)
+            .values(version=rooms.c.version + 1)
+        )
+
+
+def after_rollback(session):
+    session.info.pop(SESSION_CHANGED_KEY, None)
+
+
+def install(session_factory):
+    event.listen(session_factory, "before_flush", before_flush)
+    event.listen(session_factory, "do_orm_execute", do_orm_execute)
+    event.listen(session_factory, "before_commit", before_commit)
+    event.listen(session_factory, "after_rollback", after_rollback)
@@ -0,0 +1,190 @@
+"""Group-commit write pipeline.
+
+When ``WRITE_QUEUE`` is enabled, write operations from concurrent requests are
+handed to a single writer thread which runs them in small batched
+transactions: one lock acquisition and one fsync per batch instead of per
+request. Each request blocks on its own future, and an operation that fails
+only fails its own request: the batch is rolled back and replayed without it.
+Batches that SQLite refuses as busy or locked (``SQLITE_BUSY`` and
+``SQLITE_LOCKED``, another connection holds the lock) are retried with
+exponential backoff.
+
+Operations are callables taking a session and returning what to hand back to
+the request (usually the created or updated object). Use ``run_write`` from
+the routers; it falls back to committing on the request session when the
+queue is disabled.
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from . import database
+
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE", "0") == "1"
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "32"))
+WRITE_MAX_WAIT_MS = float(os.getenv("WRITE_MAX_WAIT_MS", "5"))
+WRITE_BUSY_RETRIES = int(os.getenv("WRITE_BUSY_RETRIES", "5"))
+WRITE_BUSY_BACKOFF_MS = float(os.getenv("WRITE_BUSY_BACKOFF_MS", "10"))
+
+logger = logging.getLogger(__name__)
+
+writer = None
+
+
+def _is_busy(error: OperationalError) -> bool:
+    """Whether SQLite refused the statement because the database is locked"""
+    # The extended result codes (SQLITE_BUSY_SNAPSHOT, ...) keep the primary
+    # code in their low byte
+    if not isinstance(error.orig, sqlite3.OperationalError):
+        return False
+    code = error.orig.sqlite_errorcode & 0xFF
+    return code in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+class _OperationFailed(Exception):
+    def __init__(self, index: int, error: Exception):
+        self.index = index
+        self.error = error
+
+
+class WriteQueue:
+    def __init__(
+        self,
+        session_factory,
+        max_batch_size: int = WRITE_BATCH_SIZE,
+        max_wait_ms: float = WRITE_MAX_WAIT_MS,
+        busy_retries: int = WRITE_BUSY_RETRIES,
+        busy_backoff_ms: float = WRITE_BUSY_BACKOFF_MS,
+    ):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.busy_retries = busy_retries
+        self.busy_backoff = busy_backoff_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._run, name="write-queue", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Finish the queued operations, then stop the writer thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def submit(self, operation) -> Future:
+        future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the stop marker back so the loop ends after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        pending = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        attempt = 0
+        while pending:
+            session = self.session_factory(expire_on_commit=False)
+            try:
+                results = []
+                for index, (operation, _) in enumerate(pending):
+                    try:
+                        results.append(operation(session))
+                        session.flush()
+                    except OperationalError as e:
+                        if _is_busy(e):
+                            raise
+                        raise _OperationFailed(index, e)
+                    except Exception as e:
+                        raise _OperationFailed(index, e)
+                session.commit()
+            except _OperationFailed as failed:
+                # Replay the rest of the batch without the failing operation
+                session.rollback()
+                pending.pop(failed.index)[1].set_exception(failed.error)
+                continue
+            except OperationalError as e:
+                session.rollback()
+                if _is_busy(e) and attempt < self.busy_retries:
+                    time.sleep(self.busy_backoff * 2**attempt)
+                    attempt += 1
+                    continue
+                for _, future in pending:
+                    future.set_exception(e)
+                return
+            except Exception as e:
+                session.rollback()
+                logger.exception("Write batch failed")
+                for _, future in pending:
+                    future.set_exception(e)
+                return
+            finally:
+                session.close()
+
+            for (_, future), result in zip(pending, results):
+                future.set_result(result)
+            return
+
+
+def start_writer():
+    global writer
+    if WRITE_QUEUE_ENABLED and writer is None:
+        writer = WriteQueue(database.SessionLocal)
+        writer.start()
+
+
+def stop_writer():
+    global writer
+    if writer is not None:
+        writer.stop()
+        writer = None
+
+
+def run_write(db: Session, operation):
+    """Run operation(session) in a committed transaction and return its result"""
+    if writer is not None:
+        # End the request's read transaction first: it returns the connection
+        # to the pool while waiting and expires objects the writer may change
+        db.commit()
+        return writer.submit(operation).result()
+    result = operation(db)
+    db.commit()
+    if inspect(result, raiseerr=False) is not None:
+        db.refresh(result)
+    return result
@@ -0,0 +1,436 @@
+"""In-memory store for hot rooms.
+
+With ``HOT_ROOMS_MEMORY_MB`` set, the first read of a room loads its
+families, members, dishes, drinks and wishlists into compact records (one
+``__slots__`` class per table, no ORM state) and later list, roster and
+snapshot reads are served from memory. Rooms are evicted least recently used
+first once their estimated size exceeds the budget.
+
+The store is kept current write-through: listeners on the session factory
+collect every row the routers add, change or delete, and apply them to the
+cached rooms once the transaction commits, so rolled back writes never show
+up. Each change is applied to its own room only (members through their
+family), since with ``SHARD_COUNT`` > 1 row ids repeat across shards. UPDATE
+statements on a single ``id`` are re-read just before the commit; changes the
+listeners cannot replay (other bulk updates, bulk deletes not filtered on
+``id``) evict the room instead, or every room when the statement does not say
+which one. The store lives in the process: with several
+workers, writes made by one worker are not seen by the others, so enable it
+only for single-process deployments.
+"""
+
+import itertools
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+from .database import database
+from .models import models
+
+HOT_ROOMS_MEMORY_MB = float(os.getenv("HOT_ROOMS_MEMORY_MB", "0"))
+
+# Table -> collection name, for the tables cached per room
+COLLECTIONS = {
+    "families": "families",
+    "dishes": "dishes",
+    "drinks": "drinks",
+    "wishlist_items": "wishlist",
+    "drink_wishlist_items": "drink_wishlist",
+}
+
+MODELS = {
+    "families": models.Family,
+    "members": models.Member,
+    "dishes": models.Dish,
+    "drinks": models.Drink,
+    "wishlist_items": models.WishlistItem,
+    "drink_wishlist_items": models.DrinkWishlistItem,
+}
+
+SESSION_CHANGES_KEY = "hot_room_changes"
+
+
+class Record:
+    """Immutable-by-convention copy of one row; changes replace the record"""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, obj):
+        return cls(*(getattr(obj, name) for name in cls.__slots__))
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def size(self) -> int:
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(getattr(self, name)) for name in self.__slots__
+        )
+
+
+RECORDS = {
+    table_name: type(
+        model.__name__ + "Record",
+        (Record,),
+        {"__slots__": tuple(column.name for column in model.__table__.columns)},
+    )
+    for table_name, model in MODELS.items()
+}
+
+
+class HotRoom:
+    __slots__ = ("id", "seed", "status", "settings", "collections", "members")
+
+    def __init__(self, room):
+        self.id = room.id
+        self.seed = room.seed
+        self.status = room.status
+        self.settings = room.settings
+        # Collection -> {id: record}, oldest first
+        self.collections = {name: {} for name in COLLECTIONS.values()}
+        # Family id -> {member id: record}
+        self.members = {}
+
+    def newest(self, collection: str, skip: int = 0, limit: int | None = None):
+        """Records newest first, like the ORDER BY created_at DESC queries"""
+        items = reversed(self.collections[collection].values())
+        stop = None if limit is None else skip + limit
+        return list(itertools.islice(items, skip, stop))
+
+    def rows(self, collection: str) -> list:
+        return sorted(self.collections[collection].values(), key=lambda r: r.id)
+
+    def member_rows(self) -> list:
+        members = itertools.chain.from_iterable(
+            records.values() for records in self.members.values()
+        )
+        return sorted(members, key=lambda r: r.id)
+
+    def family_members(self, family) -> list:
+        return list(self.members.get(family.id, {}).values())
+
+    def size(self) -> int:
+        total = sys.getsizeof(self) + len(str(self.settings))
+        for records in itertools.chain(
+            self.collections.values(), self.members.values()
+        ):
+            total += sys.getsizeof(records)
+            total += sum(record.size() for record in records.values())
+        return total
+
+    def put(self, table_name: str, record: Record) -> None:
+        if table_name == "members":
+            self.members.setdefault(record.family_id, {})[record.id] = record
+            return
+        records = self.collections[COLLECTIONS[table_name]]
+        records[record.id] = record
+
+    def delete(self, table_name: str, row_id: int) -> bool:
+        if table_name == "members":
+            for records in self.members.values():
+                if records.pop(row_id, None) is not None:
+                    return True
+            return False
+        if table_name == "families":
+            # Members go with the family through ON DELETE CASCADE
+            self.members.pop(row_id, None)
+        return self.collections[COLLECTIONS[table_name]].pop(row_id, None) is not None
+
+
+class HotRoomStore:
+    def __init__(self, memory_budget: int):
+        self.memory_budget = memory_budget
+        self._rooms = OrderedDict()  # room id -> HotRoom, least recent first
+        self._sizes = {}
+        self._seeds = {}
+        self._loading = {}  # room id -> True once a commit changed it mid-load
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rooms": len(self._rooms),
+                "bytes": sum(self._sizes.values()),
+                "memory_budget": self.memory_budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def get(self, room_id: int | None = None, seed: str | None = None):
+        """The cached room, loading it on first access; None if it does not exist"""
+        with self._lock:
+            if room_id is None:
+                room_id = self._seeds.get(seed)
+            room = self._rooms.get(room_id)
+            if room is not None:
+                self._rooms.move_to_end(room_id)
+                self.hits += 1
+                return room
+            self.misses += 1
+        return self._load(room_id, seed)
+
+    def _load(self, room_id, seed):
+        # A fresh session, so no read can predate the registration in
+        # _loading and miss a commit that apply() would have flagged
+        with database.SessionLocal() as session:
+            if room_id is None:
+                room_id = (
+                    session.query(models.Room.id)
+                    .filter(models.Room.seed == seed)
+                    .scalar()
+                )
+                if room_id is None:
+                    return None
+            with self._lock:
+                self._loading[room_id] = False
+            try:
+                room = self._read_room(session, room_id)
+                if room is None:
+                    return None
+                size = room.size()
+                with self._lock:
+                    # Changed while loading: serve this read, cache the next
+                    if (
+                        self._loading.get(room_id) is False
+                        and size <= self.memory_budget
+                    ):
+                        self._insert(room, size)
+                return room
+            finally:
+                with self._lock:
+                    self._loading.pop(room_id, None)
+
+    @staticmethod
+    def _read_room(session, room_id: int) -> HotRoom | None:
+        db_room = session.query(models.Room).filter(models.Room.id == room_id).first()
+        if db_room is None:
+            return None
+        room = HotRoom(db_room)
+        for table_name, model in MODELS.items():
+            if table_name == "members":
+                continue
+            order = [model.id]
+            if hasattr(model, "created_at"):
+                order.insert(0, model.created_at)
+            rows = (
+                session.query(model).filter(model.room_id == room_id).order_by(*order)
+            )
+            for obj in rows:
+                room.put(table_name, RECORDS[table_name].from_row(obj))
+        family_ids = list(room.collections["families"])
+        if family_ids:
+            rows = (
+                session.query(models.Member)
+                .filter(models.Member.family_id.in_(family_ids))
+                .order_by(models.Member.id)
+            )
+            for obj in rows:
+                room.put("members", RECORDS["members"].from_row(obj))
+        return room
+
+    def watches(self, room_id: int) -> bool:
+        """Whether changes to the room must be applied: cached or loading"""
+        with self._lock:
+            return room_id in self._rooms or room_id in self._loading
+
+    def _insert(self, room: HotRoom, size: int) -> None:
+        self._rooms[room.id] = room
+        self._sizes[room.id] = size
+        self._seeds[room.seed] = room.id
+        while sum(self._sizes.values()) > self.memory_budget:
+            self._evict(next(iter(self._rooms)))
+            self.evictions += 1
+
+    def _evict(self, room_id: int) -> None:
+        room = self._rooms.pop(room_id, None)
+        self._sizes.pop(room_id, None)
+        if room is not None:
+            self._seeds.pop(room.seed, None)
+        if room_id in self._loading:
+            self._loading[room_id] = True
+
+    def _clear(self) -> None:
+        for room_id in list(self._rooms):
+            self._evict(room_id)
+        for room_id in self._loading:
+            self._loading[room_id] = True
+
+    def apply(self, changes: list) -> None:
+        """Replay the changes of a committed transaction"""
+        with self._lock:
+            touched = set()
+            for change in changes:
+                kind = change[0]
+                if kind == "clear":
+                    self._clear()
+                elif kind == "evict":
+                    self._evict(change[1])
+                elif kind == "room":
+                    room = self._rooms.get(change[1].id)
+                    if room is not None:
+                        room.status = change[1].status
+                        room.settings = change[1].settings
+                    elif change[1].id in self._loading:
+                        self._loading[change[1].id] = True
+                elif kind in ("put", "delete"):
+                    _, table_name, room_id, row = change
+                    if room_id is None:
+                        # Row ids alone do not say which room (they repeat
+                        # across shards)
+                        self._clear()
+                        continue
+                    room = self._rooms.get(room_id)
+                    if room is not None:
+                        if kind == "put":
+                            room.put(table_name, row)
+                            touched.add(room_id)
+                        elif room.delete(table_name, row):
+                            touched.add(room_id)
+                    if room_id in self._loading:
+                        self._loading[room_id] = True
+            for room_id in touched & self._rooms.keys():
+                self._sizes[room_id] = self._rooms[room_id].size()
+            while sum(self._sizes.values()) > self.memory_budget:
+                self._evict(next(iter(self._rooms)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for room_id in list(self._rooms):
+                self._evict(room_id)
+
+
+store = (
+    HotRoomStore(int(HOT_ROOMS_MEMORY_MB * 1024 * 1024))
+    if HOT_ROOMS_MEMORY_MB
+    else None
+)
+
+
+def get(room_id: int | None = None, seed: str | None = None) -> HotRoom | None:
+    """The room from memory, or None when the store is off (or no such room)"""
+    if store is None:
+        return None
+    return store.get(room_id, seed)
+
+
+def clear() -> None:
+    if store is not None:
+        store.clear()
+
+
+def _changes(session) -> list:
+    return session.info.setdefault(SESSION_CHANGES_KEY, [])
+
+
+def _room_id(obj) -> int | None:
+    """Room of a row; members have none of their own and go by their family"""
+    if isinstance(obj, models.Member):
+        family = obj.family
+        return family.room_id if family is not None else None
+    return obj.room_id
+
+
+def before_flush(session, flush_context, instances):
+    changes = _changes(session)
+    modified = (obj for obj in session.dirty if session.is_modified(obj))
+    for obj in itertools.chain(session.new, modified):
+        if isinstance(obj, models.Room) or obj.__tablename__ in MODELS:
+            # Turned into records at commit time, once ids and defaults are set
+            changes.append(("pending", obj))
+    for obj in session.deleted:
+        if isinstance(obj, models.Room):
+            changes.append(("evict", obj.id))
+        elif obj.__tablename__ in MODELS:
+            changes.append(("delete", obj.__tablename__, _room_id(obj), obj.id))
+
+
+def do_orm_execute(orm_context):
+    if not orm_context.is_orm_statement:
+        return
+    if not (orm_context.is_update or orm_context.is_delete):
+        return
+    from .database.sharding import equality_filters
+
+    table_name = orm_context.statement.table.name
+    if table_name != "rooms" and table_name not in MODELS:
+        return
+    filters = {
+        filter_column.name: value
+        for filter_column, value in equality_filters(orm_context.statement)
+        if filter_column.table.name == table_name
+    }
+    changes = _changes(orm_context.session)
+    if table_name == "rooms":
+        changes.append(("evict", filters["id"]) if "id" in filters else ("clear",))
+    elif orm_context.is_delete and "id" in filters:
+        changes.append(("delete", table_name, filters.get("room_id"), filters["id"]))
+    elif "id" in filters:
+        # Single-row UPDATE (conditional.update_row): re-read at commit time
+        changes.append(("refresh", table_name, filters.get("room_id"), filters["id"]))
+    elif "room_id" in filters:
+        changes.append(("evict", filters["room_id"]))
+    else:
+        changes.append(("clear",))
+
+
+def _refresh(session, table_name: str, room_id: int | None, row_id: int):
+    if room_id is not None and not store.watches(room_id):
+        # Not cached: evicting is free and flags a load in progress
+        return ("evict", room_id)
+    model = MODELS[table_name]
+    query = session.query(model).filter(model.id == row_id)
+    if room_id is not None:
+        query = query.filter(model.room_id == room_id)
+    obj = query.populate_existing().first()
+    if obj is None:
+        return ("delete", table_name, room_id, row_id)
+    return ("put", table_name, _room_id(obj), RECORDS[table_name].from_row(obj))
+
+
+def before_commit(session):
+    session.flush()
+    changes = session.info.get(SESSION_CHANGES_KEY)
+    for index, change in enumerate(changes or ()):
+        if change[0] == "refresh":
+            changes[index] = _refresh(session, *change[1:])
+        if change[0] != "pending":
+            continue
+        obj = change[1]
+        if isinstance(obj, models.Room):
+            changes[index] = ("room", HotRoom(obj))
+        else:
+            record = RECORDS[obj.__tablename__].from_row(obj)
+            changes[index] = ("put", obj.__tablename__, _room_id(obj), record)
+
+
+def after_commit(session):
+    changes = session.info.pop(SESSION_CHANGES_KEY, None)
+    if changes:
+        store.apply(changes)
+
+
+def after_rollback(session):
+    session.info.pop(SESSION_CHANGES_KEY, None)
+
+
+def install(session_factory):
+    """Keep the store current; a no-op unless HOT_ROOMS_MEMORY_MB is set"""
+    if store is None or event.contains(session_factory, "after_commit", after_commit):
+        return
+    event.listen(session_factory, "before_flush", before_flush)
+    event.listen(session_factory, "do_orm_execute", do_orm_execute)
+    event.listen(session_factory, "before_commit", before_commit)
+    event.listen(session_factory, "after_commit", after_commit)
+    event.listen(session_factory, "after_rollback", after_rollback)
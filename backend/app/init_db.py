@@ -1,8 +1,9 @@
-from database.database import SessionLocal
+from database.database import SessionLocal, init_engine
 from models.models import Family, Member
 
 
 def init_db():
+    init_engine()
     db = SessionLocal()
     try:
         # Create a default family
@@ -0,0 +1,286 @@
+"""In-process background jobs.
+
+Long-running operations are registered with ``@handler("kind")`` and started
+with ``submit``, which stores a row in the ``jobs`` table and returns at once;
+a bounded pool of ``JOB_WORKERS`` threads runs queued jobs, highest
+``priority`` first. Handlers receive a ``JobContext`` to report progress and
+to notice cancellation, plus a session of their own, and return a
+JSON-serializable result stored on the job. Status is served by
+``/api/jobs/{id}``.
+
+Jobs are claimed with a conditional UPDATE, so when several processes share
+the database each job runs once. A claim names the runner that holds it and
+is a lease of ``JOB_LEASE_SECONDS``, renewed by a heartbeat thread while the
+job runs. Running jobs whose lease has run out belonged to a process that
+went away: they are marked failed (at startup and on every heartbeat), and
+a runner only records the outcome of a job it still holds. On startup, queued
+jobs left by a previous process are picked up again.
+"""
+
+import itertools
+import logging
+import os
+import queue
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from .database import database
+from .models.models import Job, JobStatus
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+runner = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def handler(kind: str):
+    """Register the function running jobs of the given kind"""
+
+    def register(func):
+        _handlers[kind] = func
+        return func
+
+    return register
+
+
+class JobContext:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    def _update(self, **values):
+        db = database.SessionLocal()
+        try:
+            db.query(Job).filter(Job.id == self.job_id).update(values)
+            db.commit()
+        finally:
+            db.close()
+
+    def progress(self, fraction: float, message: str | None = None):
+        """Record progress (0..1) and stop if cancellation was requested"""
+        self.check_cancelled()
+        self._update(progress=max(0.0, min(1.0, fraction)), message=message)
+
+    def check_cancelled(self):
+        db = database.SessionLocal()
+        try:
+            cancel = (
+                db.query(Job.cancel_requested).filter(Job.id == self.job_id).scalar()
+            )
+        finally:
+            db.close()
+        if cancel:
+            raise JobCancelled()
+
+
+class JobRunner:
+    def __init__(self, workers: int = JOB_WORKERS, lease_seconds=JOB_LEASE_SECONDS):
+        # Unique per runner, so a restarted process never inherits old claims
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease = timedelta(seconds=lease_seconds)
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._stopping = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True)
+            for n in range(workers)
+        ]
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat, name="job-heartbeat", daemon=True
+        )
+
+    def start(self):
+        self._recover()
+        for thread in self._threads:
+            thread.start()
+        self._heartbeat_thread.start()
+
+    def stop(self):
+        """Let running jobs finish, leave queued ones for the next start"""
+        for _ in self._threads:
+            self._queue.put((float("-inf"), next(self._order), None))
+        for thread in self._threads:
+            thread.join()
+        self._stopping.set()
+        self._heartbeat_thread.join()
+
+    def enqueue(self, job_id: str, priority: int):
+        # PriorityQueue pops the smallest entry; the counter keeps FIFO order
+        self._queue.put((-priority, next(self._order), job_id))
+
+    def _fail_abandoned(self, db: Session):
+        """Mark failed the running jobs whose runner stopped renewing them"""
+        now = datetime.utcnow()
+        db.query(Job).filter(
+            Job.status == JobStatus.running,
+            # No lease: claimed by a runner from before leases existed
+            Job.lease_expires_at.is_(None) | (Job.lease_expires_at < now),
+        ).update(
+            {
+                "status": JobStatus.failed,
+                "error": "Interrupted: its worker stopped",
+                "finished_at": now,
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+
+    def _recover(self):
+        db = database.SessionLocal()
+        try:
+            self._fail_abandoned(db)
+            for job_id, priority in db.query(Job.id, Job.priority).filter(
+                Job.status == JobStatus.queued
+            ):
+                self.enqueue(job_id, priority)
+        finally:
+            db.close()
+
+    def _heartbeat(self):
+        # Renewing at a third of the lease leaves room for two missed beats
+        while not self._stopping.wait(self.lease.total_seconds() / 3):
+            db = database.SessionLocal()
+            try:
+                db.query(Job).filter(
+                    Job.owner == self.owner, Job.status == JobStatus.running
+                ).update(
+                    {"lease_expires_at": datetime.utcnow() + self.lease},
+                    synchronize_session=False,
+                )
+                db.commit()
+                self._fail_abandoned(db)
+            except Exception:
+                logger.exception("Job heartbeat failed")
+            finally:
+                db.close()
+
+    def _work(self):
+        while True:
+            _, _, job_id = self._queue.get()
+            if job_id is None:
+                return
+            try:
+                self._run(job_id)
+            except Exception:
+                logger.exception("Job %s crashed", job_id)
+
+    def _claim(self, db: Session, job_id: str) -> bool:
+        now = datetime.utcnow()
+        claimed = (
+            db.query(Job)
+            .filter(Job.id == job_id, Job.status == JobStatus.queued)
+            .update(
+                {
+                    "status": JobStatus.running,
+                    "started_at": now,
+                    "owner": self.owner,
+                    "lease_expires_at": now + self.lease,
+                }
+            )
+        )
+        db.commit()
+        return claimed == 1
+
+    def _finish(self, db: Session, job_id: str, **values):
+        db.rollback()
+        values["finished_at"] = datetime.utcnow()
+        # Only while the claim holds: once the lease ran out the job may have
+        # been failed, and that outcome is what clients were told
+        db.query(Job).filter(
+            Job.id == job_id,
+            Job.owner == self.owner,
+            Job.status == JobStatus.running,
+        ).update(values)
+        db.commit()
+
+    def _run(self, job_id: str):
+        db = database.SessionLocal()
+        try:
+            if not self._claim(db, job_id):
+                return  # Cancelled, or taken by another process
+            job = db.query(Job).filter(Job.id == job_id).one()
+            run = _handlers.get(job.kind)
+            if run is None:
+                self._finish(
+                    db, job_id, status=JobStatus.failed, error="Unknown job kind"
+                )
+                return
+            try:
+                result = run(JobContext(job_id), db, **(job.params or {}))
+            except JobCancelled:
+                self._finish(db, job_id, status=JobStatus.cancelled)
+            except Exception as e:
+                logger.exception("Job %s failed", job_id)
+                self._finish(db, job_id, status=JobStatus.failed, error=str(e))
+            else:
+                self._finish(
+                    db,
+                    job_id,
+                    status=JobStatus.succeeded,
+                    progress=1.0,
+                    result=result,
+                )
+        finally:
+            db.close()
+
+
+def submit(
+    db: Session,
+    kind: str,
+    params: dict | None = None,
+    room_id: int | None = None,
+    priority: int = 0,
+) -> Job:
+    """Persist a job and queue it; returns the stored job"""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind {kind}")
+    job = Job(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        room_id=room_id,
+        priority=priority,
+        params=params or {},
+        status=JobStatus.queued,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    if runner is not None:
+        runner.enqueue(job.id, priority)
+    return job
+
+
+def cancel(db: Session, job: Job) -> Job:
+    """Cancel a queued job right away, or ask a running one to stop"""
+    if job.status == JobStatus.queued:
+        db.query(Job).filter(Job.id == job.id, Job.status == JobStatus.queued).update(
+            {"status": JobStatus.cancelled, "finished_at": datetime.utcnow()}
+        )
+    db.query(Job).filter(Job.id == job.id).update({"cancel_requested": True})
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def start_runner():
+    global runner
+    if runner is None and JOB_WORKERS > 0:
+        runner = JobRunner()
+        runner.start()
+
+
+def stop_runner():
+    global runner
+    if runner is not None:
+        runner.stop()
+        runner = None
@@ -1,13 +1,42 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import meals, families, members, wishlist, rooms, drinks, drink_wishlist
-from .database.database import engine
-from .models import models
+from .routers import admin, jobs as jobs_router, suggest as suggest_router
+from .routers import templates
+from .jobs import start_runner, stop_runner
+from . import capture, hot_rooms, profiling, single_flight, suggest, tracing
+from .wire import CompressionMiddleware
+from .database import database
+from .database.database import init_engine, dispose_engine, prepare_schema
+from .database.write_queue import start_writer, stop_writer
+from .database.backup import start_scheduler, stop_scheduler
+from .models import models  # noqa: F401  (registers the tables on Base.metadata)
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Easter Meal Planning API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Engine creation and schema work happen per process at startup instead of
+    # at import time, so importing the app never touches the database
+    prepare_schema(init_engine())
+    # After init_engine, which may swap in the sharded session class
+    hot_rooms.install(database.SessionLocal)
+    with database.SessionLocal() as db:
+        suggest.load(db)
+    start_writer()
+    capture.start()
+    start_runner()
+    start_scheduler()
+    yield
+    stop_scheduler()
+    stop_runner()
+    capture.stop()
+    stop_writer()
+    hot_rooms.clear()
+    dispose_engine()
+
+
+app = FastAPI(title="Easter Meal Planning API", lifespan=lifespan)
 
 # Configure CORS
 origins = [
@@ -22,8 +51,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceresponse"],
 )
 
+# gzip/brotli for responses above COMPRESS_MIN_SIZE bytes
+app.add_middleware(CompressionMiddleware)
+
 # Include routers
 app.include_router(meals.router, prefix="/api", tags=["meals"])
 app.include_router(families.router, prefix="/api", tags=["families"])
@@ -32,8 +65,28 @@ app.include_router(wishlist.router, prefix="/api", tags=["wishlist"])
 app.include_router(rooms.router, prefix="/api", tags=["rooms"])
 app.include_router(drinks.router, prefix="/api", tags=["drinks"])
 app.include_router(drink_wishlist.router, prefix="/api", tags=["drink-wishlist"])
+app.include_router(templates.router, prefix="/api", tags=["templates"])
+app.include_router(suggest_router.router, prefix="/api", tags=["suggest"])
+app.include_router(jobs_router.router, prefix="/api", tags=["jobs"])
+app.include_router(admin.router, prefix="/api", tags=["admin"])
 
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Easter Meal Planning API"}
+
+
+# Identical concurrent reads of a room share one response; does nothing
+# unless SINGLE_FLIGHT=1
+single_flight.install(app)
+
+# Opt-in request profiling; does nothing unless PROFILE_TOKEN or
+# PROFILE_SAMPLE_PERCENT is set
+profiling.install(app)
+
+# OpenTelemetry spans; does nothing unless TRACE_EXPORTER is set
+tracing.install(app)
+
+# Anonymized traffic capture for replay_tool.py; does nothing unless
+# CAPTURE_FILE is set
+capture.install(app)
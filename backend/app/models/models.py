@@ -1,4 +1,14 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, JSON, Enum, DateTime
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Float,
+    ForeignKey,
+    JSON,
+    Enum,
+    DateTime,
+    Boolean,
+)
 from sqlalchemy.orm import relationship
 from ..database.database import Base
 import enum
@@ -8,6 +18,7 @@ from datetime import datetime
 class RoomStatus(str, enum.Enum):
     pending = "pending"
     active = "active"
+    template = "template"  # Frozen setup used only as a source for new rooms
 
 
 class DrinkCategory(str, enum.Enum):
@@ -27,18 +38,41 @@ class Room(Base):
     status = Column(String, default=RoomStatus.pending)
     settings = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-
-    # Relationships
-    dishes = relationship("Dish", back_populates="room", cascade="all, delete-orphan")
-    drinks = relationship("Drink", back_populates="room", cascade="all, delete-orphan")
+    # Bumped by every committed change to the room's content, see versioning.py
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Relationships. Deletes cascade in the database (ON DELETE CASCADE with
+    # foreign keys enforced), so passive_deletes keeps the ORM from loading
+    # every child row just to delete it
+    dishes = relationship(
+        "Dish",
+        back_populates="room",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    drinks = relationship(
+        "Drink",
+        back_populates="room",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
     families = relationship(
-        "Family", back_populates="room", cascade="all, delete-orphan"
+        "Family",
+        back_populates="room",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     wishlist_items = relationship(
-        "WishlistItem", back_populates="room", cascade="all, delete-orphan"
+        "WishlistItem",
+        back_populates="room",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     drink_wishlist_items = relationship(
-        "DrinkWishlistItem", back_populates="room", cascade="all, delete-orphan"
+        "DrinkWishlistItem",
+        back_populates="room",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -47,12 +81,17 @@ class Family(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"))
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), index=True)
+    # Bumped by every update, for optimistic concurrency (see conditional.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
     room = relationship("Room", back_populates="families")
     members = relationship(
-        "Member", back_populates="family", cascade="all, delete-orphan"
+        "Member",
+        back_populates="family",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -61,14 +100,12 @@ class Member(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    family_id = Column(Integer, ForeignKey("families.id", ondelete="CASCADE"))
+    family_id = Column(
+        Integer, ForeignKey("families.id", ondelete="CASCADE"), index=True
+    )
 
     # Relationships
     family = relationship("Family", back_populates="members")
-    dishes = relationship("Dish", back_populates="member", cascade="all, delete-orphan")
-    drinks = relationship(
-        "Drink", back_populates="member", cascade="all, delete-orphan"
-    )
 
 
 class Dish(Base):
@@ -77,26 +114,38 @@ class Dish(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     quantity = Column(Float)
-    member_id = Column(Integer, ForeignKey("members.id", ondelete="CASCADE"))
-    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"))
+    # 1-based index into room.settings["families"] (0 without families), not
+    # a members.id: a foreign key here would cascade across unrelated rooms
+    member_id = Column(Integer)
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), index=True)
     fullName = Column(String, index=True)
     meal_type = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped by every update, for optimistic concurrency (see conditional.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
-    member = relationship("Member", back_populates="dishes")
     room = relationship("Room", back_populates="dishes")
 
 
+# Claimed quantities are running sums of floats; claims round them to this many
+# decimals when writing, so three claims of 0.1 make up a request of 0.3
+QUANTITY_DECIMALS = 6
+
+
 class WishlistItem(Base):
     __tablename__ = "wishlist_items"
 
     id = Column(Integer, primary_key=True, index=True)
     dish_name = Column(String, index=True)
     requested_quantity = Column(Float)
+    # Only changed by compare-and-set claims (see the wishlist routers)
+    claimed_quantity = Column(Float, nullable=False, default=0, server_default="0")
     notes = Column(String, nullable=True)
-    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"))
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped by every update, for optimistic concurrency (see conditional.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
     room = relationship("Room", back_populates="wishlist_items")
@@ -111,12 +160,15 @@ class Drink(Base):
     other_category = Column(String, nullable=True)
     brand = Column(String, nullable=True)
     quantity = Column(Float)
-    member_id = Column(Integer, ForeignKey("members.id", ondelete="CASCADE"))
-    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"))
+    # 1-based index into room.settings["families"] (0 without families), not
+    # a members.id: a foreign key here would cascade across unrelated rooms
+    member_id = Column(Integer)
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped by every update, for optimistic concurrency (see conditional.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
-    member = relationship("Member", back_populates="drinks")
     room = relationship("Room", back_populates="drinks")
 
 
@@ -129,8 +181,58 @@ class DrinkWishlistItem(Base):
     description = Column(String, nullable=True)
     requested_from = Column(String, nullable=True)
     requested_quantity = Column(Float)
-    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"))
+    # Only changed by compare-and-set claims (see the wishlist routers)
+    claimed_quantity = Column(Float, nullable=False, default=0, server_default="0")
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped by every update, for optimistic concurrency (see conditional.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
     room = relationship("Room", back_populates="drink_wishlist_items")
+
+
+class RoomTemplate(Base):
+    __tablename__ = "room_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True)
+    # The template's content lives in a room with the "template" status
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), index=True)
+    collections = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    room = relationship("Room")
+
+
+class JobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    # UUIDs so ids stay unique when jobs of different rooms live in different shards
+    id = Column(String, primary_key=True)
+    kind = Column(String, index=True)
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), index=True)
+    status = Column(String, default=JobStatus.queued, index=True)
+    priority = Column(Integer, default=0)
+    progress = Column(Float, default=0.0)
+    message = Column(String, nullable=True)
+    params = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    cancel_requested = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # The runner working on the job, and until when its claim holds unless
+    # renewed (see jobs.py)
+    owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
@@ -0,0 +1,240 @@
+"""On-demand request profiling.
+
+Profiling is switched on by setting ``PROFILE_TOKEN`` (requests carrying it in
+the ``X-Profile-Token`` header or a ``profile`` query parameter are profiled)
+and/or ``PROFILE_SAMPLE_PERCENT`` (that share of all requests is profiled).
+When neither is set, ``install`` does nothing: no middleware, no endpoint
+wrappers and no SQLAlchemy listeners are added.
+
+A profile records the request, its total time, every SQL statement with its
+duration, and the endpoint's call stacks in folded format (one
+``frame;frame;frame microseconds`` line per stack), which flamegraph.pl,
+speedscope or inferno render directly. Profiles are written to
+``PROFILE_DIR`` and listed/downloaded through ``/api/admin/profiles`` by
+holders of ``ADMIN_TOKEN`` (which defaults to ``PROFILE_TOKEN``).
+"""
+
+import asyncio
+import contextvars
+import functools
+import hmac
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_PERCENT = float(os.getenv("PROFILE_SAMPLE_PERCENT", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+PROFILING_ENABLED = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_PERCENT > 0
+
+_current = contextvars.ContextVar("current_profile", default=None)
+
+
+class StackRecorder:
+    """sys.setprofile hook accumulating self time per call stack"""
+
+    def __init__(self):
+        self.labels = []
+        self.frames = []  # [start, time spent in children]
+        self.folded = defaultdict(float)
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == "call":
+            code = frame.f_code
+            filename = os.path.basename(code.co_filename)
+            self.labels.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+            self.frames.append([now, 0.0])
+        elif event == "c_call":
+            self.labels.append(getattr(arg, "__qualname__", repr(arg)))
+            self.frames.append([now, 0.0])
+        elif self.frames:  # return, c_return, c_exception
+            start, children = self.frames.pop()
+            elapsed = now - start
+            self.folded[";".join(self.labels)] += elapsed - children
+            self.labels.pop()
+            if self.frames:
+                self.frames[-1][1] += elapsed
+
+    def folded_lines(self):
+        return [
+            f"{stack} {round(seconds * 1_000_000)}"
+            for stack, seconds in sorted(self.folded.items())
+            if seconds > 0
+        ]
+
+
+class RequestProfile:
+    def __init__(self, scope):
+        self.id = (
+            datetime.utcnow().strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        )
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query = scope.get("query_string", b"").decode()
+        self.status = None
+        self.sql = []
+        self.recorder = StackRecorder()
+
+    def save(self, total_ms: float):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        hotspots = sorted(self.recorder.folded.items(), key=lambda item: -item[1])
+        summary = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "status": self.status,
+            "total_ms": round(total_ms, 3),
+            "sql_ms": round(sum(statement["ms"] for statement in self.sql), 3),
+            "sql": self.sql,
+            "hotspots": [
+                {"stack": stack.split(";"), "self_ms": round(seconds * 1000, 3)}
+                for stack, seconds in hotspots[:20]
+            ],
+        }
+        base = os.path.join(PROFILE_DIR, self.id)
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+        with open(base + ".folded", "w") as f:
+            f.write("\n".join(self.recorder.folded_lines()) + "\n")
+        _prune()
+
+
+def _prune():
+    profiles = list_profiles()
+    for profile_id in profiles[PROFILE_MAX_FILES:]:
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Profile ids, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted(
+        (
+            name[: -len(".json")]
+            for name in os.listdir(PROFILE_DIR)
+            if name.endswith(".json")
+        ),
+        reverse=True,
+    )
+
+
+def profile_path(profile_id: str, suffix: str):
+    """Path of a stored profile file, or None if the id is unknown"""
+    if profile_id not in list_profiles():
+        return None
+    return os.path.join(PROFILE_DIR, profile_id + suffix)
+
+
+def _wants_profile(scope) -> bool:
+    if PROFILE_TOKEN:
+        headers = dict(scope.get("headers") or [])
+        token = PROFILE_TOKEN.encode()
+        if hmac.compare_digest(headers.get(b"x-profile-token", b""), token):
+            return True
+        query = parse_qs(scope.get("query_string", b"").decode())
+        if any(
+            hmac.compare_digest(value.encode(), token)
+            for value in query.get("profile", [])
+        ):
+            return True
+    return random.random() * 100 < PROFILE_SAMPLE_PERCENT
+
+
+class ProfilingMiddleware:
+    """ASGI middleware selecting requests to profile and saving the result"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/api/admin/"):
+            await self.app(scope, receive, send)
+            return
+        if not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope)
+        token = _current.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message.setdefault("headers", []).append(
+                    (b"x-profile-id", profile.id.encode())
+                )
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            profile.save((time.perf_counter() - start) * 1000)
+
+
+def _profiled(endpoint):
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        sys.setprofile(profile.recorder)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            sys.setprofile(None)
+
+    return wrapper
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None and conn.info.get("profile_start"):
+        start = conn.info["profile_start"].pop()
+        profile.sql.append(
+            {
+                "statement": statement,
+                "ms": round((time.perf_counter() - start) * 1000, 3),
+            }
+        )
+
+
+def install(app):
+    """Hook profiling into the app; a no-op unless profiling is configured"""
+    if not PROFILING_ENABLED:
+        return
+    for route in app.routes:
+        # Synchronous endpoints run in the threadpool, so they are profiled
+        # in the thread that actually executes them
+        if isinstance(route, APIRoute) and not asyncio.iscoroutinefunction(
+            route.dependant.call
+        ):
+            route.dependant.call = _profiled(route.dependant.call)
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.add_middleware(ProfilingMiddleware)
@@ -0,0 +1,90 @@
+"""Live room events.
+
+Clients watching a room keep ``GET /api/rooms/{seed}/events`` open (a
+server-sent event stream) and are sent what changed as it is committed,
+currently wishlist claims with the item's new remaining quantity. Writers
+call ``publish`` from any thread once their transaction has committed; each
+watcher has a bounded queue on its event loop, and a watcher too slow to
+drain it misses events rather than holding up writers. Events carry the
+item's ``version`` so a watcher can drop one that arrives after a newer one.
+
+Subscriptions live in the process: with several workers, a watcher only
+hears about writes handled by its own worker and should fall back to polling
+``/rooms/{seed}/status`` for the rest.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from collections import defaultdict
+
+ROOM_EVENTS_QUEUE_SIZE = int(os.getenv("ROOM_EVENTS_QUEUE_SIZE", "100"))
+ROOM_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("ROOM_EVENTS_KEEPALIVE_SECONDS", "15"))
+# Streams end after this long and clients reconnect (EventSource does so by
+# itself); open streams otherwise hold up a graceful server shutdown forever
+ROOM_EVENTS_MAX_SECONDS = float(os.getenv("ROOM_EVENTS_MAX_SECONDS", "300"))
+
+_lock = threading.Lock()
+# room id -> {(event loop, queue)}
+_watchers = defaultdict(set)
+
+
+def subscribe(room_id: int):
+    """Start watching a room; call from the event loop that reads the queue"""
+    queue = asyncio.Queue(maxsize=ROOM_EVENTS_QUEUE_SIZE)
+    with _lock:
+        _watchers[room_id].add((asyncio.get_running_loop(), queue))
+    return queue
+
+
+def unsubscribe(room_id: int, queue) -> None:
+    with _lock:
+        watchers = _watchers.get(room_id)
+        if watchers is None:
+            return
+        watchers.difference_update(
+            [watcher for watcher in watchers if watcher[1] is queue]
+        )
+        if not watchers:
+            del _watchers[room_id]
+
+
+def _offer(queue, event: dict) -> None:
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+def publish(room_id: int, event: dict) -> None:
+    """Send an event to everyone watching the room; safe from any thread"""
+    with _lock:
+        watchers = list(_watchers.get(room_id, ()))
+    for loop, queue in watchers:
+        try:
+            loop.call_soon_threadsafe(_offer, queue, event)
+        except RuntimeError:
+            # The watcher's loop has shut down
+            unsubscribe(room_id, queue)
+
+
+async def stream(room_id: int):
+    """Server-sent events for a room, with comment lines as keepalives"""
+    queue = subscribe(room_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ROOM_EVENTS_MAX_SECONDS
+    try:
+        # Sent at once so proxies and clients see the stream is open
+        yield ": watching\n\n"
+        while loop.time() < deadline:
+            timeout = min(ROOM_EVENTS_KEEPALIVE_SECONDS, deadline - loop.time())
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            data = json.dumps(event, separators=(",", ":"))
+            yield f"event: {event['type']}\ndata: {data}\n\n"
+    finally:
+        unsubscribe(room_id, queue)
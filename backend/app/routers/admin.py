@@ -0,0 +1,76 @@
+import hmac
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+from typing import List, Optional
+from .. import hot_rooms, profiling, single_flight
+from ..tracing import TracedRoute
+
+# Guards the stats and the stored profiles; deployments that only set
+# PROFILE_TOKEN keep using that one
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "") or os.getenv("PROFILE_TOKEN", "")
+
+router = APIRouter(route_class=TracedRoute)
+
+
+def verify_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are not enabled")
+    # Constant time, so response timings do not reveal the token
+    if not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def profile_download_token(
+    x_admin_token: Optional[str] = Header(None),
+    x_profile_token: Optional[str] = Header(None),
+) -> Optional[str]:
+    # Profile downloads used to take the token in X-Profile-Token
+    return x_admin_token or x_profile_token
+
+
+@router.get("/admin/profiles", response_model=List[str])
+def get_profiles(token: Optional[str] = Depends(profile_download_token)):
+    """List stored request profiles, newest first"""
+    verify_admin(token)
+    return profiling.list_profiles()
+
+
+@router.get("/admin/profiles/{profile_id}")
+def get_profile(
+    profile_id: str, token: Optional[str] = Depends(profile_download_token)
+):
+    """Download a profile summary: request, SQL statements and hotspots"""
+    verify_admin(token)
+    path = profiling.profile_path(profile_id, ".json")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json")
+
+
+@router.get("/admin/profiles/{profile_id}/flamegraph")
+def get_profile_flamegraph(
+    profile_id: str, token: Optional[str] = Depends(profile_download_token)
+):
+    """Download the folded call stacks of a profile, ready for flamegraph tools"""
+    verify_admin(token)
+    path = profiling.profile_path(profile_id, ".folded")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=profile_id + ".folded")
+
+
+@router.get("/admin/hot-rooms")
+def get_hot_rooms_stats(x_admin_token: Optional[str] = Header(None)):
+    """Size, hit and eviction counters of the in-memory hot-room store"""
+    verify_admin(x_admin_token)
+    if hot_rooms.store is None:
+        raise HTTPException(status_code=404, detail="The hot-room store is off")
+    return hot_rooms.store.stats()
+
+
+@router.get("/admin/single-flight")
+def get_single_flight_stats(x_admin_token: Optional[str] = Header(None)):
+    """Per-route counts of computed and shared responses of coalesced reads"""
+    verify_admin(x_admin_token)
+    return single_flight.stats()
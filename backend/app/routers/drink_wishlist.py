@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List
+from ..database.conditional import update_row
 from ..database.database import get_db
-from ..models.models import DrinkWishlistItem
-from pydantic import BaseModel
+from ..database.write_queue import run_write
+from ..models.models import QUANTITY_DECIMALS, DrinkWishlistItem, Room, RoomStatus
+from .. import hot_rooms, room_events, snapshots
+from ..wire import list_response, vary_on_accept
+from ..tracing import TracedRoute
+from pydantic import BaseModel, Field
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 class DrinkWishBase(BaseModel):
@@ -23,18 +30,39 @@ class DrinkWishCreate(DrinkWishBase):
 
 
 class DrinkWishResponse(DrinkWishBase):
+    # The column is nullable: rows not written through this API may have none
+    requested_quantity: float | None
     id: int
+    claimed_quantity: float
+    version: int
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
-@router.get("/drink-wishlist/{room_id}", response_model=List[DrinkWishResponse])
+class DrinkWishClaim(BaseModel):
+    quantity: float = Field(gt=0)
+
+
+@router.get(
+    "/drink-wishlist/{room_id}",
+    response_model=List[DrinkWishResponse],
+    dependencies=[Depends(vary_on_accept)],
+)
 def get_drink_wishes(
-    room_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+    room_id: int,
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
 ):
     """Get all drink wishes for a specific room"""
+    hot_room = hot_rooms.get(room_id)
+    if hot_room is not None:
+        wishes = hot_room.newest("drink_wishlist", skip, limit)
+        return list_response(request, DrinkWishResponse, wishes)
+
     wishes = (
         db.query(DrinkWishlistItem)
         .filter(DrinkWishlistItem.room_id == room_id)
@@ -43,17 +71,21 @@ def get_drink_wishes(
         .limit(limit)
         .all()
     )
-    return wishes
+    return list_response(request, DrinkWishResponse, wishes)
 
 
 @router.post("/drink-wishlist/", response_model=DrinkWishResponse)
 def create_drink_wish(wish: DrinkWishCreate, db: Session = Depends(get_db)):
     """Create a new drink wish"""
-    db_wish = DrinkWishlistItem(**wish.model_dump())
+
+    def write(session: Session):
+        db_wish = DrinkWishlistItem(**wish.model_dump())
+        session.add(db_wish)
+        return db_wish
+
     try:
-        db.add(db_wish)
-        db.commit()
-        db.refresh(db_wish)
+        db_wish = run_write(db, write)
+        snapshots.refresh_if_published(db, db_wish.room_id)
         return db_wish
     except Exception as e:
         db.rollback()
@@ -72,9 +104,112 @@ def delete_drink_wish(room_id: int, wish_id: int, db: Session = Depends(get_db))
         raise HTTPException(status_code=404, detail="Drink wish not found")
 
     try:
-        db.delete(db_wish)
-        db.commit()
+        run_write(
+            db,
+            lambda session: session.query(DrinkWishlistItem)
+            .filter(
+                DrinkWishlistItem.id == wish_id, DrinkWishlistItem.room_id == room_id
+            )
+            .delete(),
+        )
+        snapshots.refresh_if_published(db, room_id)
         return {"message": "Drink wish deleted successfully"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
+
+
+def _claim_failure(db: Session, room_id: int, wish_id: int, delta: float):
+    """The error to answer a claim that matched nothing with"""
+    room = db.query(Room).filter(Room.id == room_id).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room.status != RoomStatus.active:
+        raise HTTPException(status_code=400, detail="Room is not active")
+    current = (
+        db.query(DrinkWishlistItem)
+        .filter(DrinkWishlistItem.id == wish_id, DrinkWishlistItem.room_id == room_id)
+        .first()
+    )
+    if not current:
+        raise HTTPException(status_code=404, detail="Drink wish not found")
+    if delta > 0:
+        remaining = round(
+            (current.requested_quantity or 0) - current.claimed_quantity,
+            QUANTITY_DECIMALS,
+        )
+        detail = f"Only {remaining:g} left to claim"
+    else:
+        detail = f"Only {current.claimed_quantity:g} claimed"
+    return HTTPException(status_code=409, detail=detail)
+
+
+def _change_claim(db: Session, room_id: int, wish_id: int, delta: float):
+    """Compare-and-set on the claimed quantity; nothing is read beforehand"""
+    active_rooms = select(Room.id).where(Room.status == RoomStatus.active)
+    claimed = func.round(DrinkWishlistItem.claimed_quantity + delta, QUANTITY_DECIMALS)
+    where = [
+        DrinkWishlistItem.id == wish_id,
+        DrinkWishlistItem.room_id == room_id,
+        DrinkWishlistItem.room_id.in_(active_rooms),
+        # Checked by the database against the row as it is when written
+        (
+            claimed <= DrinkWishlistItem.requested_quantity
+            if delta > 0
+            else claimed >= 0
+        ),
+    ]
+    changes = {"claimed_quantity": claimed}
+    try:
+        row = run_write(
+            db,
+            lambda session: update_row(session, DrinkWishlistItem, where, changes),
+        )
+    except IntegrityError as e:
+        # Anything else is a server-side failure and answers 500
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if row is None:
+            raise _claim_failure(db, room_id, wish_id, delta)
+        snapshots.refresh_if_published(db, room_id)
+    finally:
+        # Hand the connection back now: the dependency teardown that would
+        # close the session needs a free worker thread, and under a burst of
+        # claims those are all waiting for connections
+        db.close()
+    room_events.publish(
+        room_id,
+        {
+            "type": "drink_wishlist",
+            "id": row["id"],
+            "claimed_quantity": row["claimed_quantity"],
+            "remaining": round(
+                (row["requested_quantity"] or 0) - row["claimed_quantity"],
+                QUANTITY_DECIMALS,
+            ),
+            "version": row["version"],
+        },
+    )
+    return row
+
+
+@router.post(
+    "/drink-wishlist/{room_id}/{wish_id}/claim", response_model=DrinkWishResponse
+)
+def claim_drink_wish(
+    room_id: int, wish_id: int, claim: DrinkWishClaim, db: Session = Depends(get_db)
+):
+    """Take on part of what is requested; 409 if less than that is left"""
+    return _change_claim(db, room_id, wish_id, claim.quantity)
+
+
+@router.post(
+    "/drink-wishlist/{room_id}/{wish_id}/unclaim", response_model=DrinkWishResponse
+)
+def unclaim_drink_wish(
+    room_id: int, wish_id: int, claim: DrinkWishClaim, db: Session = Depends(get_db)
+):
+    """Give back part of what was claimed"""
+    return _change_claim(db, room_id, wish_id, -claim.quantity)
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
+from ..database.conditional import update_row
 from ..database.database import get_db
+from ..database.write_queue import run_write
 from ..models.models import Drink, DrinkCategory
+from .. import hot_rooms, snapshots, suggest
+from ..wire import list_response, vary_on_accept
+from ..tracing import TracedRoute
 from pydantic import BaseModel
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 class DrinkBase(BaseModel):
@@ -23,19 +28,54 @@ class DrinkCreate(DrinkBase):
     pass
 
 
+class DrinkUpdate(DrinkBase):
+    # The version the client last read; the update fails with 409 if the
+    # drink changed since
+    version: int
+
+
+class DrinkPatch(BaseModel):
+    # Only the fields sent are written; other_category and brand can be
+    # cleared with null
+    fullName: str | None = None
+    category: str | None = None
+    other_category: str | None = None
+    brand: str | None = None
+    quantity: float | None = None
+    member_id: int | None = None
+    version: int | None = None
+
+
+NULLABLE_DRINK_FIELDS = {"other_category", "brand"}
+
+
 class DrinkResponse(DrinkBase):
     id: int
     created_at: datetime
+    version: int
 
     class Config:
         from_attributes = True
 
 
-@router.get("/drinks/{room_id}", response_model=List[DrinkResponse])
+@router.get(
+    "/drinks/{room_id}",
+    response_model=List[DrinkResponse],
+    dependencies=[Depends(vary_on_accept)],
+)
 def get_drinks(
-    room_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+    room_id: int,
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
 ):
     """Get all drinks for a specific room"""
+    hot_room = hot_rooms.get(room_id)
+    if hot_room is not None:
+        drinks = hot_room.newest("drinks", skip, limit)
+        return list_response(request, DrinkResponse, drinks)
+
     drinks = (
         db.query(Drink)
         .filter(Drink.room_id == room_id)
@@ -44,7 +84,7 @@ def get_drinks(
         .limit(limit)
         .all()
     )
-    return drinks
+    return list_response(request, DrinkResponse, drinks)
 
 
 @router.post("/drinks/", response_model=DrinkResponse)
@@ -60,49 +100,86 @@ def create_drink(drink: DrinkCreate, db: Session = Depends(get_db)):
             status_code=400, detail="Other category description is required"
         )
 
-    db_drink = Drink(**drink.model_dump())
+    def write(session: Session):
+        db_drink = Drink(**drink.model_dump())
+        session.add(db_drink)
+        return db_drink
+
     try:
-        db.add(db_drink)
-        db.commit()
-        db.refresh(db_drink)
+        db_drink = run_write(db, write)
+        snapshots.refresh_if_published(db, db_drink.room_id)
+        suggest.record_drink(db_drink)
         return db_drink
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.put("/drinks/{room_id}/{drink_id}", response_model=DrinkResponse)
-def update_drink(
-    room_id: int, drink_id: int, drink: DrinkBase, db: Session = Depends(get_db)
-):
-    """Update a drink"""
-    db_drink = (
-        db.query(Drink).filter(Drink.id == drink_id, Drink.room_id == room_id).first()
-    )
-    if not db_drink:
-        raise HTTPException(status_code=404, detail="Drink not found")
-
-    # Validate category
-    if drink.category not in [cat.value for cat in DrinkCategory]:
+def _validate_category(category: str, other_category: str | None):
+    if category not in [cat.value for cat in DrinkCategory]:
         raise HTTPException(status_code=400, detail="Invalid drink category")
 
     # If category is "Other", other_category must be provided
-    if drink.category == DrinkCategory.other.value and not drink.other_category:
+    if category == DrinkCategory.other.value and not other_category:
         raise HTTPException(
             status_code=400, detail="Other category description is required"
         )
 
-    for key, value in drink.model_dump().items():
-        setattr(db_drink, key, value)
 
+def _update_drink(
+    db: Session, room_id: int, drink_id: int, changes: dict, version: int | None
+):
+    """One conditional UPDATE; the drink is only looked up on failure"""
+    where = [Drink.id == drink_id, Drink.room_id == room_id]
     try:
-        db.commit()
-        db.refresh(db_drink)
-        return db_drink
+        row = run_write(
+            db, lambda session: update_row(session, Drink, where, changes, version)
+        )
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+    if row is None:
+        current = db.query(Drink).filter(*where).first()
+        if not current:
+            raise HTTPException(status_code=404, detail="Drink not found")
+        raise HTTPException(
+            status_code=409,
+            detail=f"Drink was changed by someone else, current version "
+            f"{current.version}",
+        )
+    snapshots.refresh_if_published(db, room_id)
+    return row
+
+
+@router.put("/drinks/{room_id}/{drink_id}", response_model=DrinkResponse)
+def update_drink(
+    room_id: int, drink_id: int, drink: DrinkUpdate, db: Session = Depends(get_db)
+):
+    """Update a drink"""
+    _validate_category(drink.category, drink.other_category)
+    changes = drink.model_dump(exclude={"version"})
+    return _update_drink(db, room_id, drink_id, changes, drink.version)
+
+
+@router.patch("/drinks/{room_id}/{drink_id}", response_model=DrinkResponse)
+def patch_drink(
+    room_id: int, drink_id: int, drink: DrinkPatch, db: Session = Depends(get_db)
+):
+    """Update the fields sent, leaving the others as they are"""
+    changes = {
+        key: value
+        for key, value in drink.model_dump(exclude_unset=True).items()
+        if value is not None or key in NULLABLE_DRINK_FIELDS
+    }
+    changes.pop("version", None)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    if "category" in changes:
+        # Switching to "Other" needs its description in the same request
+        _validate_category(changes["category"], changes.get("other_category"))
+    return _update_drink(db, room_id, drink_id, changes, drink.version)
+
 
 @router.delete("/drinks/{room_id}/{drink_id}")
 def delete_drink(room_id: int, drink_id: int, db: Session = Depends(get_db)):
@@ -114,8 +191,13 @@ def delete_drink(room_id: int, drink_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Drink not found")
 
     try:
-        db.delete(db_drink)
-        db.commit()
+        run_write(
+            db,
+            lambda session: session.query(Drink)
+            .filter(Drink.id == drink_id, Drink.room_id == room_id)
+            .delete(),
+        )
+        snapshots.refresh_if_published(db, room_id)
         return {"message": "Drink deleted successfully"}
     except Exception as e:
         db.rollback()
@@ -1,11 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
+from ..database import database
+from ..database.conditional import update_row
 from ..database.database import get_db
+from ..database.write_queue import run_write
 from ..models import models
+from .. import snapshots
+from ..tracing import TracedRoute
 from pydantic import BaseModel, ConfigDict
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 class FamilyBase(BaseModel):
@@ -16,8 +21,20 @@ class FamilyCreate(FamilyBase):
     pass
 
 
+class FamilyUpdate(FamilyBase):
+    # The version the client last read; the update fails with 409 if the
+    # family changed since
+    version: int
+
+
+class FamilyPatch(BaseModel):
+    name: str | None = None
+    version: int | None = None
+
+
 class FamilyResponse(FamilyBase):
     id: int
+    version: int
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -47,18 +64,64 @@ def get_family(family_id: int, db: Session = Depends(get_db)):
     return family
 
 
-@router.put("/families/{family_id}", response_model=FamilyResponse)
-def update_family(family_id: int, family: FamilyBase, db: Session = Depends(get_db)):
-    db_family = db.query(models.Family).filter(models.Family.id == family_id).first()
-    if db_family is None:
-        raise HTTPException(status_code=404, detail="Family not found")
+def _update_family(db: Session, where: list, changes: dict, version: int | None):
+    """One conditional UPDATE; the family is only looked up on failure"""
+    try:
+        row = run_write(
+            db,
+            lambda session: update_row(session, models.Family, where, changes, version),
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
 
-    for key, value in family.model_dump().items():
-        setattr(db_family, key, value)
+    if row is None:
+        current = db.query(models.Family).filter(*where).first()
+        if current is None:
+            raise HTTPException(status_code=404, detail="Family not found")
+        raise HTTPException(
+            status_code=409,
+            detail=f"Family was changed by someone else, current version "
+            f"{current.version}",
+        )
+    snapshots.refresh_if_published(db, row["room_id"])
+    return row
+
+
+@router.put("/families/{room_id}/{family_id}", response_model=FamilyResponse)
+def update_room_family(
+    room_id: int, family_id: int, family: FamilyUpdate, db: Session = Depends(get_db)
+):
+    """Replace a family of a room; the room sends the UPDATE to its shard"""
+    changes = family.model_dump(exclude={"version"})
+    where = [models.Family.id == family_id, models.Family.room_id == room_id]
+    return _update_family(db, where, changes, family.version)
+
+
+@router.patch("/families/{room_id}/{family_id}", response_model=FamilyResponse)
+def patch_room_family(
+    room_id: int, family_id: int, family: FamilyPatch, db: Session = Depends(get_db)
+):
+    """Update the fields sent, leaving the others as they are"""
+    changes = family.model_dump(exclude_unset=True, exclude_none=True)
+    changes.pop("version", None)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    where = [models.Family.id == family_id, models.Family.room_id == room_id]
+    return _update_family(db, where, changes, family.version)
 
-    db.commit()
-    db.refresh(db_family)
-    return db_family
+
+@router.put("/families/{family_id}", response_model=FamilyResponse)
+def update_family(family_id: int, family: FamilyUpdate, db: Session = Depends(get_db)):
+    if database.room_directory is not None:
+        # Family ids are only unique within a shard
+        raise HTTPException(
+            status_code=400,
+            detail="Rooms are sharded, use /api/families/{room_id}/{family_id}",
+        )
+    changes = family.model_dump(exclude={"version"})
+    where = [models.Family.id == family_id]
+    return _update_family(db, where, changes, family.version)
 
 
 @router.delete("/families/{family_id}")
@@ -67,6 +130,11 @@ def delete_family(family_id: int, db: Session = Depends(get_db)):
     if db_family is None:
         raise HTTPException(status_code=404, detail="Family not found")
 
-    db.delete(db_family)
+    room_id = db_family.room_id
+    # Members go with the family through ON DELETE CASCADE, without loading them
+    db.query(models.Family).filter(
+        models.Family.id == family_id, models.Family.room_id == room_id
+    ).delete(synchronize_session=False)
     db.commit()
+    snapshots.refresh_if_published(db, room_id)
     return {"message": "Family deleted successfully"}
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional, Any
+from ..database.database import get_db
+from ..models.models import Job
+from .. import jobs
+from ..tracing import TracedRoute
+from pydantic import BaseModel
+from datetime import datetime
+
+router = APIRouter(route_class=TracedRoute)
+
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    room_id: Optional[int] = None
+    status: str
+    priority: int
+    progress: float
+    message: Optional[str] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    cancel_requested: bool
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    """Get the status, progress and result of a background job"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.delete("/jobs/{job_id}", response_model=JobResponse)
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    """Cancel a queued job, or ask a running one to stop"""
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.cancel(db, job)
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from typing import List
+from ..database.conditional import update_row
 from ..database.database import get_db
+from ..database.write_queue import run_write
 from ..models import models
 from ..config import MEAL_TYPES
+from .. import hot_rooms, snapshots, suggest
+from ..wire import list_response, vary_on_accept
+from ..tracing import TracedRoute
 from pydantic import BaseModel, ConfigDict
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 class DishBase(BaseModel):
@@ -21,9 +27,25 @@ class DishCreate(DishBase):
     member_id: int
 
 
+class DishUpdate(DishBase):
+    # The version the client last read; the update fails with 409 if the dish
+    # changed since
+    version: int
+
+
+class DishPatch(BaseModel):
+    # Only the fields sent are written
+    name: str | None = None
+    quantity: float | None = None
+    fullName: str | None = None
+    meal_type: str | None = None
+    version: int | None = None
+
+
 class DishResponse(DishBase):
     id: int
     member_id: int
+    version: int
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -38,6 +60,36 @@ def get_meal_types():
     return MEAL_TYPES
 
 
+def _get_or_create_member(
+    session: Session, room_id: int, family_name: str, full_name: str
+) -> models.Member:
+    # Get or create the family
+    family = (
+        session.query(models.Family)
+        .filter(models.Family.name == family_name, models.Family.room_id == room_id)
+        .first()
+    )
+    if not family:
+        family = models.Family(name=family_name, room_id=room_id)
+        session.add(family)
+        session.flush()
+
+    # Get or create the member
+    member = (
+        session.query(models.Member)
+        .filter(
+            models.Member.name == full_name,
+            models.Member.family_id == family.id,
+        )
+        .first()
+    )
+    if not member:
+        member = models.Member(name=full_name, family_id=family.id)
+        session.add(member)
+        session.flush()
+    return member
+
+
 @router.post("/dishes/{room_id}", response_model=DishResponse)
 def create_dish(room_id: int, dish: DishCreate, db: Session = Depends(get_db)):
     """Create a new dish for a specific room"""
@@ -57,64 +109,58 @@ def create_dish(room_id: int, dish: DishCreate, db: Session = Depends(get_db)):
             and len(room.settings["families"]) > 0
         )
 
+        family_name = None
         if has_families:
             if dish.member_id <= 0 or dish.member_id > len(room.settings["families"]):
                 raise HTTPException(status_code=400, detail="Invalid family selection")
             # Get the family name using member_id as 1-based index
             family_name = room.settings["families"][dish.member_id - 1]
-
-            # Get or create the family
-            family = (
-                db.query(models.Family)
-                .filter(
-                    models.Family.name == family_name, models.Family.room_id == room_id
-                )
-                .first()
-            )
-            if not family:
-                family = models.Family(name=family_name, room_id=room_id)
-                db.add(family)
-                db.flush()
-
-            # Get or create the member
-            member = (
-                db.query(models.Member)
-                .filter(
-                    models.Member.name == dish.fullName,
-                    models.Member.family_id == family.id,
-                )
-                .first()
-            )
-            if not member:
-                member = models.Member(name=dish.fullName, family_id=family.id)
-                db.add(member)
-                db.flush()
         else:
             # If no families configured, set member_id to 0
             dish.member_id = 0
 
-        # Create the dish
-        db_dish = models.Dish(
-            name=dish.name,
-            quantity=dish.quantity,
-            member_id=dish.member_id,
-            room_id=room_id,
-            meal_type=dish.meal_type,
-            fullName=dish.fullName,
-        )
-        db.add(db_dish)
-        db.commit()
-        db.refresh(db_dish)
+        def write(session: Session):
+            if family_name is not None:
+                _get_or_create_member(session, room_id, family_name, dish.fullName)
+
+            # Create the dish
+            db_dish = models.Dish(
+                name=dish.name,
+                quantity=dish.quantity,
+                member_id=dish.member_id,
+                room_id=room_id,
+                meal_type=dish.meal_type,
+                fullName=dish.fullName,
+            )
+            session.add(db_dish)
+            return db_dish
+
+        db_dish = run_write(db, write)
+        snapshots.refresh_if_published(db, room_id)
+        suggest.record_dish(db_dish)
         return db_dish
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/dishes/{room_id}", response_model=List[DishResponse])
+@router.get(
+    "/dishes/{room_id}",
+    response_model=List[DishResponse],
+    dependencies=[Depends(vary_on_accept)],
+)
 def get_dishes(
-    room_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+    room_id: int,
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
 ):
+    hot_room = hot_rooms.get(room_id)
+    if hot_room is not None:
+        dishes = hot_room.newest("dishes", skip, limit)
+        return list_response(request, DishResponse, dishes)
+
     # Verify room exists
     room = db.query(models.Room).filter(models.Room.id == room_id).first()
     if not room:
@@ -128,39 +174,71 @@ def get_dishes(
         .limit(limit)
         .all()
     )
-    return dishes
+    return list_response(request, DishResponse, dishes)
 
 
-@router.put("/dishes/{room_id}/{dish_id}", response_model=DishResponse)
-def update_dish(
-    room_id: int, dish_id: int, dish: DishBase, db: Session = Depends(get_db)
+def _update_dish(
+    db: Session, room_id: int, dish_id: int, changes: dict, version: int | None
 ):
-    # Verify room exists and is active
-    room = db.query(models.Room).filter(models.Room.id == room_id).first()
-    if not room:
-        raise HTTPException(status_code=404, detail="Room not found")
-    if room.status != models.RoomStatus.active:
-        raise HTTPException(status_code=400, detail="Room is not active")
-
-    db_dish = (
-        db.query(models.Dish)
-        .filter(models.Dish.id == dish_id, models.Dish.room_id == room_id)
-        .first()
+    """One conditional UPDATE; the room and dish are only looked up on failure"""
+    active_rooms = select(models.Room.id).where(
+        models.Room.status == models.RoomStatus.active
     )
-    if not db_dish:
-        raise HTTPException(status_code=404, detail="Dish not found in this room")
-
-    for key, value in dish.model_dump().items():
-        setattr(db_dish, key, value)
-
+    where = [
+        models.Dish.id == dish_id,
+        models.Dish.room_id == room_id,
+        models.Dish.room_id.in_(active_rooms),
+    ]
     try:
-        db.commit()
-        db.refresh(db_dish)
-        return db_dish
+        row = run_write(
+            db,
+            lambda session: update_row(session, models.Dish, where, changes, version),
+        )
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+    if row is None:
+        room = db.query(models.Room).filter(models.Room.id == room_id).first()
+        if not room:
+            raise HTTPException(status_code=404, detail="Room not found")
+        if room.status != models.RoomStatus.active:
+            raise HTTPException(status_code=400, detail="Room is not active")
+        current = (
+            db.query(models.Dish)
+            .filter(models.Dish.id == dish_id, models.Dish.room_id == room_id)
+            .first()
+        )
+        if not current:
+            raise HTTPException(status_code=404, detail="Dish not found in this room")
+        raise HTTPException(
+            status_code=409,
+            detail=f"Dish was changed by someone else, current version "
+            f"{current.version}",
+        )
+    snapshots.refresh_if_published(db, room_id)
+    return row
+
+
+@router.put("/dishes/{room_id}/{dish_id}", response_model=DishResponse)
+def update_dish(
+    room_id: int, dish_id: int, dish: DishUpdate, db: Session = Depends(get_db)
+):
+    changes = dish.model_dump(exclude={"version"})
+    return _update_dish(db, room_id, dish_id, changes, dish.version)
+
+
+@router.patch("/dishes/{room_id}/{dish_id}", response_model=DishResponse)
+def patch_dish(
+    room_id: int, dish_id: int, dish: DishPatch, db: Session = Depends(get_db)
+):
+    """Update the fields sent, leaving the others as they are"""
+    changes = dish.model_dump(exclude_unset=True, exclude_none=True)
+    changes.pop("version", None)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    return _update_dish(db, room_id, dish_id, changes, dish.version)
+
 
 @router.delete("/dishes/{room_id}/{dish_id}")
 def delete_dish(room_id: int, dish_id: int, db: Session = Depends(get_db)):
@@ -180,8 +258,13 @@ def delete_dish(room_id: int, dish_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Dish not found in this room")
 
     try:
-        db.delete(db_dish)
-        db.commit()
+        run_write(
+            db,
+            lambda session: session.query(models.Dish)
+            .filter(models.Dish.id == dish_id, models.Dish.room_id == room_id)
+            .delete(),
+        )
+        snapshots.refresh_if_published(db, room_id)
         return {"message": "Dish deleted successfully"}
     except Exception as e:
         db.rollback()
@@ -4,9 +4,10 @@ from typing import List
 from ..database.database import get_db
 from ..models import models
 from ..config import FAMILY_AFFILIATIONS
+from ..tracing import TracedRoute
 from pydantic import BaseModel, ConfigDict
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 class MemberBase(BaseModel):
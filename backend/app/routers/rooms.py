@@ -1,14 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import Optional, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, selectinload
+from typing import Optional, Dict, Any, List
+from ..database import database
 from ..database.database import get_db
-from ..models.models import Room, RoomStatus
-from pydantic import BaseModel
+from ..database.write_queue import run_write
+from ..models.models import (
+    Room,
+    RoomStatus,
+    Family,
+    Dish,
+    Drink,
+    WishlistItem,
+    DrinkWishlistItem,
+)
+from .. import cloning, hot_rooms, room_events, snapshots, jobs
+from ..wire import model_response, vary_on_accept
+from ..tracing import TracedRoute
+from .meals import DishResponse
+from .drinks import DrinkResponse
+from .jobs import JobResponse
+from pydantic import BaseModel, Field
+import json
 import random
+from operator import attrgetter
 import string
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 class RoomSettings(BaseModel):
@@ -28,6 +48,11 @@ class RoomActivate(BaseModel):
     settings: RoomSettings
 
 
+class RoomClone(BaseModel):
+    # Any of cloning.COLLECTIONS; settings are always copied
+    include: List[str] = list(cloning.DEFAULT_COLLECTIONS)
+
+
 class RoomResponse(BaseModel):
     id: int
     seed: str
@@ -39,19 +64,68 @@ class RoomResponse(BaseModel):
         from_attributes = True
 
 
+class RoomStatusSummary(BaseModel):
+    seed: str
+    status: str
+    version: int
+    families: int
+    dishes: int
+    drinks: int
+    wishlist: int
+    drink_wishlist: int
+
+
+class RoomStatusQuery(BaseModel):
+    seeds: List[str] = Field(max_length=500)
+
+
+class RoomStatusBatch(BaseModel):
+    rooms: List[RoomStatusSummary]
+    missing: List[str]  # Seeds that match no room
+
+
+class RosterMember(BaseModel):
+    id: Optional[int] = None  # None when no member row matches the dish
+    name: str
+    dishes: List[DishResponse] = []
+    drinks: List[DrinkResponse] = []  # Only filled for the unassigned entry
+
+
+class RosterFamily(BaseModel):
+    id: Optional[int] = None  # None until someone of the family adds a dish
+    index: int  # 1-based position in settings["families"], stored as member_id
+    name: str
+    members: List[RosterMember] = []
+    # A drink's fullName is the drink's name, not a guest's, so drinks are
+    # listed per family
+    drinks: List[DrinkResponse] = []
+
+
+class RosterResponse(BaseModel):
+    room_id: int
+    seed: str
+    families: List[RosterFamily]
+    unassigned: RosterMember  # Items added without a family selection
+
+
 def generate_room_seed(length: int = 6) -> str:
     """Generate a random room seed of specified length"""
     return "".join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
 
+def unused_room_seed(db: Session) -> str:
+    seed = generate_room_seed()
+    while db.query(Room).filter(Room.seed == seed).first():
+        seed = generate_room_seed()
+    return seed
+
+
 @router.post("/rooms/", response_model=RoomResponse)
 def create_room(db: Session = Depends(get_db)):
     """Create a new room with a generated seed"""
     try:
         # Generate a unique seed
-        seed = generate_room_seed()
-        while db.query(Room).filter(Room.seed == seed).first():
-            seed = generate_room_seed()
+        seed = unused_room_seed(db)
 
         # Create room with pending status
         db_room = Room(
@@ -81,6 +155,7 @@ def activate_room(seed: str, room_data: RoomActivate, db: Session = Depends(get_
         db_room.settings = room_data.settings.model_dump()
         db.commit()
         db.refresh(db_room)
+        snapshots.refresh_if_published(db, db_room.id)
         return db_room
     except Exception as e:
         db.rollback()
@@ -96,10 +171,254 @@ def get_room(seed: str, db: Session = Depends(get_db)):
     return room
 
 
-@router.get("/rooms/{seed}/status")
-def get_room_status(seed: str, db: Session = Depends(get_db)):
-    """Get room status by seed"""
+def _status_query(db: Session):
+    """Room status rows with contribution counts as correlated subqueries"""
+
+    def count(model):
+        return (
+            select(func.count())
+            .where(model.room_id == Room.id)
+            .correlate(Room)
+            .scalar_subquery()
+        )
+
+    return db.query(
+        Room.seed,
+        Room.status,
+        Room.version,
+        count(Family).label("families"),
+        count(Dish).label("dishes"),
+        count(Drink).label("drinks"),
+        count(WishlistItem).label("wishlist"),
+        count(DrinkWishlistItem).label("drink_wishlist"),
+    )
+
+
+def _status_etag(seed: str, version: int) -> str:
+    return f'W/"{seed}-{version}"'
+
+
+@router.post("/rooms/status", response_model=RoomStatusBatch)
+def get_rooms_status(query: RoomStatusQuery, db: Session = Depends(get_db)):
+    """Status, version and contribution counts of many rooms in one query"""
+    seeds = list(dict.fromkeys(query.seeds))
+    rows = _status_query(db).filter(Room.seed.in_(seeds)).all() if seeds else []
+    found = {row.seed for row in rows}
+    return RoomStatusBatch(
+        rooms=[RoomStatusSummary.model_validate(row._asdict()) for row in rows],
+        missing=[seed for seed in seeds if seed not in found],
+    )
+
+
+@router.get("/rooms/{seed}/status", response_model=RoomStatusSummary)
+def get_room_status(
+    seed: str, request: Request, response: Response, db: Session = Depends(get_db)
+):
+    """Get room status by seed; revalidate with If-None-Match"""
+    room = db.query(Room).filter(Room.seed == seed).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+
+    # The version changes with any change to the room, so it is the ETag
+    etag = _status_etag(room.seed, room.version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    row = _status_query(db).filter(Room.id == room.id).one()
+    response.headers.update(headers)
+    return RoomStatusSummary.model_validate(row._asdict())
+
+
+@router.get("/rooms/{seed}/events")
+def watch_room(seed: str, db: Session = Depends(get_db)):
+    """Server-sent events for changes to the room as they are committed"""
+    room_id = db.query(Room.id).filter(Room.seed == seed).scalar()
+    if room_id is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    # The stream can stay open for hours; do not hold a connection meanwhile
+    db.close()
+    return StreamingResponse(
+        room_events.stream(room_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/rooms/{seed}/clone", response_model=RoomResponse)
+def clone_room(
+    seed: str, options: Optional[RoomClone] = None, db: Session = Depends(get_db)
+):
+    """Create a new room with the settings and selected collections of this one"""
+    room = db.query(Room).filter(Room.seed == seed).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+
+    include = (options or RoomClone()).include
+    source_id = room.id
+    new_seed = unused_room_seed(db)
+    status = RoomStatus.active if room.settings else RoomStatus.pending
+    try:
+        return run_write(
+            db,
+            lambda session: cloning.clone_room(
+                session, source_id, new_seed, include, status=status
+            ),
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/rooms/{seed}")
+def delete_room(seed: str, db: Session = Depends(get_db)):
+    """Delete a room and everything in it.
+
+    One DELETE on rooms: the database cascades to families, members, dishes,
+    drinks and wishlists, so the cost does not grow with what the ORM would
+    otherwise load.
+    """
+    room = db.query(Room).filter(Room.seed == seed).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+
+    room_id = room.id
+    try:
+        run_write(
+            db,
+            lambda session: session.query(Room)
+            .filter(Room.id == room_id)
+            .delete(synchronize_session=False),
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    snapshots.unpublish_room(seed)
+    if database.room_directory is not None:
+        database.room_directory.forget(room_id, seed)
+    return {"message": "Room deleted successfully"}
+
+
+@router.post("/rooms/{seed}/publish")
+def publish_room(seed: str, db: Session = Depends(get_db)):
+    """Freeze the room into static snapshot files served by simple_server.py"""
+    room = db.query(Room).filter(Room.seed == seed).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return snapshots.publish_room(db, room)
+
+
+@router.delete("/rooms/{seed}/publish")
+def unpublish_room(seed: str, db: Session = Depends(get_db)):
+    """Remove the published snapshot of a room"""
+    room = db.query(Room).filter(Room.seed == seed).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    snapshots.unpublish_room(seed)
+    return {"message": "Room unpublished successfully"}
+
+
+@router.get(
+    "/rooms/{seed}/roster",
+    response_model=RosterResponse,
+    dependencies=[Depends(vary_on_accept)],
+)
+def get_room_roster(seed: str, request: Request, db: Session = Depends(get_db)):
+    """Families -> members -> the dishes and drinks they bring, in five queries"""
+    room = hot_rooms.get(seed=seed)
+    if room is not None:
+        families = room.rows("families")
+        members_of = room.family_members
+        dishes = room.newest("dishes")
+        drinks = room.newest("drinks")
+    else:
+        room = db.query(Room).filter(Room.seed == seed).first()
+        if not room:
+            raise HTTPException(status_code=404, detail="Room not found")
+
+        families = (
+            db.query(Family)
+            .filter(Family.room_id == room.id)
+            .options(selectinload(Family.members))
+            .all()
+        )
+        members_of = attrgetter("members")
+        dishes = (
+            db.query(Dish)
+            .filter(Dish.room_id == room.id)
+            .order_by(Dish.created_at.desc())
+            .all()
+        )
+        drinks = (
+            db.query(Drink)
+            .filter(Drink.room_id == room.id)
+            .order_by(Drink.created_at.desc())
+            .all()
+        )
+
+    # Dishes and drinks store the 1-based family index in member_id. Dishes
+    # also carry the guest name in fullName, so they are attributed by
+    # (index, name) rather than through the Member foreign key
+    family_names = (room.settings or {}).get("families") or []
+    families_by_name = {family.name: family for family in families}
+    roster = []
+    members_by_key = {}
+    for index, name in enumerate(family_names, start=1):
+        family = families_by_name.get(name)
+        entry = RosterFamily(id=family.id if family else None, index=index, name=name)
+        for member in members_of(family) if family else []:
+            roster_member = RosterMember(id=member.id, name=member.name)
+            entry.members.append(roster_member)
+            members_by_key[(index, member.name)] = roster_member
+        roster.append(entry)
+
+    unassigned = RosterMember(name="")
+
+    def member_for(dish):
+        if not 1 <= (dish.member_id or 0) <= len(roster):
+            return unassigned
+        key = (dish.member_id, dish.fullName)
+        if key not in members_by_key:
+            members_by_key[key] = RosterMember(name=dish.fullName)
+            roster[dish.member_id - 1].members.append(members_by_key[key])
+        return members_by_key[key]
+
+    for dish in dishes:
+        member_for(dish).dishes.append(DishResponse.model_validate(dish))
+    for drink in drinks:
+        if 1 <= (drink.member_id or 0) <= len(roster):
+            entry = roster[drink.member_id - 1]
+        else:
+            entry = unassigned
+        entry.drinks.append(DrinkResponse.model_validate(drink))
+
+    return model_response(
+        request,
+        RosterResponse(
+            room_id=room.id, seed=room.seed, families=roster, unassigned=unassigned
+        ),
+    )
+
+
+@jobs.handler("room_export")
+def export_room(context: jobs.JobContext, db: Session, room_id: int):
+    """Background job: the full state of a room as a JSON document"""
+    room = db.query(Room).filter(Room.id == room_id).one()
+    context.progress(0.1, "Collecting room data")
+    export = snapshots.build_room_snapshot(db, room)
+    context.progress(0.9, "Serializing")
+    return json.loads(json.dumps(export, default=snapshots.json_default))
+
+
+@router.post("/rooms/{seed}/export", status_code=202, response_model=JobResponse)
+def start_room_export(seed: str, priority: int = 0, db: Session = Depends(get_db)):
+    """Export a room in the background; poll /api/jobs/{id} for the result"""
     room = db.query(Room).filter(Room.seed == seed).first()
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
-    return {"status": room.status}
+    return jobs.submit(
+        db,
+        "room_export",
+        {"room_id": room.id},
+        room_id=room.id,
+        priority=priority,
+    )
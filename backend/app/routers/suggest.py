@@ -0,0 +1,32 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+from .. import suggest
+from ..tracing import TracedRoute
+from pydantic import BaseModel
+
+router = APIRouter(route_class=TracedRoute)
+
+
+class Suggestion(BaseModel):
+    text: str
+    group: Optional[str] = None
+    count: int
+
+
+@router.get("/suggest", response_model=List[Suggestion])
+def get_suggestions(
+    kind: str,
+    q: str = "",
+    meal_type: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+):
+    """Suggest previously used dish or drink names starting with q"""
+    index = suggest.INDEXES.get(kind)
+    if index is None:
+        raise HTTPException(status_code=400, detail="kind must be dish or drink")
+    group = meal_type if kind == "dish" else category
+    return [
+        Suggestion(text=text, group=group_name, count=count)
+        for text, group_name, count in index.search(q, group, limit)
+    ]
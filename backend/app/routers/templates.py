@@ -0,0 +1,147 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import JSON, DateTime, exists, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..database.database import get_db
+from ..database.write_queue import run_write
+from ..models.models import Room, RoomStatus, RoomTemplate
+from .. import cloning
+from ..tracing import TracedRoute
+from .rooms import RoomResponse, unused_room_seed
+from pydantic import BaseModel
+from datetime import datetime
+
+router = APIRouter(route_class=TracedRoute)
+
+NAME_TAKEN = "Template name already in use"
+
+
+class TemplateNameTaken(Exception):
+    pass
+
+
+class TemplateCreate(BaseModel):
+    name: str
+    seed: str  # Room the template is taken from
+    include: List[str] = list(cloning.DEFAULT_COLLECTIONS)
+
+
+class TemplateResponse(BaseModel):
+    id: int
+    name: str
+    room_id: int
+    collections: List[str]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+def _get_template(db: Session, template_id: int) -> RoomTemplate:
+    template = db.query(RoomTemplate).filter(RoomTemplate.id == template_id).first()
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return template
+
+
+@router.get("/templates/", response_model=List[TemplateResponse])
+def get_templates(db: Session = Depends(get_db)):
+    """Get all saved room templates"""
+    return db.query(RoomTemplate).order_by(RoomTemplate.name).all()
+
+
+@router.post("/templates/", response_model=TemplateResponse)
+def create_template(template: TemplateCreate, db: Session = Depends(get_db)):
+    """Save the setup of a room as a named template"""
+    room = db.query(Room).filter(Room.seed == template.seed).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    # Fast path only; the unique index and the conditional insert decide
+    if db.query(RoomTemplate).filter(RoomTemplate.name == template.name).first():
+        raise HTTPException(status_code=409, detail=NAME_TAKEN)
+
+    source_id = room.id
+    template_seed = unused_room_seed(db)
+
+    def write(session: Session):
+        template_room = cloning.clone_room(
+            session,
+            source_id,
+            template_seed,
+            template.include,
+            status=RoomStatus.template,
+        )
+        # Inserted only if the name is still free, so a concurrent save of
+        # the same name rolls back its cloned room instead of duplicating it
+        row = (
+            session.execute(
+                insert(RoomTemplate)
+                .from_select(
+                    ["name", "room_id", "collections", "created_at"],
+                    select(
+                        literal(template.name),
+                        literal(template_room.id),
+                        literal(list(template.include), JSON),
+                        literal(datetime.utcnow(), DateTime),
+                    ).where(~exists().where(RoomTemplate.name == template.name)),
+                )
+                .returning(*RoomTemplate.__table__.columns)
+            )
+            .mappings()
+            .first()
+        )
+        if row is None:
+            raise TemplateNameTaken()
+        return dict(row)
+
+    try:
+        return run_write(db, write)
+    except (TemplateNameTaken, IntegrityError):
+        db.rollback()
+        raise HTTPException(status_code=409, detail=NAME_TAKEN)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/templates/{template_id}/rooms", response_model=RoomResponse)
+def create_room_from_template(
+    template_id: int,
+    include: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """Create a new room from a template (everything it holds unless narrowed)"""
+    template = _get_template(db, template_id)
+    template_room_id = template.room_id
+    collections = include if include is not None else template.collections
+    status = RoomStatus.active if template.room.settings else RoomStatus.pending
+    seed = unused_room_seed(db)
+    try:
+        return run_write(
+            db,
+            lambda session: cloning.clone_room(
+                session, template_room_id, seed, collections, status=status
+            ),
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.delete("/templates/{template_id}")
+def delete_template(template_id: int, db: Session = Depends(get_db)):
+    """Delete a template; its room and content go with it"""
+    template = _get_template(db, template_id)
+    template_room_id = template.room_id
+    try:
+        run_write(
+            db,
+            lambda session: session.query(Room)
+            .filter(Room.id == template_room_id)
+            .delete(synchronize_session=False),
+        )
+        return {"message": "Template deleted successfully"}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List
+from ..database.conditional import update_row
 from ..database.database import get_db
+from ..database.write_queue import run_write
 from ..models import models
-from pydantic import BaseModel, ConfigDict
+from .. import hot_rooms, room_events, snapshots
+from ..wire import list_response, vary_on_accept
+from ..tracing import TracedRoute
+from pydantic import BaseModel, ConfigDict, Field
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 class WishlistItemBase(BaseModel):
@@ -20,10 +27,18 @@ class WishlistItemCreate(WishlistItemBase):
 
 
 class WishlistItemResponse(WishlistItemBase):
+    # The column is nullable: rows not written through this API may have none
+    requested_quantity: float | None
     id: int
+    claimed_quantity: float
+    version: int
     model_config = ConfigDict(from_attributes=True)
 
 
+class WishlistClaim(BaseModel):
+    quantity: float = Field(gt=0)
+
+
 @router.post("/wishlist/", response_model=WishlistItemResponse)
 def create_wishlist_item(item: WishlistItemCreate, db: Session = Depends(get_db)):
     try:
@@ -34,20 +49,36 @@ def create_wishlist_item(item: WishlistItemCreate, db: Session = Depends(get_db)
         if room.status != models.RoomStatus.active:
             raise HTTPException(status_code=400, detail="Room is not active")
 
-        db_item = models.WishlistItem(**item.model_dump())
-        db.add(db_item)
-        db.commit()
-        db.refresh(db_item)
+        def write(session: Session):
+            db_item = models.WishlistItem(**item.model_dump())
+            session.add(db_item)
+            return db_item
+
+        db_item = run_write(db, write)
+        snapshots.refresh_if_published(db, item.room_id)
         return db_item
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/wishlist/{room_id}", response_model=List[WishlistItemResponse])
+@router.get(
+    "/wishlist/{room_id}",
+    response_model=List[WishlistItemResponse],
+    dependencies=[Depends(vary_on_accept)],
+)
 def get_wishlist_items(
-    room_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
+    room_id: int,
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
 ):
+    hot_room = hot_rooms.get(room_id)
+    if hot_room is not None:
+        items = hot_room.newest("wishlist", skip, limit)
+        return list_response(request, WishlistItemResponse, items)
+
     # Verify room exists
     room = db.query(models.Room).filter(models.Room.id == room_id).first()
     if not room:
@@ -61,7 +92,7 @@ def get_wishlist_items(
         .limit(limit)
         .all()
     )
-    return items
+    return list_response(request, WishlistItemResponse, items)
 
 
 @router.delete("/wishlist/{room_id}/{item_id}")
@@ -86,9 +117,107 @@ def delete_wishlist_item(room_id: int, item_id: int, db: Session = Depends(get_d
         )
 
     try:
-        db.delete(db_item)
-        db.commit()
+        run_write(
+            db,
+            lambda session: session.query(models.WishlistItem)
+            .filter(
+                models.WishlistItem.id == item_id,
+                models.WishlistItem.room_id == room_id,
+            )
+            .delete(),
+        )
+        snapshots.refresh_if_published(db, room_id)
         return {"message": "Wishlist item deleted successfully"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
+
+
+def _claim_failure(db: Session, room_id: int, item_id: int, delta: float):
+    """The error to answer a claim that matched nothing with"""
+    item = models.WishlistItem
+    room = db.query(models.Room).filter(models.Room.id == room_id).first()
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room.status != models.RoomStatus.active:
+        raise HTTPException(status_code=400, detail="Room is not active")
+    current = db.query(item).filter(item.id == item_id, item.room_id == room_id).first()
+    if not current:
+        raise HTTPException(
+            status_code=404, detail="Wishlist item not found in this room"
+        )
+    if delta > 0:
+        remaining = round(
+            (current.requested_quantity or 0) - current.claimed_quantity,
+            models.QUANTITY_DECIMALS,
+        )
+        detail = f"Only {remaining:g} left to claim"
+    else:
+        detail = f"Only {current.claimed_quantity:g} claimed"
+    return HTTPException(status_code=409, detail=detail)
+
+
+def _change_claim(db: Session, room_id: int, item_id: int, delta: float):
+    """Compare-and-set on the claimed quantity; nothing is read beforehand"""
+    item = models.WishlistItem
+    active_rooms = select(models.Room.id).where(
+        models.Room.status == models.RoomStatus.active
+    )
+    claimed = func.round(item.claimed_quantity + delta, models.QUANTITY_DECIMALS)
+    where = [
+        item.id == item_id,
+        item.room_id == room_id,
+        item.room_id.in_(active_rooms),
+        # Checked by the database against the row as it is when written, so
+        # concurrent claims can never take more than was requested
+        claimed <= item.requested_quantity if delta > 0 else claimed >= 0,
+    ]
+    changes = {"claimed_quantity": claimed}
+    try:
+        row = run_write(db, lambda session: update_row(session, item, where, changes))
+    except IntegrityError as e:
+        # Anything else is a server-side failure and answers 500
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        if row is None:
+            raise _claim_failure(db, room_id, item_id, delta)
+        snapshots.refresh_if_published(db, room_id)
+    finally:
+        # Hand the connection back now: the dependency teardown that would
+        # close the session needs a free worker thread, and under a burst of
+        # claims those are all waiting for connections
+        db.close()
+    room_events.publish(
+        room_id,
+        {
+            "type": "wishlist",
+            "id": row["id"],
+            "claimed_quantity": row["claimed_quantity"],
+            "remaining": round(
+                (row["requested_quantity"] or 0) - row["claimed_quantity"],
+                models.QUANTITY_DECIMALS,
+            ),
+            "version": row["version"],
+        },
+    )
+    return row
+
+
+@router.post("/wishlist/{room_id}/{item_id}/claim", response_model=WishlistItemResponse)
+def claim_wishlist_item(
+    room_id: int, item_id: int, claim: WishlistClaim, db: Session = Depends(get_db)
+):
+    """Take on part of what is requested; 409 if less than that is left"""
+    return _change_claim(db, room_id, item_id, claim.quantity)
+
+
+@router.post(
+    "/wishlist/{room_id}/{item_id}/unclaim", response_model=WishlistItemResponse
+)
+def unclaim_wishlist_item(
+    room_id: int, item_id: int, claim: WishlistClaim, db: Session = Depends(get_db)
+):
+    """Give back part of what was claimed"""
+    return _change_claim(db, room_id, item_id, -claim.quantity)
@@ -0,0 +1,170 @@
+"""Single-flight coalescing of identical concurrent reads.
+
+When a room link is shared, many clients ask for the same room at once.
+With ``SINGLE_FLIGHT=1``, GETs of the per-room routes in ``ROUTES`` that
+arrive while an identical one is being answered wait for it and are sent
+the same response bytes instead of running their own queries and
+serialization. Requests are identical when route, path and query
+parameters, the headers that change the response (representation,
+compression, CORS origin) and the room's ``version`` all match; the version
+is looked up first, so a request arriving after a committed write never
+shares a response computed before it. Nothing is cached once the response
+is out.
+
+Coalescing happens per process. Counters per route (requests, computed,
+shared and the share ratio) are at ``/api/admin/single-flight``, behind
+``ADMIN_TOKEN``.
+"""
+
+import asyncio
+import os
+import threading
+from collections import defaultdict
+
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+
+from .database import database
+from .models import models
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "0") == "1"
+
+# Route path -> path parameter naming the room
+ROUTES = {
+    "/api/rooms/{seed}": "seed",
+    "/api/dishes/{room_id}": "room_id",
+    "/api/drinks/{room_id}": "room_id",
+    "/api/wishlist/{room_id}": "room_id",
+    "/api/drink-wishlist/{room_id}": "room_id",
+}
+
+# Request headers that change the response, so they are part of the key
+KEY_HEADERS = (b"accept", b"accept-encoding", b"origin")
+
+_lock = threading.Lock()
+_counters = defaultdict(lambda: {"requests": 0, "computed": 0, "shared": 0})
+
+
+def _count(route: str, outcome: str) -> None:
+    with _lock:
+        counters = _counters[route]
+        counters["requests"] += 1
+        counters[outcome] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        routes = {route: dict(counters) for route, counters in _counters.items()}
+    for counters in routes.values():
+        counters["shared_ratio"] = round(counters["shared"] / counters["requests"], 4)
+    return {"enabled": SINGLE_FLIGHT_ENABLED, "routes": routes}
+
+
+def room_version(parameter: str, value: str):
+    """Current version of the room a request is about; None if it is unknown"""
+    if parameter == "seed":
+        condition = models.Room.seed == value
+    elif value.isdigit():
+        condition = models.Room.id == int(value)
+    else:
+        return None
+    with database.SessionLocal() as session:
+        return session.query(models.Room.version).filter(condition).scalar()
+
+
+def _copy(message: dict) -> dict:
+    # Outer middlewares append to the headers of what they are sent
+    if "headers" in message:
+        return {**message, "headers": list(message["headers"])}
+    return dict(message)
+
+
+class SingleFlightMiddleware:
+    """ASGI middleware sharing one response between identical concurrent GETs"""
+
+    def __init__(self, app, routes: list):
+        self.app = app
+        self.routes = routes
+        # key -> future of the (start message, body messages) being computed
+        self.flights = {}
+
+    def _match(self, scope):
+        for route in self.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return route.path, child_scope["path_params"]
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        matched = self._match(scope)
+        # Profiled requests have to run their own endpoint call
+        profiled = b"x-profile-token" in headers or b"profile=" in scope.get(
+            "query_string", b""
+        )
+        if matched is None or profiled:
+            await self.app(scope, receive, send)
+            return
+
+        route, path_params = matched
+        version = await run_in_threadpool(
+            room_version, ROUTES[route], path_params[ROUTES[route]]
+        )
+        if version is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = (
+            route,
+            tuple(sorted(path_params.items())),
+            scope.get("query_string", b""),
+            tuple(headers.get(name, b"") for name in KEY_HEADERS),
+            version,
+        )
+        flight = self.flights.get(key)
+        if flight is not None:
+            # Shielded: a follower going away must not cancel the leader's work
+            response = await asyncio.shield(flight)
+            if response is not None:
+                _count(route, "shared")
+                for message in response:
+                    await send(_copy(message))
+                return
+            # The leader failed; try on our own rather than share its error
+            await self.app(scope, receive, send)
+            return
+
+        flight = asyncio.get_running_loop().create_future()
+        self.flights[key] = flight
+        response = []
+
+        async def buffer(message):
+            response.append(message)
+
+        try:
+            await self.app(scope, receive, buffer)
+        except BaseException:
+            flight.set_result(None)
+            raise
+        finally:
+            del self.flights[key]
+        flight.set_result(response)
+        _count(route, "computed")
+        for message in response:
+            await send(_copy(message))
+
+
+def install(app):
+    """Coalesce identical reads of ROUTES; a no-op unless SINGLE_FLIGHT=1"""
+    if not SINGLE_FLIGHT_ENABLED:
+        return
+    routes = [
+        route
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.path in ROUTES
+    ]
+    app.add_middleware(SingleFlightMiddleware, routes=routes)
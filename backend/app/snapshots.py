@@ -0,0 +1,169 @@
+"""Published (frozen) room snapshots.
+
+A published room has its full state rendered to JSON files on disk, next to
+precompressed gzip (and brotli, when the ``brotli`` package is installed)
+variants and a file holding the content hash. ``simple_server.py`` serves
+these files without touching the database. Mutations of a published room
+call ``refresh_if_published`` so the files never go stale.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from . import hot_rooms
+from .config import SNAPSHOT_DIR
+from .models import models
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always written
+    brotli = None
+
+
+def _row(obj) -> dict:
+    return {column.name: getattr(obj, column.name) for column in obj.__table__.columns}
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+ENCODINGS = {"identity": ".json", "gzip": ".json.gz", "br": ".json.br"}
+
+
+def current_path(seed: str) -> str:
+    """Path of the file holding the content hash of the published snapshot"""
+    return os.path.join(SNAPSHOT_DIR, seed + ".etag")
+
+
+def snapshot_path(seed: str, etag: str, encoding: str = "identity") -> str:
+    """Path of one encoding of a snapshot; names embed the content hash"""
+    return os.path.join(SNAPSHOT_DIR, f"{seed}.{etag}{ENCODINGS[encoding]}")
+
+
+def current_etag(seed: str) -> str | None:
+    try:
+        with open(current_path(seed)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def is_published(seed: str) -> bool:
+    return os.path.exists(current_path(seed))
+
+
+def build_room_snapshot(db: Session, room: models.Room) -> dict:
+    """Collect the full state of a room as plain JSON-serializable data"""
+    hot_room = hot_rooms.get(room.id)
+    if hot_room is not None:
+        return {
+            "room": _row(room),
+            "families": [r.as_dict() for r in hot_room.rows("families")],
+            "members": [r.as_dict() for r in hot_room.member_rows()],
+            "dishes": [r.as_dict() for r in hot_room.rows("dishes")],
+            "drinks": [r.as_dict() for r in hot_room.rows("drinks")],
+            "wishlist": [r.as_dict() for r in hot_room.rows("wishlist")],
+            "drink_wishlist": [r.as_dict() for r in hot_room.rows("drink_wishlist")],
+        }
+
+    def rows(model):
+        return [
+            _row(obj)
+            for obj in db.query(model)
+            .filter(model.room_id == room.id)
+            .order_by(model.id)
+            .all()
+        ]
+
+    families = rows(models.Family)
+    family_ids = [family["id"] for family in families]
+    members = (
+        [
+            _row(member)
+            for member in db.query(models.Member)
+            .filter(models.Member.family_id.in_(family_ids))
+            .order_by(models.Member.id)
+            .all()
+        ]
+        if family_ids
+        else []
+    )
+
+    return {
+        "room": _row(room),
+        "families": families,
+        "members": members,
+        "dishes": rows(models.Dish),
+        "drinks": rows(models.Drink),
+        "wishlist": rows(models.WishlistItem),
+        "drink_wishlist": rows(models.DrinkWishlistItem),
+    }
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _remove_files(seed: str, etag: str) -> None:
+    for encoding in ENCODINGS:
+        try:
+            os.remove(snapshot_path(seed, etag, encoding))
+        except FileNotFoundError:
+            pass
+
+
+def publish_room(db: Session, room: models.Room) -> dict:
+    """Render the room to disk and return its content hash"""
+    body = json.dumps(
+        build_room_snapshot(db, room),
+        default=json_default,
+        sort_keys=True,
+        separators=(",", ":"),
+    ).encode()
+    etag = hashlib.sha256(body).hexdigest()
+    previous = current_etag(room.seed)
+    if previous == etag:
+        return {"seed": room.seed, "etag": etag}
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    _write_atomic(snapshot_path(room.seed, etag), body)
+    _write_atomic(
+        snapshot_path(room.seed, etag, "gzip"),
+        gzip.compress(body, compresslevel=9, mtime=0),
+    )
+    if brotli is not None:
+        _write_atomic(snapshot_path(room.seed, etag, "br"), brotli.compress(body))
+    # Switching the pointer publishes the new files atomically; readers that
+    # already opened the previous files keep reading them until they finish
+    _write_atomic(current_path(room.seed), etag.encode())
+    if previous:
+        _remove_files(room.seed, previous)
+    return {"seed": room.seed, "etag": etag}
+
+
+def unpublish_room(seed: str) -> None:
+    etag = current_etag(seed)
+    if etag is None:
+        return
+    # Remove the pointer first so readers stop serving the room right away
+    os.remove(current_path(seed))
+    _remove_files(seed, etag)
+
+
+def refresh_if_published(db: Session, room_id: int) -> None:
+    """Regenerate the snapshot of a room after a change, if it is published"""
+    room = db.query(models.Room).filter(models.Room.id == room_id).first()
+    if room and is_published(room.seed):
+        publish_room(db, room)
@@ -0,0 +1,128 @@
+"""Autocomplete for dish and drink names.
+
+Each kind keeps every distinct (name, group) pair ever entered in a sorted
+list of normalized keys, so a prefix lookup is two bisections plus a scan of
+the matching range. The group is the meal type for dishes and the category
+for drinks, and the rank is how often the name was used. Indexes are built
+from the whole history with one GROUP BY per column at startup, and new
+dishes and drinks are added as they are created, so lookups never touch the
+database. Deleted items are not removed: suggestions reflect what guests
+typed before, not what a room currently holds.
+"""
+
+import bisect
+import heapq
+import threading
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .models.models import Dish, Drink
+
+# Separates the name from the group in a key; sorts before any printable
+# character, so all keys of a name stay next to each other
+_SEP = "\x00"
+
+SHORT_PREFIX = 2
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._keys = []  # sorted "name<SEP>group"
+        self._entries = {}  # key -> [label, count]
+        # Short prefixes match large ranges and are the most typed, so their
+        # results are kept until the next insert
+        self._short_results = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _merge(self, label, group, count) -> bool:
+        """Count label under group; True if it is a new key"""
+        label = " ".join((label or "").split())
+        if not label:
+            return False
+        key = normalize(label) + _SEP + (group or "")
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = [label, count]
+            return True
+        entry[1] += count
+        return False
+
+    def add(self, label: str | None, group: str | None, count: int = 1):
+        with self._lock:
+            self._short_results.clear()
+            if self._merge(label, group, count):
+                bisect.insort(self._keys, normalize(label) + _SEP + (group or ""))
+
+    def add_many(self, rows):
+        """Bulk-load (label, group, count) rows, sorting the keys once"""
+        with self._lock:
+            self._short_results.clear()
+            for label, group, count in rows:
+                self._merge(label, group, count)
+            self._keys = sorted(self._entries)
+
+    def search(self, prefix: str, group: str | None = None, limit: int = 10):
+        """Most used (label, group, count) starting with prefix, best first"""
+        prefix = normalize(prefix)
+        cache_key = (prefix, group, limit) if len(prefix) <= SHORT_PREFIX else None
+        with self._lock:
+            cached = self._short_results.get(cache_key)
+            if cached is not None:
+                return cached
+            start = bisect.bisect_left(self._keys, prefix)
+            end = bisect.bisect_left(self._keys, prefix + "\uffff", lo=start)
+            matches = []
+            for key in self._keys[start:end]:
+                key_group = key.partition(_SEP)[2]
+                if group is not None and key_group != group:
+                    continue
+                label, count = self._entries[key]
+                matches.append((count, label, key_group))
+            # Ties go to the alphabetically first label
+            best = heapq.nsmallest(
+                limit, matches, key=lambda m: (-m[0], m[1].casefold())
+            )
+            results = [
+                (label, key_group or None, count) for count, label, key_group in best
+            ]
+            if cache_key is not None and len(self._short_results) < 4096:
+                self._short_results[cache_key] = results
+        return results
+
+
+INDEXES = {"dish": PrefixIndex(), "drink": PrefixIndex()}
+
+
+def _load(index: PrefixIndex, db: Session, column, group_column):
+    index.add_many(
+        db.query(column, group_column, func.count())
+        .filter(column.isnot(None))
+        .group_by(column, group_column)
+    )
+
+
+def load(db: Session):
+    """(Re)build both indexes from the database"""
+    dishes, drinks = PrefixIndex(), PrefixIndex()
+    _load(dishes, db, Dish.name, Dish.meal_type)
+    _load(drinks, db, Drink.fullName, Drink.category)
+    _load(drinks, db, Drink.brand, Drink.category)
+    INDEXES.update(dish=dishes, drink=drinks)
+
+
+def record_dish(dish: Dish):
+    INDEXES["dish"].add(dish.name, dish.meal_type)
+
+
+def record_drink(drink: Drink):
+    index = INDEXES["drink"]
+    index.add(drink.fullName, drink.category)
+    index.add(drink.brand, drink.category)
@@ -0,0 +1,338 @@
+"""OpenTelemetry tracing.
+
+Tracing is switched on by choosing an exporter with ``TRACE_EXPORTER``:
+
+- ``jsonl`` appends one JSON object per finished span to ``TRACE_FILE``, for
+  offline analysis with ``python trace_summary.py``;
+- ``console`` prints spans to stdout;
+- ``otlp`` sends them to a collector (needs
+  ``opentelemetry-exporter-otlp-proto-http``, configured with the standard
+  ``OTEL_EXPORTER_OTLP_*`` variables);
+- ``package.module:Class`` instantiates any other ``SpanExporter``.
+
+Each request gets a server span (continuing the caller's trace when it sends
+a W3C ``traceparent`` header; the ``traceresponse`` header names the span)
+with children for request validation, the endpoint, response serialization,
+the database session and every SQL statement, tagged with the route, the
+room id or seed and row counts. The routers are created with
+``route_class=TracedRoute``, which adds the validation, endpoint and
+serialization spans to each route's own handler. ``TRACE_SAMPLE_RATIO``
+keeps a share of new traces. When ``TRACE_EXPORTER`` is unset, or the
+``opentelemetry-sdk`` package is missing, ``install`` does nothing;
+``opentelemetry`` is only imported once tracing is on, so importing this
+module costs nothing.
+"""
+
+import asyncio
+import contextvars
+import functools
+import importlib
+import json
+import logging
+import os
+import threading
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .database.database import get_db
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "")
+TRACE_FILE = os.getenv("TRACE_FILE", "./traces.jsonl")
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "1.0"))
+
+SERVICE_NAME = "easter-meals-api"
+
+# Path parameters identifying the room a request is about
+ROOM_ATTRIBUTES = {"room_id": "room.id", "seed": "room.seed"}
+
+logger = logging.getLogger(__name__)
+
+# Set by install() along with the opentelemetry names used below
+tracer = None
+propagate = trace = SpanKind = Status = StatusCode = None
+
+# Open step spans of the current request, handed from the route handler to
+# the endpoint and back: {"validate": span} until the endpoint starts, then
+# {"serialize": span} once it has returned
+_steps = contextvars.ContextVar("trace_steps", default=None)
+
+
+class JsonLinesExporter:
+    """Append finished spans to a file, one JSON object per line
+
+    A ``SpanExporter`` by duck typing, so that defining it does not import
+    the SDK.
+    """
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        lines = [json.dumps(span_to_dict(span)) + "\n" for span in spans]
+        with self._lock, open(self.path, "a") as f:
+            f.writelines(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def span_to_dict(span) -> dict:
+    return {
+        "trace_id": f"{span.context.trace_id:032x}",
+        "span_id": f"{span.context.span_id:016x}",
+        "parent_id": f"{span.parent.span_id:016x}" if span.parent else None,
+        "name": span.name,
+        "kind": span.kind.name,
+        "start": span.start_time,
+        "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+        "events": [
+            {"name": e.name, "attributes": dict(e.attributes or {})}
+            for e in span.events
+        ],
+    }
+
+
+def _create_exporter(name: str):
+    if name == "jsonl":
+        return JsonLinesExporter()
+    if name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter()
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+    module, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module), attribute)()
+
+
+def _traceresponse(span) -> bytes:
+    context = span.get_span_context()
+    return (
+        f"00-{context.trace_id:032x}-{context.span_id:016x}-"
+        f"{int(context.trace_flags):02x}"
+    ).encode()
+
+
+class TracingMiddleware:
+    """ASGI middleware opening the server span of each HTTP request"""
+
+    def __init__(self, app, route_paths: dict):
+        self.app = app
+        self.route_paths = route_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope.get("headers") or []
+        }
+        with tracer.start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={
+                "http.method": scope["method"],
+                "http.target": scope["path"],
+            },
+        ) as span:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                    message.setdefault("headers", []).append(
+                        (b"traceresponse", _traceresponse(span))
+                    )
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # The router fills in the endpoint and path parameters
+                route = self.route_paths.get(scope.get("endpoint"))
+                if route:
+                    span.update_name(f"{scope['method']} {route}")
+                    span.set_attribute("http.route", route)
+                params = scope.get("path_params") or {}
+                for param, attribute in ROOM_ATTRIBUTES.items():
+                    if param in params:
+                        span.set_attribute(attribute, params[param])
+
+
+def _end_step(name: str) -> None:
+    steps = _steps.get()
+    if steps is not None and name in steps:
+        steps.pop(name).end()
+
+
+def _endpoint_span(call):
+    span = tracer.start_as_current_span(
+        "endpoint", attributes={"code.function": getattr(call, "__name__", repr(call))}
+    )
+    _end_step("validate")
+    return span
+
+
+def _endpoint_done(span, result) -> None:
+    if isinstance(result, (list, tuple)):
+        span.set_attribute("app.rows", len(result))
+
+
+def _start_serialize() -> None:
+    steps = _steps.get()
+    if steps is not None:
+        steps["serialize"] = tracer.start_span("serialize response")
+
+
+def _traced_endpoint(call):
+    # Keeps the endpoint sync or async, as FastAPI decides how to run it from
+    # the function it is given
+    if asyncio.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def traced(**values):
+            if tracer is None:
+                return await call(**values)
+            with _endpoint_span(call) as span:
+                result = await call(**values)
+                _endpoint_done(span, result)
+            _start_serialize()
+            return result
+
+    else:
+
+        @functools.wraps(call)
+        def traced(**values):
+            # Runs in a worker thread, in a copy of the request's context
+            if tracer is None:
+                return call(**values)
+            with _endpoint_span(call) as span:
+                result = call(**values)
+                _endpoint_done(span, result)
+            _start_serialize()
+            return result
+
+    return traced
+
+
+class TracedRoute(APIRoute):
+    """APIRoute with child spans for request validation, the endpoint and
+    response serialization; a plain APIRoute unless TRACE_EXPORTER is set"""
+
+    def get_route_handler(self):
+        if not TRACE_EXPORTER:
+            return super().get_route_handler()
+        self.dependant.call = _traced_endpoint(self.dependant.call)
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            if tracer is None:
+                return await handler(request)
+            steps = {"validate": tracer.start_span("validate request")}
+            token = _steps.set(steps)
+            try:
+                return await handler(request)
+            finally:
+                _steps.reset(token)
+                # Validation that failed, or the serialization that followed
+                for span in steps.values():
+                    span.end()
+
+        return traced_handler
+
+
+def traced_get_db():
+    # Spans the session from checkout to close. The dependency is entered and
+    # exited in different worker threads, so the span is never made current
+    span = tracer.start_span("db.session")
+    try:
+        yield from get_db()
+    finally:
+        span.end()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = tracer.start_span(
+        f"db {statement.split(None, 1)[0].upper()}",
+        kind=SpanKind.CLIENT,
+        attributes={
+            "db.system": conn.dialect.name,
+            "db.statement": statement,
+        },
+    )
+    conn.info.setdefault("trace_spans", []).append(span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    if spans:
+        span = spans.pop()
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute("db.rows_affected", cursor.rowcount)
+        span.end()
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    spans = connection.info.get("trace_spans") if connection is not None else None
+    if spans:
+        span = spans.pop()
+        span.record_exception(exception_context.original_exception)
+        span.set_status(Status(StatusCode.ERROR))
+        span.end()
+
+
+def install(app):
+    """Hook tracing into the app; a no-op unless TRACE_EXPORTER is set"""
+    global tracer, propagate, trace, SpanKind, Status, StatusCode
+    if not TRACE_EXPORTER:
+        return
+    try:
+        from opentelemetry import propagate, trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        from opentelemetry.trace import SpanKind, Status, StatusCode
+    except ImportError:  # optional, tracing stays off
+        logger.warning("TRACE_EXPORTER is set but opentelemetry-sdk is not installed")
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACE_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(_create_exporter(TRACE_EXPORTER)))
+    trace.set_tracer_provider(provider)
+    tracer = trace.get_tracer(__name__)
+
+    app.dependency_overrides[get_db] = traced_get_db
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+    route_paths = {
+        route.endpoint: route.path
+        for route in app.routes
+        if isinstance(route, APIRoute)
+    }
+    app.add_middleware(TracingMiddleware, route_paths=route_paths)
@@ -0,0 +1,191 @@
+"""Compact wire formats and response compression.
+
+Per-room list endpoints negotiate their representation (nested responses
+such as the roster only support MessagePack):
+
+- ``Accept: application/msgpack`` encodes the payload with MessagePack
+  (when the ``msgpack`` package is installed, JSON otherwise);
+- ``?shape=columnar`` sends each key once with an array of values per key,
+  ``{"count": n, "columns": {"name": [...], "quantity": [...]}}``, instead
+  of repeating every key on every row.
+
+Without either, endpoints answer exactly as before, except that every
+representation carries ``Vary: Accept`` (see ``vary_on_accept``).
+``CompressionMiddleware`` then compresses bodies above ``COMPRESS_MIN_SIZE`` bytes with brotli (when
+installed) or gzip, depending on the client's ``Accept-Encoding``.
+"""
+
+import gzip
+import json
+import os
+
+from fastapi import Request, Response
+
+try:
+    import msgpack
+except ImportError:  # optional, JSON is used instead
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used instead
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return msgpack is not None and any(t in accept for t in MSGPACK_MEDIA_TYPES)
+
+
+def wants_columnar(request: Request) -> bool:
+    return request.query_params.get("shape") == "columnar"
+
+
+def to_columnar(rows: list) -> dict:
+    columns = {key: [] for key in (rows[0] if rows else {})}
+    for row in rows:
+        for key, values in columns.items():
+            values.append(row[key])
+    return {"count": len(rows), "columns": columns}
+
+
+def encode(payload, as_msgpack: bool) -> tuple:
+    """Return (body, media type) for a JSON-compatible payload"""
+    if as_msgpack:
+        return msgpack.packb(payload), MSGPACK_MEDIA_TYPES[0]
+    return (
+        json.dumps(payload, separators=(",", ":")).encode(),
+        "application/json",
+    )
+
+
+def list_response(request: Request, schema, items):
+    """Negotiate the representation of a list endpoint's result.
+
+    Returns the items untouched for the default row-per-object JSON, so
+    FastAPI's response_model handling stays in charge of that path.
+    """
+    as_msgpack = wants_msgpack(request)
+    columnar = wants_columnar(request)
+    if not as_msgpack and not columnar:
+        return items
+
+    rows = [schema.model_validate(item).model_dump(mode="json") for item in items]
+    body, media_type = encode(to_columnar(rows) if columnar else rows, as_msgpack)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
+
+
+def vary_on_accept(response: Response) -> None:
+    """Route dependency marking every representation, the default JSON one
+    included, as negotiated on Accept so shared caches keep them apart"""
+    response.headers["Vary"] = "Accept"
+
+
+def model_response(request: Request, model):
+    """MessagePack-encode a nested response model when the client asks for it"""
+    if not wants_msgpack(request):
+        return model
+    body, media_type = encode(model.model_dump(mode="json"), True)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
+
+
+def _quality(params: list) -> float:
+    for param in params:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Content codings an Accept-Encoding header allows, lowercased"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, *params = part.split(";")
+        # "q=0" (or "q=0.0", "q=0.00") refuses a coding
+        if coding.strip() and _quality(params) > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding: str):
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing non-streamed responses above a threshold"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode())
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        chunks = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                start_message = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    # Streamed responses (e.g. files) are sent as they are
+                    passthrough = True
+                    await send(start_message)
+                    await send({**message, "body": b"".join(chunks)})
+                    return
+                await self._send_buffered(
+                    send, start_message, b"".join(chunks), encoding
+                )
+            else:
+                await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_buffered(self, send, start_message, body, encoding):
+        headers = [
+            (name, value)
+            for name, value in start_message.get("headers", [])
+            if name.lower() != b"content-length"
+        ]
+        already_encoded = any(
+            name.lower() == b"content-encoding" for name, _ in headers
+        )
+        if len(body) >= self.minimum_size and not already_encoded:
+            body = compress(body, encoding)
+            headers.append((b"content-encoding", encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({**start_message, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
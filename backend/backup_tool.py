@@ -0,0 +1,67 @@
+"""Create, check and restore database backups.
+
+Uses the same DATABASE_URL, SHARD_COUNT and BACKUP_* settings as the app.
+Backups can be taken while the app is running; restore with the app stopped.
+Run from the backend directory:
+
+    python backup_tool.py backup
+    python backup_tool.py list
+    python backup_tool.py verify 20250401T120000000000
+    python backup_tool.py restore 20250401T120000000000
+    python backup_tool.py prune --keep 10
+"""
+
+import argparse
+import sys
+
+from app.database import backup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("backup", help="back up every database now")
+    commands.add_parser("list", help="show the stored backups, newest first")
+    verify = commands.add_parser("verify", help="integrity-check a backup")
+    verify.add_argument("backup_id")
+    restore = commands.add_parser(
+        "restore", help="replace the databases with a backup (app stopped)"
+    )
+    restore.add_argument("backup_id")
+    restore.add_argument(
+        "--no-safety-backup",
+        action="store_true",
+        help="do not back up the current databases first",
+    )
+    prune = commands.add_parser("prune", help="delete old backups")
+    prune.add_argument("--keep", type=int, default=backup.BACKUP_KEEP)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "backup":
+            print(f"Created backup {backup.create_backup()}")
+        elif args.command == "list":
+            for backup_id in backup.list_backups():
+                manifest = backup.read_manifest(backup_id)
+                size = sum(entry["size"] for entry in manifest["files"].values())
+                print(f"{backup_id}\t{len(manifest['files'])} files\t{size} bytes")
+        elif args.command == "verify":
+            backup.verify_backup(args.backup_id)
+            print(f"Backup {args.backup_id} is intact")
+        elif args.command == "restore":
+            if not args.no_safety_backup:
+                # Not pruning, which could delete the backup being restored
+                safety_id = backup.create_backup(prune_old=False)
+                print(f"Saved the current state as {safety_id}")
+            backup.restore_backup(args.backup_id)
+            print(f"Restored backup {args.backup_id}")
+        else:
+            for backup_id in backup.prune(args.keep):
+                print(f"Deleted {backup_id}")
+    except backup.BackupError as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
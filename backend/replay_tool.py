@@ -0,0 +1,325 @@
+"""Replay captured traffic against a fresh app and compare builds.
+
+``run`` copies a seed database (e.g. a file from ``backup_tool.py``), starts
+uvicorn on it from the given backend directory, re-sends every request of a
+capture (see ``CAPTURE_FILE``) at its original pace divided by ``--speed``
+and writes the measured latency of each request. Rooms and items created
+during the capture get new ids and seeds in the replay; later requests are
+rewritten to use those, and wait for the request creating them. ``compare``
+reports per-route latency changes between two such runs. Run from the
+backend directory:
+
+    python replay_tool.py run capture.jsonl --db seed.db --out before.jsonl
+    python replay_tool.py run capture.jsonl --db seed.db --out after.jsonl \\
+        --app-dir ../../new-build/backend --speed 4
+    python replay_tool.py compare before.jsonl after.jsonl
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def load_capture(path):
+    with open(path) as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+    return sorted(requests, key=lambda request: request["ts"])
+
+
+def _namespace(path: str) -> str:
+    # "/api/dishes/3/17" -> "dishes"
+    return path.split("/")[2] if path.count("/") > 1 else ""
+
+
+class IdMap:
+    """Captured ids and seeds -> the ones handed out during the replay"""
+
+    def __init__(self):
+        self.values = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def _created_keys(self, request):
+        created = request.get("created") or {}
+        # Only rooms have seeds, whichever route created them
+        namespace = "rooms" if "seed" in created else _namespace(request["path"])
+        keys = {}
+        if "seed" in created:
+            keys["seed"] = ("seed", str(created["seed"]))
+        if "id" in created:
+            keys["id"] = (namespace, str(created["id"]))
+        return keys
+
+    def _key(self, request, name, value):
+        # Path parameters arrive as strings, JSON bodies carry numbers
+        if name in ("seed", "seeds"):
+            return ("seed", str(value))
+        if name == "room_id":
+            return ("rooms", str(value))
+        if name in request["path_params"] and name.endswith("id"):
+            return (_namespace(request["path"]), str(value))
+        return None
+
+    def references(self, request):
+        keys = [
+            self._key(request, name, value)
+            for name, value in request["path_params"].items()
+        ]
+        body = request["body"] if isinstance(request["body"], dict) else {}
+        for name, value in list(request["query"]) + list(body.items()):
+            for item in value if isinstance(value, list) else [value]:
+                keys.append(self._key(request, name, item))
+        return [key for key in keys if key is not None]
+
+    def expect(self, request, future):
+        with self.lock:
+            for key in self._created_keys(request).values():
+                self.pending[key] = future
+
+    def wait(self, request):
+        with self.lock:
+            futures = [
+                self.pending[key]
+                for key in self.references(request)
+                if key in self.pending
+            ]
+        for future in futures:
+            future.result()
+
+    def learn(self, request, created):
+        with self.lock:
+            for field, key in self._created_keys(request).items():
+                if created and field in created:
+                    self.values[key] = created[field]
+                self.pending.pop(key, None)
+
+    def _map(self, request, name, value):
+        key = self._key(request, name, value)
+        return self.values.get(key, value) if key is not None else value
+
+    def rewrite(self, request) -> dict:
+        with self.lock:
+            params = {
+                name: self._map(request, name, value)
+                for name, value in request["path_params"].items()
+            }
+            path = request["path"]
+            if request["route"] and params != request["path_params"]:
+                path = request["route"].format(**params)
+            query = [
+                (name, str(self._map(request, name, value)))
+                for name, value in request["query"]
+            ]
+            body = request["body"]
+            if isinstance(body, dict):
+                body = {
+                    name: (
+                        [self._map(request, name, item) for item in value]
+                        if isinstance(value, list)
+                        else self._map(request, name, value)
+                    )
+                    for name, value in body.items()
+                }
+        return dict(request, path=path, query=query, body=body)
+
+
+def start_server(app_dir: str, database_path: str):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{database_path}")
+    # The replay must not capture itself or write into the caller's files
+    for name in ("CAPTURE_FILE", "PROFILE_TOKEN", "TRACE_EXPORTER"):
+        env.pop(name, None)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=app_dir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/", timeout=1):
+                return process, base_url
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise TimeoutError("The app did not start within 30s")
+
+
+def send(base_url: str, request: dict) -> tuple:
+    url = base_url + request["path"]
+    if request["query"]:
+        url += "?" + urlencode(request["query"])
+    data = None
+    if request["body"] is not None:
+        data = json.dumps(request["body"]).encode()
+    http_request = urllib.request.Request(
+        url, data=data, method=request["method"], headers=request["headers"]
+    )
+    created = None
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(http_request, timeout=60) as response:
+            content = response.read()
+            status = response.status
+        if request.get("created"):
+            try:
+                created = json.loads(content)
+            except ValueError:
+                pass
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except OSError:
+        status = None
+    result = {
+        "route": request["route"] or request["path"],
+        "method": request["method"],
+        "status": status,
+        "captured_status": request["status"],
+        "captured_ms": request["duration_ms"],
+        "ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+    return result, created if isinstance(created, dict) else None
+
+
+def replay(requests, base_url: str, speed: float, concurrency: int):
+    results = []
+    lock = threading.Lock()
+    ids = IdMap()
+
+    def run(request):
+        ids.wait(request)
+        result, created = send(base_url, ids.rewrite(request))
+        if request.get("created"):
+            ids.learn(request, created)
+        with lock:
+            results.append(result)
+
+    first = requests[0]["ts"]
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for request in requests:
+            if speed > 0:
+                # Keep the captured spacing (scaled), so bursts stay bursts
+                delay = (request["ts"] - first) / speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            future = pool.submit(run, request)
+            ids.expect(request, future)
+    return results
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(path):
+    by_route = defaultdict(list)
+    errors = defaultdict(int)
+    with open(path) as f:
+        for line in f:
+            result = json.loads(line)
+            key = f"{result['method']} {result['route']}"
+            by_route[key].append(result["ms"])
+            if result["status"] != result["captured_status"]:
+                errors[key] += 1
+    return by_route, errors
+
+
+def compare(before_path, after_path):
+    before, _ = summarize(before_path)
+    after, after_errors = summarize(after_path)
+    print(
+        f"{'route':44} {'count':>6} {'p50 before':>11} {'p50 after':>10} "
+        f"{'p95 before':>11} {'p95 after':>10} {'delta p95':>10}"
+    )
+    for route in sorted(set(before) | set(after)):
+        if route not in before or route not in after:
+            print(f"{route[:44]:44} only in {'after' if route in after else 'before'}")
+            continue
+        b50, a50 = percentile(before[route], 0.5), percentile(after[route], 0.5)
+        b95, a95 = percentile(before[route], 0.95), percentile(after[route], 0.95)
+        delta = (a95 - b95) / b95 * 100 if b95 else 0.0
+        print(
+            f"{route[:44]:44} {len(after[route]):6d} {b50:11.2f} {a50:10.2f} "
+            f"{b95:11.2f} {a95:10.2f} {delta:+9.1f}%"
+            + (
+                f"  ({after_errors[route]} status changes)"
+                if after_errors[route]
+                else ""
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="replay a capture against a fresh app")
+    run.add_argument("capture")
+    run.add_argument("--db", required=True, help="SQLite file to start from")
+    run.add_argument("--out", required=True, help="where to write the results")
+    run.add_argument("--app-dir", default=".", help="backend directory to run")
+    run.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="time compression (1 = original pace, 0 = as fast as possible)",
+    )
+    run.add_argument("--concurrency", type=int, default=32)
+    diff = commands.add_parser("compare", help="per-route latency deltas")
+    diff.add_argument("before")
+    diff.add_argument("after")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.before, args.after)
+        return
+
+    requests = load_capture(args.capture)
+    if not requests:
+        parser.error("The capture is empty")
+    with tempfile.TemporaryDirectory() as workdir:
+        database_path = os.path.join(workdir, "replay.db")
+        # Every run starts from the same state, so runs are comparable
+        shutil.copyfile(args.db, database_path)
+        process, base_url = start_server(os.path.abspath(args.app_dir), database_path)
+        try:
+            results = replay(requests, base_url, args.speed, args.concurrency)
+        finally:
+            process.terminate()
+            process.wait()
+
+    with open(args.out, "w") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    mismatched = sum(r["status"] != r["captured_status"] for r in results)
+    print(
+        f"Replayed {len(results)} requests, {mismatched} with a different status "
+        f"than captured; results in {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
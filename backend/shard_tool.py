@@ -0,0 +1,69 @@
+"""Inspect and rebalance the room -> shard directory.
+
+Uses the same DATABASE_URL, SHARD_COUNT and SHARD_URL_TEMPLATE settings as the
+app. Run from the backend directory, preferably while the app is stopped
+(running workers cache the directory and must be restarted after a move):
+
+    python shard_tool.py list
+    python shard_tool.py move ROOMSEED 2
+    python shard_tool.py rebalance
+"""
+
+import argparse
+from collections import Counter
+
+from app.database import database
+from app.database.sharding import move_room
+from app.models import models  # noqa: F401  (registers the tables on Base.metadata)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="show every room and its shard")
+    move = commands.add_parser("move", help="move one room to another shard")
+    move.add_argument("seed")
+    move.add_argument("shard")
+    commands.add_parser(
+        "rebalance",
+        help="move rooms to their default shard (room id modulo SHARD_COUNT), "
+        "e.g. after adding shards",
+    )
+    args = parser.parse_args()
+
+    if database.SHARD_COUNT < 2:
+        parser.error("Sharding is disabled, set SHARD_COUNT to 2 or more")
+
+    database.prepare_schema(database.init_engine())
+    directory = database.room_directory
+    engines = database.shard_engines
+
+    if args.command == "list":
+        rooms = directory.all_rooms()
+        for room in rooms:
+            print(f"{room.seed}\troom {room.room_id}\tshard {room.shard}")
+        for shard, count in sorted(Counter(room.shard for room in rooms).items()):
+            print(f"shard {shard}: {count} rooms")
+    elif args.command == "move":
+        if args.shard not in engines:
+            parser.error(f"Unknown shard {args.shard}")
+        room_id = next(
+            (room.room_id for room in directory.all_rooms() if room.seed == args.seed),
+            None,
+        )
+        if room_id is None:
+            parser.error(f"Unknown room {args.seed}")
+        move_room(directory, engines, room_id, args.shard)
+        print(f"Moved {args.seed} to shard {args.shard}")
+    else:
+        for room in directory.all_rooms():
+            target = directory.default_shard_for(room.room_id)
+            if room.shard != target:
+                move_room(directory, engines, room.room_id, target)
+                print(f"Moved {room.seed} from shard {room.shard} to shard {target}")
+
+    database.dispose_engine()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,91 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+"""Lightweight read-only server.
+
+Besides the static affiliations, serves published room snapshots written by
+``app/snapshots.py`` at ``/api/rooms/{seed}/snapshot`` straight from disk
+with ``sendfile``, strong ETags and precompressed encodings, so a tiny
+process can absorb the event-day read storm without touching the database.
+"""
+
 import json
-from config import FAMILY_AFFILIATIONS
+import os
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from app.config import FAMILY_AFFILIATIONS
+from app.snapshots import current_etag, snapshot_path
+from app.wire import accepted_encodings
+
+SNAPSHOT_PREFIX = "/api/rooms/"
+SNAPSHOT_SUFFIX = "/snapshot"
+
+
+def choose_encoding(accept_encoding: str, etag: str, seed: str) -> str:
+    """Pick the best precompressed variant the client accepts"""
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in ("br", "gzip"):
+        if encoding in accepted and os.path.exists(snapshot_path(seed, etag, encoding)):
+            return encoding
+    return "identity"
 
 
 class SimpleHTTPRequestHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
+    protocol_version = "HTTP/1.1"
+
+    def send_json(self, status: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
         self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
         self.send_header("Access-Control-Allow-Origin", "*")
         self.end_headers()
+        self.wfile.write(body)
 
-        if self.path == "/api/affiliations/":
-            self.wfile.write(json.dumps(FAMILY_AFFILIATIONS).encode())
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path.startswith(SNAPSHOT_PREFIX) and path.endswith(SNAPSHOT_SUFFIX):
+            seed = path[len(SNAPSHOT_PREFIX) : -len(SNAPSHOT_SUFFIX)]
+            self.send_snapshot(seed)
+        elif path == "/api/affiliations/":
+            self.send_json(200, FAMILY_AFFILIATIONS)
         else:
-            self.wfile.write(json.dumps({"message": "Welcome"}).encode())
+            self.send_json(200, {"message": "Welcome"})
+
+    def send_snapshot(self, seed: str):
+        etag = current_etag(seed) if seed.isalnum() else None
+        if etag is None:
+            self.send_json(404, {"detail": "Room is not published"})
+            return
+
+        encoding = choose_encoding(self.headers.get("Accept-Encoding", ""), etag, seed)
+        # Strong ETags differ per encoding since the bytes on the wire differ
+        tag = f'"{etag}"' if encoding == "identity" else f'"{etag}-{encoding}"'
+        if tag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", tag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+
+        try:
+            f = open(snapshot_path(seed, etag, encoding), "rb")
+        except FileNotFoundError:
+            # Republished between reading the pointer and opening the file
+            self.send_json(503, {"detail": "Snapshot is being regenerated"})
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(200)
+            self.send_header("Content-type", "application/json")
+            self.send_header("Content-Length", str(size))
+            if encoding != "identity":
+                self.send_header("Content-Encoding", encoding)
+            self.send_header("ETag", tag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.flush()
+            # socket.sendfile uses os.sendfile (zero-copy) where available
+            self.connection.sendfile(f)
 
     def do_OPTIONS(self):
         self.send_response(200)
@@ -22,9 +94,11 @@ class SimpleHTTPRequestHandler(BaseHTTPRequestHandler):
             "Access-Control-Allow-Methods", "GET, POST, PUT, DELETE, OPTIONS"
         )
         self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
 
-httpd = HTTPServer(("localhost", 8000), SimpleHTTPRequestHandler)
-print("Server running on http://localhost:8000")
-httpd.serve_forever()
+if __name__ == "__main__":
+    httpd = ThreadingHTTPServer(("localhost", 8000), SimpleHTTPRequestHandler)
+    print("Server running on http://localhost:8000")
+    httpd.serve_forever()
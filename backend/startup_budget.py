@@ -0,0 +1,94 @@
+"""Measure how long a fresh backend process takes to become useful.
+
+Reports the import time of ``app.main`` and the time from spawning uvicorn to
+the first successful request, and exits non-zero when either exceeds its
+budget. Run from the backend directory:
+
+    python startup_budget.py --import-budget 1.5 --first-request-budget 3.0
+
+``tests/test_startup_budget.py`` runs the same checks as part of the test
+suite, with the budgets from ``STARTUP_IMPORT_BUDGET`` and
+``STARTUP_FIRST_REQUEST_BUDGET``.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.5"))
+FIRST_REQUEST_BUDGET = float(os.getenv("STARTUP_FIRST_REQUEST_BUDGET", "3.0"))
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import_time() -> float:
+    code = (
+        "import time; start = time.perf_counter(); import app.main; "
+        "print(time.perf_counter() - start)"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", code], text=True, cwd=BACKEND_DIR
+    )
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request_time(timeout: float, env: dict | None = None) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        cwd=BACKEND_DIR,
+        env=env if env is not None else os.environ.copy(),
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"No response from the server within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET)
+    parser.add_argument(
+        "--first-request-budget", type=float, default=FIRST_REQUEST_BUDGET
+    )
+    args = parser.parse_args()
+
+    import_time = measure_import_time()
+    first_request_time = measure_first_request_time(args.first_request_budget * 5)
+
+    print(f"import app.main:    {import_time:.3f}s (budget {args.import_budget}s)")
+    print(
+        f"first request:      {first_request_time:.3f}s "
+        f"(budget {args.first_request_budget}s)"
+    )
+
+    if (
+        import_time > args.import_budget
+        or first_request_time > args.first_request_budget
+    ):
+        print("Startup budget exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
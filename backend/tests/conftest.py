@@ -0,0 +1,155 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app.database import database
+from app.main import app
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = {
+    "participantCount": 4,
+    "mealCount": 1,
+    "language": "en",
+    "families": ["Smith", "Jones"],
+    "mealTypes": ["Main Course"],
+    "selectedTypes": ["Main Course"],
+}
+
+
+def new_room(client) -> dict:
+    """Create and activate a room with SETTINGS; returns the room"""
+    room = client.post("/api/rooms/").json()
+    client.put(f"/api/rooms/{room['seed']}/activate", json={"settings": SETTINGS})
+    return client.get(f"/api/rooms/{room['seed']}").json()
+
+
+def dish(room: dict, full_name: str = "Anna", **fields) -> dict:
+    """Body of a dish brought by full_name of the room's first family"""
+    return {
+        "name": "Ham",
+        "quantity": 1000,
+        "fullName": full_name,
+        "meal_type": "Main Course",
+        "room_id": room["id"],
+        "member_id": 1,
+        **fields,
+    }
+
+
+def drink(room: dict, full_name: str = "Anna", **fields) -> dict:
+    """Body of a bottle of wine brought by full_name of the room's first family"""
+    return {
+        "fullName": full_name,
+        "category": "Wine",
+        "quantity": 2,
+        "member_id": 1,
+        "room_id": room["id"],
+        **fields,
+    }
+
+
+@pytest.fixture
+def configure_database(tmp_path, monkeypatch):
+    """Point app.database at fresh SQLite files under tmp_path.
+
+    Call it with the shard count; engines and the session factory are set up
+    by init_engine and prepare_schema as at startup, and put back afterwards.
+    """
+
+    def configure(shard_count: int = 1):
+        url = f"sqlite:///{tmp_path / 'main.db'}"
+        monkeypatch.setattr(database, "SQLALCHEMY_DATABASE_URL", url)
+        monkeypatch.setattr(database, "SHARD_COUNT", shard_count)
+        monkeypatch.setattr(
+            database, "SHARD_URL_TEMPLATE", f"sqlite:///{tmp_path}/shard{{shard}}.db"
+        )
+        monkeypatch.setattr(database, "engine", None)
+        monkeypatch.setattr(database, "shard_engines", {})
+        monkeypatch.setattr(database, "room_directory", None)
+        monkeypatch.setattr(
+            database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False)
+        )
+        database.prepare_schema(database.init_engine(url))
+        return database.SessionLocal
+
+    yield configure
+    database.dispose_engine()
+
+
+@pytest.fixture
+def client(configure_database):
+    """The app on a fresh single database, without running its lifespan"""
+    configure_database()
+    return TestClient(app)
+
+
+@pytest.fixture
+def sharded_client(configure_database):
+    """The app with rooms spread over two shards"""
+    configure_database(2)
+    return TestClient(app)
+
+
+# Runs in a fresh interpreter: the database settings are read at import time
+# and the session factory is configured once per process
+PRELUDE = """
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+
+SETTINGS = {
+    "participantCount": 4,
+    "mealCount": 1,
+    "language": "en",
+    "families": ["Smith", "Jones"],
+    "mealTypes": ["Main Course"],
+    "selectedTypes": ["Main Course"],
+}
+
+
+def new_room(client):
+    room = client.post("/api/rooms/").json()
+    client.put(f"/api/rooms/{room['seed']}/activate", json={"settings": SETTINGS})
+    return client.get(f"/api/rooms/{room['seed']}").json()
+
+
+with TestClient(app) as client:
+"""
+
+
+@pytest.fixture
+def run_app(tmp_path):
+    """Run a snippet against a fresh app on a database under tmp_path.
+
+    The snippet runs inside ``with TestClient(app) as client:`` with
+    ``new_room(client)`` available, and reports by printing one JSON value,
+    which is returned.
+    """
+
+    def run(code: str, **env):
+        settings = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{tmp_path / 'main.db'}",
+            SHARD_URL_TEMPLATE=f"sqlite:///{tmp_path}/shard{{shard}}.db",
+            SNAPSHOT_DIR=str(tmp_path / "snapshots"),
+            **env,
+        )
+        script = PRELUDE + textwrap.indent(textwrap.dedent(code), "    ")
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=BACKEND_DIR,
+            env=settings,
+            capture_output=True,
+            text=True,
+        )
+        assert result.returncode == 0, result.stderr
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    return run
@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app import hot_rooms, profiling, single_flight
+from app.routers import admin
+from conftest import BACKEND_DIR
+
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "admin")
+    return "admin"
+
+
+@pytest.fixture
+def stored_profile(tmp_path, monkeypatch):
+    # As recorded with only PROFILE_SAMPLE_PERCENT set: no PROFILE_TOKEN
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    (tmp_path / "20260101T000000-abc.json").write_text('{"path": "/api/rooms/"}')
+    (tmp_path / "20260101T000000-abc.folded").write_text("main;handler 1\n")
+    return "20260101T000000-abc"
+
+
+def test_sampled_profiles_are_served_to_the_admin(client, admin_token, stored_profile):
+    headers = {"X-Admin-Token": admin_token}
+    assert client.get("/api/admin/profiles", headers=headers).json() == [stored_profile]
+    summary = client.get(f"/api/admin/profiles/{stored_profile}", headers=headers)
+    assert summary.json() == {"path": "/api/rooms/"}
+    folded = client.get(
+        f"/api/admin/profiles/{stored_profile}/flamegraph",
+        headers={"X-Profile-Token": admin_token},
+    )
+    assert folded.text == "main;handler 1\n"
+    assert client.get("/api/admin/profiles/unknown", headers=headers).status_code == 404
+
+
+def test_profiles_need_the_admin_token(client, admin_token, stored_profile):
+    for headers in ({}, {"X-Admin-Token": "wrong"}, {"X-Profile-Token": "wrong"}):
+        response = client.get(f"/api/admin/profiles/{stored_profile}", headers=headers)
+        assert response.status_code == 403
+
+
+def test_admin_endpoints_are_off_without_a_token(client, stored_profile, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    for path in ("/api/admin/profiles", "/api/admin/single-flight"):
+        assert client.get(path, headers={"X-Admin-Token": ""}).status_code == 404
+
+
+def test_stats_use_the_admin_token(client, admin_token, monkeypatch):
+    monkeypatch.setattr(hot_rooms, "store", hot_rooms.HotRoomStore(1024 * 1024))
+    monkeypatch.setattr(single_flight, "SINGLE_FLIGHT_ENABLED", True)
+    for path in ("/api/admin/hot-rooms", "/api/admin/single-flight"):
+        assert client.get(path, headers={"X-Admin-Token": "admin"}).status_code == 200
+        assert client.get(path, headers={"X-Admin-Token": "other"}).status_code == 403
+
+
+def test_admin_token_falls_back_to_the_profile_token():
+    env = {key: value for key, value in os.environ.items() if key != "ADMIN_TOKEN"}
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from app.routers import admin; print(admin.ADMIN_TOKEN)",
+        ],
+        cwd=BACKEND_DIR,
+        env=dict(env, PROFILE_TOKEN="profile"),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["profile"]
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import backup, database
+from app.main import app
+from conftest import new_room
+
+
+@pytest.fixture
+def backup_dir(tmp_path, monkeypatch):
+    path = tmp_path / "backups"
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(path))
+    return path
+
+
+@pytest.fixture(params=[1, 2], ids=["plain", "sharded"])
+def any_client(request, configure_database):
+    configure_database(request.param)
+    return TestClient(app)
+
+
+def test_backup_restores_the_databases(any_client, backup_dir):
+    room = new_room(any_client)
+    backup_id = backup.create_backup()
+    backup.verify_backup(backup_id)
+    assert set(backup.read_manifest(backup_id)["files"]) == set(backup.database_urls())
+
+    any_client.delete(f"/api/rooms/{room['seed']}")
+    assert any_client.get(f"/api/rooms/{room['seed']}").status_code == 404
+
+    # Restores are made with the app stopped: no pooled connections
+    for engine in (database.engine, *database.shard_engines.values()):
+        engine.dispose()
+    backup.restore_backup(backup_id)
+    assert any_client.get(f"/api/rooms/{room['seed']}").json()["id"] == room["id"]
+
+
+def test_backup_of_a_missing_database_fails(client, backup_dir, tmp_path, monkeypatch):
+    missing = tmp_path / "missing.db"
+    monkeypatch.setattr(database, "SQLALCHEMY_DATABASE_URL", f"sqlite:///{missing}")
+
+    with pytest.raises(backup.BackupError):
+        backup.create_backup()
+    assert not missing.exists()
+    assert backup.list_backups() == []
+
+
+def test_skip_unchanged_and_prune(client, backup_dir):
+    first = backup.create_backup()
+    assert backup.create_backup(skip_unchanged=True) is None
+
+    new_room(client)
+    second = backup.create_backup(skip_unchanged=True)
+    third = backup.create_backup()
+    assert backup.list_backups() == [third, second, first]
+
+    assert backup.prune(keep=2) == [first]
+    assert backup.list_backups() == [third, second]
+    assert not os.path.exists(backup_dir / first)
+
+
+def test_one_scheduler_at_a_time_holds_the_lock(backup_dir):
+    holder = backup.try_scheduler_lock()
+    assert holder is not None
+    assert backup.try_scheduler_lock() is None
+    holder.close()
+    successor = backup.try_scheduler_lock()
+    assert successor is not None
+    successor.close()
@@ -0,0 +1,17 @@
+def test_capture_records_are_written_by_the_writer_thread(run_app, tmp_path):
+    capture_file = tmp_path / "capture.jsonl"
+    result = run_app(
+        """
+        from app import capture
+
+        room = new_room(client)
+        client.get(f"/api/dishes/{room['id']}")
+        capture.stop()
+        with open(capture.CAPTURE_FILE) as f:
+            records = [json.loads(line) for line in f]
+        print(json.dumps([record["route"] for record in records]))
+        """,
+        CAPTURE_FILE=str(capture_file),
+    )
+    assert result[-1] == "/api/dishes/{room_id}"
+    assert "/api/rooms/{seed}/activate" in result
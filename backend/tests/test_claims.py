@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.database import database
+from app.models import models
+from conftest import new_room
+
+
+def _wishes(client, room: dict, quantity: float) -> list:
+    """Claim URLs of a wishlist item and a drink wish requesting quantity"""
+    item = client.post(
+        "/api/wishlist/",
+        json={
+            "dish_name": "Cake",
+            "requested_quantity": quantity,
+            "room_id": room["id"],
+        },
+    ).json()
+    wish = client.post(
+        "/api/drink-wishlist/",
+        json={
+            "drink_name": "Wine",
+            "requested_quantity": quantity,
+            "room_id": room["id"],
+        },
+    ).json()
+    return [
+        f"/api/wishlist/{room['id']}/{item['id']}",
+        f"/api/drink-wishlist/{room['id']}/{wish['id']}",
+    ]
+
+
+def test_concurrent_claims_take_exactly_what_was_requested(client):
+    room = new_room(client)
+    for wish in _wishes(client, room, 10):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(
+                pool.map(
+                    lambda _: client.post(f"{wish}/claim", json={"quantity": 1}),
+                    range(25),
+                )
+            )
+        statuses = sorted(response.status_code for response in responses)
+        assert statuses == [200] * 10 + [409] * 15
+        claimed = [r.json()["claimed_quantity"] for r in responses if r.is_success]
+        assert sorted(claimed) == list(range(1, 11))
+
+
+def test_claiming_more_than_is_left_conflicts(client):
+    room = new_room(client)
+    for wish in _wishes(client, room, 2):
+        assert client.post(f"{wish}/claim", json={"quantity": 1.5}).status_code == 200
+        response = client.post(f"{wish}/claim", json={"quantity": 1})
+        assert response.status_code == 409
+        assert response.json()["detail"] == "Only 0.5 left to claim"
+        response = client.post(f"{wish}/unclaim", json={"quantity": 2})
+        assert response.status_code == 409
+        assert response.json()["detail"] == "Only 1.5 claimed"
+
+
+def test_fractional_claims_add_up_to_the_request(client):
+    room = new_room(client)
+    for wish in _wishes(client, room, 0.3):
+        for _ in range(3):
+            response = client.post(f"{wish}/claim", json={"quantity": 0.1})
+            assert response.status_code == 200
+        assert response.json()["claimed_quantity"] == pytest.approx(0.3)
+        assert client.post(f"{wish}/claim", json={"quantity": 0.1}).status_code == 409
+
+
+def test_unclaim_of_an_item_without_requested_quantity(client):
+    room = new_room(client)
+    wishes = _wishes(client, room, 2)
+    for wish in wishes:
+        client.post(f"{wish}/claim", json={"quantity": 1})
+    with database.SessionLocal() as session:
+        for model in (models.WishlistItem, models.DrinkWishlistItem):
+            session.query(model).update({"requested_quantity": None})
+        session.commit()
+
+    for wish in wishes:
+        response = client.post(f"{wish}/unclaim", json={"quantity": 1})
+        assert response.status_code == 200
+        assert response.json()["claimed_quantity"] == 0
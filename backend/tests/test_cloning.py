@@ -0,0 +1,33 @@
+from app import cloning
+from app.database import database
+from conftest import dish, new_room
+
+
+def test_clone_starts_copies_over(client):
+    room = new_room(client)
+    created = client.post(f"/api/dishes/{room['id']}", json=dish(room)).json()
+    client.patch(f"/api/dishes/{room['id']}/{created['id']}", json={"quantity": 900})
+
+    copy = client.post(
+        f"/api/rooms/{room['seed']}/clone",
+        json={"include": ["families", "dishes"]},
+    ).json()
+    dishes = client.get(f"/api/dishes/{copy['id']}").json()
+    assert [row["version"] for row in dishes] == [1]
+    assert dishes[0]["quantity"] == 900
+
+
+def test_duplicate_template_name_conflicts(client):
+    room = new_room(client)
+    template = {"name": "Easter", "seed": room["seed"]}
+    assert client.post("/api/templates/", json=template).status_code == 200
+    assert client.post("/api/templates/", json=template).status_code == 409
+
+
+def test_failed_sharded_clone_leaves_no_directory_entry(sharded_client):
+    room = new_room(sharded_client)
+    before = len(database.room_directory.all_rooms())
+    with database.SessionLocal() as session:
+        cloning.clone_room(session, room["id"], "orphan")
+        session.rollback()
+    assert len(database.room_directory.all_rooms()) == before
@@ -0,0 +1,41 @@
+from app.database import database
+from app.models import models
+from conftest import dish, new_room
+
+
+def test_sharded_update_of_a_family_id_used_in_several_shards(sharded_client):
+    client = sharded_client
+    rooms = [new_room(client) for _ in range(3)]
+    for room in rooms:
+        # The first dish of a family creates it
+        client.post(f"/api/dishes/{room['id']}", json=dish(room))
+    with database.SessionLocal() as session:
+        families = {
+            room["id"]: session.query(models.Family.id)
+            .filter(models.Family.room_id == room["id"])
+            .order_by(models.Family.id)
+            .first()[0]
+            for room in rooms
+        }
+    ids = list(families.values())
+    assert len(set(ids)) < len(ids)
+    room = next(room for room in rooms if ids.count(families[room["id"]]) > 1)
+    family_id = families[room["id"]]
+
+    updated = client.put(
+        f"/api/families/{room['id']}/{family_id}",
+        json={"name": "Miller", "version": 1},
+    )
+    assert updated.status_code == 200
+    assert updated.json()["name"] == "Miller"
+
+    patched = client.patch(
+        f"/api/families/{room['id']}/{family_id}", json={"name": "Brown"}
+    )
+    assert patched.status_code == 200
+    assert patched.json() == {**updated.json(), "name": "Brown", "version": 3}
+
+    legacy = client.put(
+        f"/api/families/{family_id}", json={"name": "Miller", "version": 3}
+    )
+    assert legacy.status_code == 400
@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import hot_rooms
+from app.database import database
+from app.main import app
+from app.models import models
+from conftest import dish, new_room
+
+
+@pytest.fixture(params=[1, 2], ids=["plain", "sharded"])
+def hot_client(request, configure_database, monkeypatch):
+    configure_database(request.param)
+    monkeypatch.setattr(hot_rooms, "store", hot_rooms.HotRoomStore(1024 * 1024))
+    hot_rooms.install(database.SessionLocal)
+    return TestClient(app)
+
+
+def _guests(client, room) -> list:
+    roster = client.get(f"/api/rooms/{room['seed']}/roster").json()
+    return [member["name"] for member in roster["families"][0]["members"]]
+
+
+def test_members_are_written_through_to_their_own_room(hot_client, monkeypatch):
+    rooms = [new_room(hot_client) for _ in range(6)]
+    for room in rooms:
+        assert _guests(hot_client, room) == []
+    for index, room in enumerate(rooms):
+        hot_client.post(f"/api/dishes/{room['id']}", json=dish(room, f"Guest{index}"))
+
+    cached = [_guests(hot_client, room) for room in rooms]
+    assert hot_rooms.store.stats()["hits"] > 0
+    monkeypatch.setattr(hot_rooms, "store", None)
+    assert cached == [[f"Guest{index}"] for index in range(len(rooms))]
+    assert [_guests(hot_client, room) for room in rooms] == cached
+
+
+def test_member_delete_only_touches_its_room(hot_client):
+    rooms = [new_room(hot_client) for _ in range(4)]
+    for index, room in enumerate(rooms):
+        hot_client.post(f"/api/dishes/{room['id']}", json=dish(room, f"Guest{index}"))
+        _guests(hot_client, room)
+
+    with database.SessionLocal() as session:
+        member = (
+            session.query(models.Member)
+            .join(models.Family)
+            .filter(models.Family.room_id == rooms[0]["id"])
+            .one()
+        )
+        session.delete(member)
+        session.commit()
+
+    members = [
+        [member.name for member in hot_rooms.get(room["id"]).member_rows()]
+        for room in rooms
+    ]
+    assert members == [[], ["Guest1"], ["Guest2"], ["Guest3"]]
@@ -0,0 +1,119 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import jobs
+from app.database import database
+from app.models.models import Job, JobStatus
+from conftest import new_room
+
+
+def _wait_for(client, job_id: str, status: str) -> dict:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] == status:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} is {job['status']}, not {status}")
+
+
+@pytest.fixture
+def runner(client, monkeypatch):
+    runner = jobs.JobRunner(workers=1)
+    monkeypatch.setattr(jobs, "runner", runner)
+    runner.start()
+    yield runner
+    runner.stop()
+
+
+def _running_job(session, owner: str, lease_expires_at) -> str:
+    job = Job(
+        id=uuid.uuid4().hex,
+        kind="room_export",
+        status=JobStatus.running,
+        params={},
+        owner=owner,
+        lease_expires_at=lease_expires_at,
+    )
+    session.add(job)
+    session.commit()
+    return job.id
+
+
+def test_export_job_runs_and_reports_its_result(client, runner):
+    room = new_room(client)
+    response = client.post(f"/api/rooms/{room['seed']}/export")
+    assert response.status_code == 202
+
+    job = _wait_for(client, response.json()["id"], "succeeded")
+    assert job["progress"] == 1.0
+    assert job["result"]["room"]["seed"] == room["seed"]
+
+
+def test_handler_errors_fail_the_job(client, runner, monkeypatch):
+    def explode(context, db):
+        context.progress(0.5)
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(jobs._handlers, "explode", explode)
+    with database.SessionLocal() as session:
+        job = jobs.submit(session, "explode")
+
+    job = _wait_for(client, job.id, "failed")
+    assert job["error"] == "boom"
+
+
+def test_queued_job_is_cancelled_and_unknown_jobs_are_404(client):
+    room = new_room(client)
+    job = client.post(f"/api/rooms/{room['seed']}/export").json()
+
+    cancelled = client.delete(f"/api/jobs/{job['id']}").json()
+    assert cancelled["status"] == "cancelled"
+    assert cancelled["cancel_requested"] is True
+    assert client.get("/api/jobs/missing").status_code == 404
+
+
+def test_recovery_only_fails_jobs_whose_lease_ran_out(client):
+    now = datetime.utcnow()
+    with database.SessionLocal() as session:
+        live = _running_job(session, "other-worker", now + timedelta(minutes=1))
+        dead = _running_job(session, "dead-worker", now - timedelta(seconds=1))
+
+    jobs.JobRunner(workers=0)._recover()
+
+    assert client.get(f"/api/jobs/{live}").json()["status"] == "running"
+    failed = client.get(f"/api/jobs/{dead}").json()
+    assert failed["status"] == "failed"
+    assert failed["finished_at"] is not None
+
+
+def test_runner_does_not_overwrite_a_job_failed_for_it(client):
+    stalled = jobs.JobRunner(workers=0)
+    with database.SessionLocal() as session:
+        job_id = _running_job(session, stalled.owner, datetime.utcnow())
+        jobs.JobRunner(workers=0)._recover()
+        # The stalled runner gets to the end of the job after all
+        stalled._finish(session, job_id, status=JobStatus.succeeded)
+
+    assert client.get(f"/api/jobs/{job_id}").json()["status"] == "failed"
+
+
+def test_heartbeat_renews_the_lease_of_running_jobs(client):
+    runner = jobs.JobRunner(workers=0, lease_seconds=0.3)
+    started = datetime.utcnow()
+    with database.SessionLocal() as session:
+        job_id = _running_job(session, runner.owner, started + runner.lease)
+
+    runner.start()
+    try:
+        time.sleep(0.5)
+    finally:
+        runner.stop()
+
+    with database.SessionLocal() as session:
+        job = session.get(Job, job_id)
+        assert job.status == JobStatus.running
+        assert job.lease_expires_at > started + runner.lease
@@ -0,0 +1,134 @@
+import json
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app.database import database
+from app.main import app
+from app.models import models
+from conftest import SETTINGS, drink, new_room
+
+# Tables as the first release created them: dishes and drinks.member_id still
+# reference members.id
+OLD_SCHEMA = """
+CREATE TABLE rooms (
+    id INTEGER NOT NULL, seed VARCHAR, status VARCHAR, settings JSON,
+    created_at DATETIME, PRIMARY KEY (id)
+);
+CREATE TABLE families (
+    id INTEGER NOT NULL, name VARCHAR, room_id INTEGER, PRIMARY KEY (id),
+    FOREIGN KEY(room_id) REFERENCES rooms (id) ON DELETE CASCADE
+);
+CREATE TABLE members (
+    id INTEGER NOT NULL, name VARCHAR, family_id INTEGER, PRIMARY KEY (id),
+    FOREIGN KEY(family_id) REFERENCES families (id) ON DELETE CASCADE
+);
+CREATE TABLE dishes (
+    id INTEGER NOT NULL, name VARCHAR, quantity FLOAT, member_id INTEGER,
+    room_id INTEGER, "fullName" VARCHAR, meal_type VARCHAR, created_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(member_id) REFERENCES members (id) ON DELETE CASCADE,
+    FOREIGN KEY(room_id) REFERENCES rooms (id) ON DELETE CASCADE
+);
+CREATE TABLE drinks (
+    id INTEGER NOT NULL, "fullName" VARCHAR, category VARCHAR,
+    other_category VARCHAR, brand VARCHAR, quantity FLOAT, member_id INTEGER,
+    room_id INTEGER, created_at DATETIME, PRIMARY KEY (id),
+    FOREIGN KEY(member_id) REFERENCES members (id) ON DELETE CASCADE,
+    FOREIGN KEY(room_id) REFERENCES rooms (id) ON DELETE CASCADE
+);
+CREATE TABLE wishlist_items (
+    id INTEGER NOT NULL, dish_name VARCHAR, requested_quantity FLOAT,
+    notes VARCHAR, room_id INTEGER, created_at DATETIME, PRIMARY KEY (id),
+    FOREIGN KEY(room_id) REFERENCES rooms (id) ON DELETE CASCADE
+);
+"""
+
+ROOM_TABLES = (
+    models.Family,
+    models.Dish,
+    models.Drink,
+    models.WishlistItem,
+)
+
+
+@pytest.fixture
+def migrated_client(tmp_path, configure_database):
+    """The app on a database created by the first release, with two rooms"""
+    with sqlite3.connect(tmp_path / "main.db") as conn:
+        conn.executescript(OLD_SCHEMA)
+        for room_id, seed in ((1, "old-one"), (2, "old-two")):
+            conn.execute(
+                "INSERT INTO rooms (id, seed, status, settings) VALUES (?, ?, ?, ?)",
+                (room_id, seed, "active", json.dumps(SETTINGS)),
+            )
+            conn.execute(
+                "INSERT INTO families (name, room_id) VALUES ('Smith', ?)", (room_id,)
+            )
+            conn.execute(
+                "INSERT INTO members (name, family_id) VALUES ('Anna', ?)", (room_id,)
+            )
+            # member_id is the family index, whatever member has that id
+            conn.execute(
+                "INSERT INTO dishes (name, quantity, member_id, room_id, "
+                "\"fullName\", meal_type) VALUES ('Ham', 1, 1, ?, 'Anna', "
+                "'Main Course')",
+                (room_id,),
+            )
+            conn.execute(
+                'INSERT INTO drinks ("fullName", category, quantity, member_id, '
+                "room_id) VALUES ('Anna', 'Wine', 1, 1, ?)",
+                (room_id,),
+            )
+            conn.execute(
+                "INSERT INTO wishlist_items (dish_name, requested_quantity, "
+                "room_id) VALUES ('Cake', 1, ?)",
+                (room_id,),
+            )
+    # Migrates the tables as startup does
+    configure_database()
+    return TestClient(app)
+
+
+def _rows(room_id: int) -> dict:
+    with database.SessionLocal() as session:
+        return {
+            model.__tablename__: session.scalar(
+                select(func.count()).where(model.room_id == room_id)
+            )
+            for model in ROOM_TABLES
+        }
+
+
+def _members() -> list:
+    with database.SessionLocal() as session:
+        return session.scalars(select(models.Member.family_id)).all()
+
+
+def test_migration_drops_the_stale_member_foreign_keys(migrated_client):
+    assert database.stale_foreign_keys(database.engine) == []
+    assert _rows(1) == _rows(2) == {table: 1 for table in _rows(1)}
+    room = new_room(migrated_client)
+    # Drinks of guests without a family have no member to reference
+    response = migrated_client.post("/api/drinks/", json=drink(room, member_id=0))
+    assert response.status_code == 200
+
+
+def test_room_delete_cascades_on_a_migrated_database(migrated_client):
+    assert migrated_client.delete("/api/rooms/old-one").status_code == 200
+
+    assert _rows(1) == {table: 0 for table in _rows(1)}
+    assert _members() == [2]
+    assert _rows(2) == {table: 1 for table in _rows(2)}
+    dishes = migrated_client.get("/api/dishes/2").json()
+    assert [row["name"] for row in dishes] == ["Ham"]
+
+
+def test_family_delete_keeps_the_items_on_a_migrated_database(migrated_client):
+    assert migrated_client.delete("/api/families/1").status_code == 200
+
+    assert _members() == [2]
+    # Dish member_id 1 pointed at member 1; with the old key it went too
+    assert _rows(1) == {"families": 0, "dishes": 1, "drinks": 1, "wishlist_items": 1}
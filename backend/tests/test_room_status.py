@@ -0,0 +1,70 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from conftest import dish, drink, new_room
+
+
+@pytest.fixture(params=[1, 2], ids=["plain", "sharded"])
+def any_client(request, configure_database):
+    configure_database(request.param)
+    return TestClient(app)
+
+
+def test_status_of_many_rooms_in_one_request(any_client):
+    busy, quiet = new_room(any_client), new_room(any_client)
+    pending = any_client.post("/api/rooms/").json()
+    any_client.post(f"/api/dishes/{busy['id']}", json=dish(busy))
+    any_client.post(f"/api/dishes/{busy['id']}", json=dish(busy, "Bea"))
+    any_client.post("/api/drinks/", json=drink(busy))
+    any_client.post(
+        "/api/wishlist/",
+        json={"dish_name": "Cake", "requested_quantity": 1, "room_id": busy["id"]},
+    )
+
+    seeds = [busy["seed"], "unknown", quiet["seed"], pending["seed"], busy["seed"]]
+    batch = any_client.post("/api/rooms/status", json={"seeds": seeds}).json()
+
+    assert batch["missing"] == ["unknown"]
+    rooms = {room.pop("seed"): room for room in batch["rooms"]}
+    assert set(rooms) == {busy["seed"], quiet["seed"], pending["seed"]}
+    assert rooms[busy["seed"]] == {
+        "status": "active",
+        "version": rooms[busy["seed"]]["version"],
+        "families": 1,
+        "dishes": 2,
+        "drinks": 1,
+        "wishlist": 1,
+        "drink_wishlist": 0,
+    }
+    assert rooms[quiet["seed"]]["dishes"] == 0
+    assert rooms[pending["seed"]]["status"] == "pending"
+
+
+def test_status_batch_size_is_limited(client):
+    seeds = [f"seed{index}" for index in range(501)]
+    assert client.post("/api/rooms/status", json={"seeds": seeds}).status_code == 422
+    assert client.post("/api/rooms/status", json={"seeds": []}).json() == {
+        "rooms": [],
+        "missing": [],
+    }
+
+
+def test_status_is_revalidated_with_its_etag(any_client):
+    room = new_room(any_client)
+    url = f"/api/rooms/{room['seed']}/status"
+    first = any_client.get(url)
+    etag = first.headers["etag"]
+    assert first.json()["dishes"] == 0
+
+    unchanged = any_client.get(url, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["etag"] == etag
+
+    any_client.post(f"/api/dishes/{room['id']}", json=dish(room))
+    changed = any_client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["dishes"] == 1
+    assert any_client.get("/api/rooms/unknown/status").status_code == 404
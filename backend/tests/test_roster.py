@@ -0,0 +1,16 @@
+from conftest import dish, drink, new_room
+
+
+def test_drinks_are_listed_per_family_not_as_guests(client):
+    room = new_room(client)
+    client.post(f"/api/dishes/{room['id']}", json=dish(room, "Anna"))
+    client.post("/api/drinks/", json=drink(room, "Wine"))
+    client.post("/api/drinks/", json=drink(room, "Water", member_id=0))
+
+    roster = client.get(f"/api/rooms/{room['seed']}/roster").json()
+    smith, jones = roster["families"]
+    assert [member["name"] for member in smith["members"]] == ["Anna"]
+    assert all(member["id"] is not None for member in smith["members"])
+    assert [drink["fullName"] for drink in smith["drinks"]] == ["Wine"]
+    assert jones["members"] == [] and jones["drinks"] == []
+    assert [drink["fullName"] for drink in roster["unassigned"]["drinks"]] == ["Water"]
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.database import database
+from app.database.sharding import move_room
+from app.models import models
+from conftest import dish, new_room
+
+
+def _rooms_in(shard: str) -> list:
+    with database.shard_engines[shard].connect() as conn:
+        return (
+            conn.execute(select(models.Room.id).order_by(models.Room.id))
+            .scalars()
+            .all()
+        )
+
+
+def _count(shard: str, model, room_id: int) -> int:
+    with database.shard_engines[shard].connect() as conn:
+        return conn.execute(
+            select(func.count()).where(model.room_id == room_id)
+        ).scalar()
+
+
+def _guests(client, room: dict) -> list:
+    """(family, guest, dishes) of a room's roster, without the per-shard ids"""
+    roster = client.get(f"/api/rooms/{room['seed']}/roster").json()
+    return [
+        (family["name"], member["name"], [row["name"] for row in member["dishes"]])
+        for family in roster["families"]
+        for member in family["members"]
+    ]
+
+
+def test_rooms_are_spread_over_the_shards(sharded_client):
+    rooms = [new_room(sharded_client) for _ in range(4)]
+    for index, room in enumerate(rooms):
+        sharded_client.post(f"/api/dishes/{room['id']}", json=dish(room, f"G{index}"))
+
+    directory = database.room_directory
+    shards = {room["id"]: directory.shard_for_room(room["id"]) for room in rooms}
+    assert set(shards.values()) == {"0", "1"}
+    for shard in ("0", "1"):
+        assert _rooms_in(shard) == sorted(
+            room_id for room_id, owner in shards.items() if owner == shard
+        )
+
+    # Dish ids repeat across shards; each room still only sees its own
+    for index, room in enumerate(rooms):
+        assert (
+            sharded_client.get(f"/api/rooms/{room['seed']}").json()["id"] == room["id"]
+        )
+        dishes = sharded_client.get(f"/api/dishes/{room['id']}").json()
+        assert [row["fullName"] for row in dishes] == [f"G{index}"]
+
+
+def test_move_room_copies_it_and_switches_the_directory(sharded_client):
+    other = new_room(sharded_client)
+    room = new_room(sharded_client)
+    sharded_client.post(f"/api/dishes/{other['id']}", json=dish(other))
+    for name in ("Anna", "Bea"):
+        sharded_client.post(f"/api/dishes/{room['id']}", json=dish(room, name))
+    sharded_client.post(
+        "/api/wishlist/",
+        json={"dish_name": "Cake", "requested_quantity": 1, "room_id": room["id"]},
+    )
+    before = _guests(sharded_client, room)
+    assert len(before) == 2
+
+    directory = database.room_directory
+    source = directory.shard_for_room(room["id"])
+    target = directory.shard_for_room(other["id"])
+    assert source != target
+    move_room(directory, database.shard_engines, room["id"], target)
+
+    assert directory.shard_for_room(room["id"]) == target
+    assert room["id"] not in _rooms_in(source)
+    for model in (models.Family, models.Dish, models.WishlistItem):
+        assert _count(source, model, room["id"]) == 0
+    # Family, member and item ids are the target shard's own
+    assert _guests(sharded_client, room) == before
+    wishes = sharded_client.get(f"/api/wishlist/{room['id']}").json()
+    assert [wish["dish_name"] for wish in wishes] == ["Cake"]
+    dishes = sharded_client.get(f"/api/dishes/{other['id']}").json()
+    assert [row["fullName"] for row in dishes] == ["Anna"]
+
+
+def test_move_of_an_unknown_room_fails(sharded_client):
+    with pytest.raises(ValueError):
+        move_room(database.room_directory, database.shard_engines, 404, "1")
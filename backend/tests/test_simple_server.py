@@ -0,0 +1,20 @@
+import simple_server
+
+
+def test_choose_encoding_skips_refused_and_missing_variants(tmp_path, monkeypatch):
+    def snapshot_path(seed, etag, encoding):
+        return str(tmp_path / f"{seed}-{etag}.{encoding}")
+
+    monkeypatch.setattr(simple_server, "snapshot_path", snapshot_path)
+    for encoding in ("identity", "gzip", "br"):
+        (tmp_path / f"ROOM-abc.{encoding}").write_bytes(b"{}")
+
+    def choose(accept_encoding):
+        return simple_server.choose_encoding(accept_encoding, "abc", "ROOM")
+
+    assert choose("gzip, br") == "br"
+    assert choose("br;q=0.0, gzip") == "gzip"
+    assert choose("gzip;q=0.0") == "identity"
+    assert choose("br; q=0.00, GZIP;q=0.5") == "gzip"
+    (tmp_path / "ROOM-abc.br").unlink()
+    assert choose("br") == "identity"
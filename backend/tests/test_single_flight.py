@@ -0,0 +1,96 @@
+import asyncio
+from collections import defaultdict
+
+import httpx
+import pytest
+from fastapi.routing import APIRoute
+
+from app import single_flight
+from app.main import app
+from conftest import dish, new_room
+
+
+@pytest.fixture
+def coalesced(client, monkeypatch):
+    """The middleware in front of the app; its GETs wait for middleware.gate"""
+    monkeypatch.setattr(
+        single_flight,
+        "_counters",
+        defaultdict(lambda: {"requests": 0, "computed": 0, "shared": 0}),
+    )
+    routes = [
+        route
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.path in single_flight.ROUTES
+    ]
+
+    async def held_app(scope, receive, send):
+        # Reads wait for the test to let them through, so they pile up
+        if scope["method"] == "GET":
+            await middleware.gate.wait()
+        await app(scope, receive, send)
+
+    middleware = single_flight.SingleFlightMiddleware(held_app, routes)
+    middleware.gate = asyncio.Event()
+    return middleware
+
+
+def _counts(path: str) -> dict:
+    return single_flight.stats()["routes"][path]
+
+
+async def _in_flight(middleware, count: int) -> None:
+    """Wait until count distinct responses are being computed"""
+    async with asyncio.timeout(5):
+        while len(middleware.flights) < count:
+            await asyncio.sleep(0.001)
+
+
+def test_identical_concurrent_reads_are_computed_once(client, coalesced):
+    room = new_room(client)
+    client.post(f"/api/dishes/{room['id']}", json=dish(room))
+    url = f"/api/dishes/{room['id']}"
+
+    async def read_all():
+        transport = httpx.ASGITransport(app=coalesced)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            reads = [asyncio.create_task(c.get(url)) for _ in range(20)]
+            await _in_flight(coalesced, 1)
+            await asyncio.sleep(0.05)
+            coalesced.gate.set()
+            return await asyncio.gather(*reads)
+
+    responses = asyncio.run(read_all())
+    assert {response.content for response in responses} == {responses[0].content}
+    assert responses[0].json()[0]["name"] == "Ham"
+    counts = _counts("/api/dishes/{room_id}")
+    assert counts["requests"] == 20
+    assert counts["computed"] < counts["requests"]
+
+
+def test_read_after_a_write_is_not_served_the_old_response(client, coalesced):
+    room = new_room(client)
+    created = client.post(f"/api/dishes/{room['id']}", json=dish(room)).json()
+    url = f"/api/dishes/{room['id']}"
+
+    async def read_around_a_patch():
+        transport = httpx.ASGITransport(app=coalesced)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            before = asyncio.create_task(c.get(url))
+            await _in_flight(coalesced, 1)
+            patched = await c.patch(f"{url}/{created['id']}", json={"quantity": 500})
+            assert patched.status_code == 200
+            after = asyncio.create_task(c.get(url))
+            await _in_flight(coalesced, 2)
+            coalesced.gate.set()
+            return await before, await after
+
+    before, after = asyncio.run(read_around_a_patch())
+    assert after.json()[0]["quantity"] == 500
+    assert after.json()[0]["version"] == 2
+    assert _counts("/api/dishes/{room_id}") == {
+        "requests": 2,
+        "computed": 2,
+        "shared": 0,
+        "shared_ratio": 0.0,
+    }
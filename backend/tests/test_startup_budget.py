@@ -0,0 +1,17 @@
+"""Cold-start budget, see startup_budget.py"""
+
+import os
+
+import startup_budget
+
+
+def test_import_within_budget():
+    import_time = startup_budget.measure_import_time()
+    assert import_time <= startup_budget.IMPORT_BUDGET
+
+
+def test_first_request_within_budget(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}")
+    budget = startup_budget.FIRST_REQUEST_BUDGET
+    first_request_time = startup_budget.measure_first_request_time(budget * 5, env)
+    assert first_request_time <= budget
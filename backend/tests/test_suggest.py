@@ -0,0 +1,62 @@
+import pytest
+
+from app import suggest
+from app.database import database
+from conftest import dish, drink, new_room
+
+
+@pytest.fixture
+def indexes(monkeypatch):
+    fresh = {"dish": suggest.PrefixIndex(), "drink": suggest.PrefixIndex()}
+    monkeypatch.setattr(suggest, "INDEXES", fresh)
+    return fresh
+
+
+def test_prefix_search_ranks_by_use():
+    index = suggest.PrefixIndex()
+    index.add_many(
+        [("Ham", "Main Course", 3), ("Hamburger", "Main Course", 5), ("Eggs", None, 9)]
+    )
+    index.add("  ham ", "Main Course")
+    index.add("Hash browns", "Entree")
+
+    assert index.search("HA") == [
+        ("Hamburger", "Main Course", 5),
+        ("Ham", "Main Course", 4),
+        ("Hash browns", "Entree", 1),
+    ]
+    assert index.search("ham", limit=1) == [("Hamburger", "Main Course", 5)]
+    assert index.search("ha", group="Entree") == [("Hash browns", "Entree", 1)]
+    assert index.search("hamb u") == []
+
+
+def test_short_prefix_results_are_refreshed_by_inserts():
+    index = suggest.PrefixIndex()
+    index.add("Ham", None)
+    assert index.search("h") == [("Ham", None, 1)]
+    index.add("Honey", None)
+    index.add("Honey", None)
+    assert index.search("h") == [("Honey", None, 2), ("Ham", None, 1)]
+
+
+def test_new_items_are_suggested_and_survive_a_reload(client, indexes):
+    room = new_room(client)
+    for name in ("Ham", "Ham", "Hot cross buns"):
+        client.post(f"/api/dishes/{room['id']}", json=dish(room, name=name))
+    client.post("/api/drinks/", json=drink(room, "Hock", brand="Heidsieck"))
+
+    expected = [
+        {"text": "Ham", "group": "Main Course", "count": 2},
+        {"text": "Hot cross buns", "group": "Main Course", "count": 1},
+    ]
+    assert client.get("/api/suggest?kind=dish&q=h").json() == expected
+    drinks = client.get("/api/suggest?kind=drink&q=h&category=Wine").json()
+    assert [row["text"] for row in drinks] == ["Heidsieck", "Hock"]
+
+    with database.SessionLocal() as session:
+        suggest.load(session)
+    assert client.get("/api/suggest?kind=dish&q=h").json() == expected
+
+
+def test_unknown_kind_is_rejected(client, indexes):
+    assert client.get("/api/suggest?kind=cake&q=h").status_code == 400
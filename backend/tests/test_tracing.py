@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+
+def test_disabled_tracing_does_not_import_opentelemetry():
+    env = {key: value for key, value in os.environ.items() if key != "TRACE_EXPORTER"}
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, app.main; print('opentelemetry' in sys.modules)",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["False"]
+
+
+def test_jsonl_exporter_records_request_spans(run_app, tmp_path):
+    trace_file = tmp_path / "traces.jsonl"
+    result = run_app(
+        """
+        from opentelemetry import trace
+
+        room = new_room(client)
+        response = client.get(f"/api/dishes/{room['id']}")
+        trace.get_tracer_provider().force_flush()
+        print(json.dumps("traceresponse" in response.headers))
+        """,
+        TRACE_EXPORTER="jsonl",
+        TRACE_FILE=str(trace_file),
+    )
+    assert result is True
+    spans = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    server = next(span for span in spans if span["name"] == "GET /api/dishes/{room_id}")
+    steps = {
+        span["name"]: span
+        for span in spans
+        if span["trace_id"] == server["trace_id"]
+        and span["parent_id"] == server["span_id"]
+    }
+    assert {"validate request", "endpoint", "serialize response"} <= set(steps)
+    assert steps["endpoint"]["attributes"]["code.function"] == "get_dishes"
+    assert steps["validate request"]["start"] <= steps["endpoint"]["start"]
+    assert steps["endpoint"]["start"] <= steps["serialize response"]["start"]
+    assert any(span["name"] == "db SELECT" for span in spans)
+
+
+def test_tracing_leaves_fastapi_routing_alone():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import fastapi.routing as r; before = vars(r).copy(); import app.main; "
+            "print([n for n, v in vars(r).items() if before.get(n) is not v])",
+        ],
+        cwd=BACKEND_DIR,
+        env=dict(os.environ, TRACE_EXPORTER="jsonl", TRACE_FILE=os.devnull),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["[]"]
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import dish, drink, new_room
+
+
+@pytest.mark.parametrize(
+    "create, items, body",
+    [
+        ("/api/dishes/{id}", "/api/dishes/{id}", dish),
+        ("/api/drinks/", "/api/drinks/{id}", drink),
+    ],
+    ids=["dish", "drink"],
+)
+def test_put_of_a_stale_version_conflicts(client, create, items, body):
+    room = new_room(client)
+    items = items.format(id=room["id"])
+    created = client.post(create.format(id=room["id"]), json=body(room)).json()
+    assert created["version"] == 1
+    item = f"{items}/{created['id']}"
+
+    first = client.put(item, json=body(room, "Bea", version=1))
+    assert first.status_code == 200
+    assert first.json()["version"] == 2
+
+    stale = client.put(item, json=body(room, "Carl", version=1))
+    assert stale.status_code == 409
+    assert client.put(item, json=body(room, "Carl")).status_code == 422
+    assert [row["fullName"] for row in client.get(items).json()] == ["Bea"]
+
+
+def test_patch_writes_only_the_fields_sent(client):
+    room = new_room(client)
+    created = client.post(f"/api/dishes/{room['id']}", json=dish(room)).json()
+    item = f"/api/dishes/{room['id']}/{created['id']}"
+
+    # Two guests editing different fields of the same dish both get through
+    client.patch(item, json={"quantity": 500})
+    client.patch(item, json={"name": "Lamb"})
+
+    assert client.get(f"/api/dishes/{room['id']}").json() == [
+        {
+            **created,
+            "name": "Lamb",
+            "quantity": 500,
+            "version": 3,
+        }
+    ]
+
+
+def test_patch_clears_nullable_drink_fields(client):
+    room = new_room(client)
+    created = client.post("/api/drinks/", json=drink(room, brand="Rioja")).json()
+    item = f"/api/drinks/{room['id']}/{created['id']}"
+
+    patched = client.patch(item, json={"brand": None, "version": 1})
+    assert patched.status_code == 200
+    assert patched.json() == {**created, "brand": None, "version": 2}
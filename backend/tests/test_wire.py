@@ -0,0 +1,26 @@
+from app.wire import choose_encoding
+
+
+def test_choose_encoding_honours_zero_quality():
+    assert choose_encoding("br;q=0.0, gzip") == "gzip"
+    assert choose_encoding("br;q=0.00, gzip;q=0") is None
+    assert choose_encoding("br, gzip; q=0") == "br"
+    assert choose_encoding("gzip;q=0.5") == "gzip"
+    assert choose_encoding("identity") is None
+
+
+def test_negotiated_routes_vary_on_accept(run_app):
+    headers = run_app("""
+        room = new_room(client)
+        responses = [
+            client.get(f"/api/dishes/{room['id']}"),
+            client.get(f"/api/dishes/{room['id']}?shape=columnar"),
+            client.get(
+                f"/api/wishlist/{room['id']}",
+                headers={"Accept": "application/msgpack"},
+            ),
+            client.get(f"/api/rooms/{room['seed']}/roster"),
+        ]
+        print(json.dumps([response.headers.get("vary") for response in responses]))
+        """)
+    assert all("Accept" in header.split(", ") for header in headers)
@@ -0,0 +1,100 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.database.write_queue import WriteQueue
+from app.models import models
+
+
+@pytest.fixture
+def session_factory(configure_database):
+    return configure_database()
+
+
+def _add_room(seed: str):
+    def operation(session):
+        room = models.Room(seed=seed)
+        session.add(room)
+        return session
+
+    return operation
+
+
+def _fail(error: Exception):
+    def operation(session):
+        raise error
+
+    return operation
+
+
+def _sqlite_error(message: str, code: int) -> OperationalError:
+    orig = sqlite3.OperationalError(message)
+    orig.sqlite_errorcode = code
+    return OperationalError("INSERT INTO rooms", {}, orig)
+
+
+def _run(queue: WriteQueue, operations: list) -> list:
+    # Queued before the writer starts, so they make up one batch
+    futures = [queue.submit(operation) for operation in operations]
+    queue.start()
+    queue.stop()
+    return futures
+
+
+def _seeds(session_factory) -> list:
+    with session_factory() as session:
+        return sorted(seed for (seed,) in session.query(models.Room.seed))
+
+
+def test_operations_are_committed_in_batches(session_factory):
+    queue = WriteQueue(session_factory, max_batch_size=4, max_wait_ms=100)
+    futures = _run(queue, [_add_room(f"room{index}") for index in range(10)])
+
+    sessions = [future.result() for future in futures]
+    assert len(set(map(id, sessions))) == 3
+    assert _seeds(session_factory) == [f"room{index}" for index in range(10)]
+
+
+def test_failed_operation_is_dropped_and_the_batch_replayed(session_factory):
+    queue = WriteQueue(session_factory, max_wait_ms=100)
+    operations = [
+        _add_room("first"),
+        _fail(ValueError("bad input")),
+        _add_room("first"),  # seeds are unique
+        _add_room("last"),
+    ]
+    futures = _run(queue, operations)
+
+    assert futures[0].result() is futures[3].result()
+    with pytest.raises(ValueError):
+        futures[1].result()
+    assert futures[2].exception() is not None
+    assert _seeds(session_factory) == ["first", "last"]
+
+
+def test_busy_database_is_retried(session_factory):
+    attempts = []
+
+    def busy_once(session):
+        attempts.append(session)
+        if len(attempts) == 1:
+            raise _sqlite_error("database is locked", sqlite3.SQLITE_BUSY)
+        return _add_room("retried")(session)
+
+    queue = WriteQueue(session_factory, max_wait_ms=100, busy_backoff_ms=1)
+    futures = _run(queue, [_add_room("other"), busy_once])
+
+    assert [future.exception() for future in futures] == [None, None]
+    assert len(attempts) == 2
+    assert _seeds(session_factory) == ["other", "retried"]
+
+
+def test_other_errors_mentioning_locked_are_not_retried(session_factory):
+    error = _sqlite_error("no such table: locked_rooms", 1)
+    queue = WriteQueue(session_factory, max_wait_ms=100, busy_backoff_ms=1)
+    futures = _run(queue, [_fail(error), _add_room("kept")])
+
+    assert futures[0].exception() is error
+    assert futures[1].exception() is None
+    assert _seeds(session_factory) == ["kept"]
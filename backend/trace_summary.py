@@ -0,0 +1,72 @@
+"""Summarize spans written by the jsonl trace exporter.
+
+Prints, per span name, the count and p50/p95/max durations, then the slowest
+requests broken down into their child spans. Run from the backend directory:
+
+    TRACE_EXPORTER=jsonl uvicorn app.main:app
+    python trace_summary.py traces.jsonl --slowest 5
+"""
+
+import argparse
+import json
+from collections import defaultdict
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def load_spans(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_breakdown(span, children, depth=0):
+    attributes = span["attributes"]
+    details = ", ".join(
+        f"{key}={attributes[key]}"
+        for key in ("room.id", "room.seed", "app.rows", "db.rows_affected")
+        if key in attributes
+    )
+    print(
+        f"{'  ' * depth}{span['duration_ms']:9.3f}ms  {span['name']}"
+        + (f"  ({details})" if details else "")
+    )
+    for child in sorted(children[span["span_id"]], key=lambda s: s["start"]):
+        print_breakdown(child, children, depth + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default="traces.jsonl")
+    parser.add_argument("--slowest", type=int, default=3)
+    args = parser.parse_args()
+
+    spans = load_spans(args.path)
+    durations = defaultdict(list)
+    children = defaultdict(list)
+    for span in spans:
+        durations[span["name"]].append(span["duration_ms"])
+        children[span["parent_id"]].append(span)
+
+    print(f"{'span':40} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        print(
+            f"{name[:40]:40} {len(values):7d} {percentile(values, 0.5):9.3f} "
+            f"{percentile(values, 0.95):9.3f} {max(values):9.3f}"
+        )
+
+    span_ids = {span["span_id"] for span in spans}
+    roots = [
+        span
+        for span in spans
+        if span["kind"] == "SERVER" and span["parent_id"] not in span_ids
+    ]
+    for root in sorted(roots, key=lambda s: -s["duration_ms"])[: args.slowest]:
+        print(f"\ntrace {root['trace_id']}")
+        print_breakdown(root, children)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Report bytes on the wire for the list formats and compressions.
+
+Builds a room-sized list of dishes shaped like the /api/dishes/{room_id}
+response and prints the body size of every combination of representation
+(row JSON, columnar JSON, MessagePack, columnar MessagePack) and content
+encoding (identity, gzip, brotli), with the saving against plain JSON.
+
+    python wire_benchmark.py --rows 200
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from app import wire
+
+FAMILIES = ["Razvan", "Andrei", "Matei"]
+MEAL_TYPES = ["Entree", "Main Course", "Desert"]
+DISHES = ["Cozonac", "Drob", "Sarmale", "Pasca", "Oua rosii", "Salata de boeuf"]
+
+
+def sample_dishes(count: int, room_id: int = 1) -> list:
+    rng = random.Random(42)
+    start = datetime(2025, 4, 1)
+    return [
+        {
+            "name": rng.choice(DISHES),
+            "quantity": float(rng.randrange(100, 3000, 50)),
+            "fullName": f"Guest {rng.randrange(count // 3 + 1)}",
+            "meal_type": rng.choice(MEAL_TYPES),
+            "room_id": room_id,
+            "id": index + 1,
+            "member_id": rng.randrange(len(FAMILIES)) + 1,
+            "created_at": (start + timedelta(minutes=index)).isoformat(),
+        }
+        for index in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = sample_dishes(args.rows)
+    shapes = {"json": (rows, False), "columnar json": (wire.to_columnar(rows), False)}
+    if wire.msgpack is not None:
+        shapes["msgpack"] = (rows, True)
+        shapes["columnar msgpack"] = (wire.to_columnar(rows), True)
+    encodings = ["identity", "gzip"] + (["br"] if wire.brotli is not None else [])
+
+    baseline = len(wire.encode(rows, False)[0])
+    print(f"{args.rows} dishes, plain JSON = {baseline} bytes")
+    print(f"{'format':<18}{'encoding':<10}{'bytes':>8}{'saving':>9}")
+    for name, (payload, as_msgpack) in shapes.items():
+        body = wire.encode(payload, as_msgpack)[0]
+        for encoding in encodings:
+            size = len(
+                body if encoding == "identity" else wire.compress(body, encoding)
+            )
+            print(f"{name:<18}{encoding:<10}{size:>8}{1 - size / baseline:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
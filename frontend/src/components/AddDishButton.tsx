@@ -6,7 +6,7 @@ import toast from 'react-hot-toast';
 import { useRoom } from '../contexts/RoomContext';
 
 interface AddDishButtonProps {
-    onSubmit: (dish: Omit<Dish, 'id'>) => void;
+    onSubmit: (dish: Omit<Dish, 'id' | 'version'>) => void;
     onOpenModal: () => void;
     onCloseModal: () => void;
 }
@@ -29,7 +29,7 @@ export const AddDishButton: React.FC<AddDishButtonProps> = ({ onSubmit, onOpenMo
         onCloseModal();
     };
 
-    const handleSubmit = (dish: Omit<Dish, 'id'>) => {
+    const handleSubmit = (dish: Omit<Dish, 'id' | 'version'>) => {
         if (!room?.id) {
             toast.error('Room not found');
             return;
@@ -126,7 +126,7 @@ export const AddDishButton: React.FC<AddDishButtonProps> = ({ onSubmit, onOpenMo
                                     fullName: lastUserDetails.fullName,
                                     member_id: lastUserDetails.member_id,
                                     room_id: room?.id || 0
-                                } as Omit<Dish, 'id'> : undefined}
+                                } as Omit<Dish, 'id' | 'version'> : undefined}
                                 onSubmit={handleSubmit}
                                 onCancel={handleClose}
                                 submitButtonText="Add Dish"
@@ -4,8 +4,8 @@ import { getMealTypes } from '../services/api';
 import { useRoom } from '../contexts/RoomContext';
 
 interface DishFormProps {
-    onSubmit: (dish: Omit<Dish, 'id'>) => void;
-    initialValues?: Omit<Dish, 'id'>;
+    onSubmit: (dish: Omit<Dish, 'id' | 'version'>) => void;
+    initialValues?: Omit<Dish, 'id' | 'version'>;
     onCancel?: () => void;
     submitButtonText?: string;
 }
@@ -45,7 +45,7 @@ export const DishForm: React.FC<DishFormProps> = ({ onSubmit, initialValues, onC
 
     const handleSubmit = (e: React.FormEvent) => {
         e.preventDefault();
-        const submissionData: Omit<Dish, 'id'> = {
+        const submissionData: Omit<Dish, 'id' | 'version'> = {
             name: formData.name,
             quantity: formData.quantity === '' ? 0 : parseFloat(formData.quantity),
             member_id: room?.settings?.families?.length ? (formData.member_id === '' ? 0 : parseInt(formData.member_id)) : 0,
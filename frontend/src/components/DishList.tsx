@@ -6,7 +6,7 @@ import { useRoom } from '../contexts/RoomContext';
 
 interface DishListProps {
     dishes: Dish[];
-    onEdit: (id: number, updatedDish: Omit<Dish, 'id'>) => void;
+    onEdit: (id: number, updatedDish: Omit<Dish, 'id' | 'version'>) => void;
     onDelete: (id: number) => void;
 }
 
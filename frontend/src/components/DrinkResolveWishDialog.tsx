@@ -7,7 +7,7 @@ import { DrinkWishlistItem, Drink } from '../types';
 interface DrinkResolveWishDialogProps {
     wish: DrinkWishlistItem | null;
     onClose: () => void;
-    onResolve: (drink: Omit<Drink, 'id' | 'created_at'>) => void;
+    onResolve: (drink: Omit<Drink, 'id' | 'created_at' | 'version'>) => void;
 }
 
 export const DrinkResolveWishDialog: React.FC<DrinkResolveWishDialogProps> = ({
@@ -6,7 +6,7 @@ import { DrinkResolveWishDialog } from './DrinkResolveWishDialog';
 interface DrinkWishlistDisplayProps {
     wishes: DrinkWishlistItem[];
     onDelete: (id: number) => void;
-    onResolve: (wish: DrinkWishlistItem, drink: Omit<Drink, 'id' | 'created_at'>) => void;
+    onResolve: (wish: DrinkWishlistItem, drink: Omit<Drink, 'id' | 'created_at' | 'version'>) => void;
 }
 
 export const DrinkWishlistDisplay: React.FC<DrinkWishlistDisplayProps> = ({
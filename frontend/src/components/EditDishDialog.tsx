@@ -5,7 +5,7 @@ import { DishForm } from './DishForm';
 interface EditDishDialogProps {
     dish: Dish;
     onClose: () => void;
-    onSubmit: (updatedDish: Omit<Dish, 'id'>) => void;
+    onSubmit: (updatedDish: Omit<Dish, 'id' | 'version'>) => void;
 }
 
 export const EditDishDialog: React.FC<EditDishDialogProps> = ({
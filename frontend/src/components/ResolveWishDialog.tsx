@@ -5,7 +5,7 @@ import { DishForm } from './DishForm';
 interface ResolveWishDialogProps {
     wish: WishlistItem;
     onClose: () => void;
-    onSubmit: (dish: Omit<Dish, 'id'>) => void;
+    onSubmit: (dish: Omit<Dish, 'id' | 'version'>) => void;
 }
 
 export const ResolveWishDialog: React.FC<ResolveWishDialogProps> = ({
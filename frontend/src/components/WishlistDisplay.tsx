@@ -6,7 +6,7 @@ import { ResolveWishDialog } from './ResolveWishDialog';
 interface WishlistDisplayProps {
     wishes: WishlistItem[];
     onDelete: (id: number) => void;
-    onResolve: (wish: WishlistItem, dish: Omit<Dish, 'id'>) => void;
+    onResolve: (wish: WishlistItem, dish: Omit<Dish, 'id' | 'version'>) => void;
 }
 
 export const WishlistDisplay: React.FC<WishlistDisplayProps> = ({ 
@@ -78,7 +78,7 @@ export const DrinksPage: React.FC = () => {
         }
     };
 
-    const handleDrinkSubmit = async (drink: Omit<Drink, 'id' | 'created_at'>) => {
+    const handleDrinkSubmit = async (drink: Omit<Drink, 'id' | 'created_at' | 'version'>) => {
         if (!room?.id) return;
         try {
             await createDrink(drink);
@@ -93,7 +93,7 @@ export const DrinksPage: React.FC = () => {
     const handleDrinkEdit = async (id: number, updatedDrink: Omit<Drink, 'id'>) => {
         if (!room?.id) return;
         try {
-            await updateDrink(room.id, id, updatedDrink);
+            await updateDrink(room.id, id, updatedDrink.version, updatedDrink);
             await fetchDrinks();
             toast.success('Drink updated successfully!');
         } catch (error) {
@@ -138,7 +138,7 @@ export const DrinksPage: React.FC = () => {
         }
     };
 
-    const handleWishResolve = async (wish: DrinkWishlistItem, drink: Omit<Drink, 'id' | 'created_at'>) => {
+    const handleWishResolve = async (wish: DrinkWishlistItem, drink: Omit<Drink, 'id' | 'created_at' | 'version'>) => {
         if (!room?.id) return;
         try {
             await createDrink({ ...drink, room_id: room.id });
@@ -79,7 +79,7 @@ export const FoodPage: React.FC = () => {
         }
     };
 
-    const handleDishSubmit = async (dish: Omit<Dish, 'id'>) => {
+    const handleDishSubmit = async (dish: Omit<Dish, 'id' | 'version'>) => {
         if (!room?.id) return;
         try {
             const dishWithRoom = { ...dish, room_id: room.id };
@@ -91,11 +91,12 @@ export const FoodPage: React.FC = () => {
         }
     };
 
-    const handleDishEdit = async (id: number, updatedDish: Omit<Dish, 'id'>) => {
-        if (!room?.id) return;
+    const handleDishEdit = async (id: number, updatedDish: Omit<Dish, 'id' | 'version'>) => {
+        const current = dishes.find((dish) => dish.id === id);
+        if (!room?.id || !current) return;
         try {
             const dishWithRoom = { ...updatedDish, room_id: room.id };
-            await updateDish(room.id, id, dishWithRoom);
+            await updateDish(room.id, id, current.version, dishWithRoom);
             await fetchDishes();
             toast.success('Dish updated successfully!');
         } catch (error) {
@@ -141,7 +142,7 @@ export const FoodPage: React.FC = () => {
         }
     };
 
-    const handleWishResolve = async (wish: WishlistItem, dish: Omit<Dish, 'id'>) => {
+    const handleWishResolve = async (wish: WishlistItem, dish: Omit<Dish, 'id' | 'version'>) => {
         if (!room?.id) return;
         try {
             // Create the new dish
@@ -21,17 +21,19 @@ export const getRoomStatus = (seed: string) =>
 // Dishes
 export const getDishes = (roomId: number) => api.get<Dish[]>(`/dishes/${roomId}`);
 export const getDish = (roomId: number, id: number) => api.get<Dish>(`/dishes/${roomId}/${id}`);
-export const createDish = (dish: Omit<Dish, 'id'>) => api.post<Dish>(`/dishes/${dish.room_id}`, dish);
-export const updateDish = (roomId: number, id: number, dish: Partial<Dish>) => 
-    api.put<Dish>(`/dishes/${roomId}/${id}`, dish);
+export const createDish = (dish: Omit<Dish, 'id' | 'version'>) => api.post<Dish>(`/dishes/${dish.room_id}`, dish);
+// version is the one last read: the update fails with 409 if the dish changed since
+export const updateDish = (roomId: number, id: number, version: number, dish: Partial<Dish>) => 
+    api.put<Dish>(`/dishes/${roomId}/${id}`, { ...dish, version });
 export const deleteDish = (roomId: number, id: number) => 
     api.delete(`/dishes/${roomId}/${id}`);
 
 // Families
 export const getFamilies = () => api.get<Family[]>('/families/');
 export const getFamily = (id: number) => api.get<Family>(`/families/${id}`);
-export const createFamily = (family: Omit<Family, 'id'>) => api.post<Family>('/families/', family);
-export const updateFamily = (id: number, family: Partial<Family>) => api.put<Family>(`/families/${id}`, family);
+export const createFamily = (family: Omit<Family, 'id' | 'version'>) => api.post<Family>('/families/', family);
+export const updateFamily = (roomId: number, id: number, version: number, family: Partial<Family>) => 
+    api.put<Family>(`/families/${roomId}/${id}`, { ...family, version });
 export const deleteFamily = (id: number) => api.delete(`/families/${id}`);
 
 // Members
@@ -55,9 +57,9 @@ export const deleteWishlistItem = (roomId: number, id: number) => api.delete(`/w
 // Drinks
 export const getDrinks = (roomId: number) => api.get<Drink[]>(`/drinks/${roomId}`);
 export const getDrink = (roomId: number, id: number) => api.get<Drink>(`/drinks/${roomId}/${id}`);
-export const createDrink = (drink: Omit<Drink, 'id' | 'created_at'>) => api.post<Drink>('/drinks/', drink);
-export const updateDrink = (roomId: number, id: number, drink: Partial<Drink>) => 
-    api.put<Drink>(`/drinks/${roomId}/${id}`, drink);
+export const createDrink = (drink: Omit<Drink, 'id' | 'created_at' | 'version'>) => api.post<Drink>('/drinks/', drink);
+export const updateDrink = (roomId: number, id: number, version: number, drink: Partial<Drink>) => 
+    api.put<Drink>(`/drinks/${roomId}/${id}`, { ...drink, version });
 export const deleteDrink = (roomId: number, id: number) => 
     api.delete(`/drinks/${roomId}/${id}`);
 export const getDrinkCategories = () => api.get<MealType[]>('/drinks/categories');
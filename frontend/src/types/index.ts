@@ -23,6 +23,7 @@ export interface Dish {
     meal_type: string;
     member_id: number;
     room_id: number;
+    version: number;
 }
 
 export interface Member {
@@ -34,6 +35,7 @@ export interface Member {
 export interface Family {
     id: number;
     name: string;
+    version: number;
 }
 
 export interface WishlistItem {
@@ -75,4 +77,5 @@ export interface Drink {
     member_id: number;
     room_id: number;
     created_at: string;
+    version: number;
 } 
\ No newline at end of file